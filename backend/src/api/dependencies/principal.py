@@ -0,0 +1,35 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fastapi
+
+from src.api.dependencies.repository import get_repository
+from src.models.schemas.jwt import JWTAccount, Principal
+from src.repository.crud.account import AccountCRUDRepository
+from src.securities.authorizations.jwt import jwt_required
+
+
+async def get_current_principal(
+    jwt_payload: JWTAccount = fastapi.Depends(jwt_required),
+    account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
+) -> Principal:
+    """
+    The account the request is made for, read from the `account_id` claim of its token. The tokens issued
+    before the claim was added are resolved by their username until they expire.
+    """
+    if jwt_payload.account_id is not None:
+        return Principal(id=jwt_payload.account_id, username=jwt_payload.username)
+    account = account_repo.read_account_by_username(username=jwt_payload.username)
+    return Principal(id=account.id, username=account.username)
@@ -5,6 +5,7 @@ import typing
 
 # from src.api.dependencies.session import get_async_session
 from src.repository.crud.base import BaseCRUDRepository
+from src.repository.meta_database import meta_db
 from src.repository.rag.base import BaseRAGRepository
 
 
@@ -12,7 +13,8 @@ def get_repository(
     repo_type: typing.Type[BaseCRUDRepository],
 ) -> typing.Callable[[], BaseCRUDRepository]:
     def _get_repo() -> BaseCRUDRepository:
-        return repo_type()
+        # The repositories share the tables of the process wide meta database pool
+        return repo_type(meta_db=meta_db)
 
     return _get_repo
 
@@ -22,6 +22,7 @@ from src.api.routes.version import router as version_router
 from src.api.routes.health import router as health_router
 from src.api.routes.rag_datasets import router as datasets_router
 from src.api.routes.neural_nets import router as neural_nets_router
+from src.api.routes.metrics import router as metrics_router
 
 router = fastapi.APIRouter()
 
@@ -32,3 +33,4 @@ router.include_router(router=version_router)
 router.include_router(router=health_router)
 router.include_router(router=datasets_router)
 router.include_router(router=neural_nets_router)
+router.include_router(router=metrics_router)
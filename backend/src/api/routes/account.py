@@ -16,9 +16,11 @@
 import fastapi
 from fastapi.security import OAuth2PasswordBearer
 from src.config.manager import settings
+from src.api.dependencies.principal import get_current_principal
 from src.api.dependencies.repository import get_repository
 from src.config.settings.const import ANONYMOUS_USER
 from src.models.schemas.account import AccountInResponse, AccountInUpdate, AccountWithToken
+from src.models.schemas.jwt import Principal
 from src.repository.crud.account import AccountCRUDRepository
 from src.securities.authorizations.jwt import jwt_generator, jwt_required
 from src.utilities.exceptions.database import EntityDoesNotExist
@@ -103,7 +105,7 @@ async def get_account(
     id: int,
     token: str = fastapi.Depends(oauth2_scheme),
     account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> AccountInResponse:
     """
     Get an account by id
@@ -137,10 +139,8 @@ async def get_account(
 
     except EntityDoesNotExist:
         raise await http_404_exc_id_not_found_request(id=id)
-    if jwt_payload.username != settings.ADMIN_USERNAME:
-        current_user = account_repo.read_account_by_username(username=jwt_payload.username)
-        if current_user != db_account:
-            raise await http_exc_401_cunauthorized_request()
+    if current_user.username != settings.ADMIN_USERNAME and current_user.id != db_account.id:
+        raise await http_exc_401_cunauthorized_request()
     return AccountInResponse(
         id=db_account.id,
         authorized_account=AccountWithToken(
@@ -166,7 +166,7 @@ async def update_account(
     token: str = fastapi.Depends(oauth2_scheme),
     account_update: AccountInUpdate = fastapi.Body(...),
     account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> AccountInResponse:
     """
     update current account info
@@ -206,15 +206,15 @@ async def update_account(
     }
 
     """
-    if jwt_payload.username == ANONYMOUS_USER:
+    if current_user.username == ANONYMOUS_USER:
         raise await http_exc_401_cunauthorized_request()
-    current_user = account_repo.read_account_by_username(username=jwt_payload.username)
-
     try:
-        updated_db_account = account_repo.update_account_by_id(id=current_user.id, account_update=account_update)
+        updated_db_account = await account_repo.update_account_by_id(
+            id=current_user.id, account_update=account_update
+        )
 
     except EntityDoesNotExist:
-        raise await http_404_exc_username_not_found_request(username=jwt_payload.username)
+        raise await http_404_exc_username_not_found_request(username=current_user.username)
     access_token = jwt_generator.generate_access_token(account=updated_db_account)
 
     return AccountInResponse(
@@ -284,7 +284,7 @@ async def update_account_by_admin(
     if jwt_payload.username != settings.ADMIN_USERNAME:
         raise await http_exc_401_cunauthorized_request()
     try:
-        updated_db_account = account_repo.update_account_by_id(id=id, account_update=account_update)
+        updated_db_account = await account_repo.update_account_by_id(id=id, account_update=account_update)
 
     except EntityDoesNotExist:
         raise await http_404_exc_id_not_found_request(id=id)
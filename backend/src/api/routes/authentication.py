@@ -71,7 +71,7 @@ async def signup(
     except EntityAlreadyExists:
         raise await http_exc_400_credentials_bad_signup_request()
 
-    new_account = account_repo.create_account(account_create=account_create)
+    new_account = await account_repo.create_account(account_create=account_create)
     access_token = jwt_generator.generate_access_token(account=new_account)
 
     return AccountInResponse(
@@ -126,7 +126,7 @@ async def signin(
         raise await http_exc_400_credentials_bad_signin_request()
 
     try:
-        db_account = account_repo.read_user_by_password_authentication(account_login=account_login)
+        db_account = await account_repo.read_user_by_password_authentication(account_login=account_login)
 
     except Exception:
         raise await http_exc_400_credentials_bad_signin_request()
@@ -168,7 +168,7 @@ async def get_token(
     - **token**: The access token for the anonymous user
     """
     anonymous_user = AccountInLogin(username=ANONYMOUS_USER, password=ANONYMOUS_PASS)
-    db_account = account_repo.read_user_by_password_authentication(account_login=anonymous_user)
+    db_account = await account_repo.read_user_by_password_authentication(account_login=anonymous_user)
     access_token = jwt_generator.generate_access_token(account=db_account)
 
     return {"token": access_token}
@@ -194,7 +194,7 @@ async def login_for_access_token(
     - **token_type**: The token type
     """
     try:
-        db_account = account_repo.read_user_by_password_authentication(
+        db_account = await account_repo.read_user_by_password_authentication(
             account_login=AccountInLogin(username=form_data.username, password=form_data.password)
         )
     except Exception as e:
@@ -13,15 +13,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import json
+
 import fastapi
 import loguru
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.responses import StreamingResponse
 from starlette.responses import ContentStream
 from src.api.dependencies.repository import get_rag_repository, get_repository
-from src.securities.authorizations.jwt import jwt_required
+from src.api.dependencies.principal import get_current_principal
+from src.models.schemas.jwt import Principal
 from src.utilities.exceptions.database import EntityDoesNotExist
+from src.utilities.exceptions.http.exc_400 import http_400_exc_bad_cursor_request
 from src.utilities.exceptions.http.exc_404 import http_404_exc_uuid_not_found_request
+from src.utilities.exceptions.http.exc_429 import http_429_exc_too_many_generations_request
+from src.utilities.exceptions.http.exc_503 import http_503_exc_inference_overloaded_request
+from src.utilities.exceptions.admission import AdmissionRejected
 from src.config.settings.const import ANONYMOUS_USER
 from src.config.manager import settings
 from src.models.schemas.chat import (
@@ -36,8 +44,9 @@ from src.models.schemas.chat import (
     SaveChatHistory,
 )
 from src.repository.crud.chat import ChatHistoryCRUDRepository, SessionCRUDRepository
-from src.repository.crud.account import AccountCRUDRepository
 from src.repository.rag.chat import RAGChatModelRepository
+from src.repository.admission_eng import AdmittedStreamingResponse, admission_controller
+from src.utilities.formatters.datetime_formatter import format_datetime_into_isoformat
 from src.utilities.formatters.ds_formatter import DatasetFormatter
 
 router = fastapi.APIRouter(prefix="/chat", tags=["chatbot"])
@@ -55,8 +64,7 @@ async def update_session(
     token: str = fastapi.Depends(oauth2_scheme),
     session_info: SessionUpdate = fastapi.Body(...),
     session_repo: SessionCRUDRepository = fastapi.Depends(get_repository(repo_type=SessionCRUDRepository)),
-    account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> ChatUUIDResponse:
     """
     update session info by session uuid
@@ -84,7 +92,6 @@ async def update_session(
     {"sessionUuid": "3917151c-173b-4a9e-92aa-ac1d633472d2"}
 
     """
-    current_user = account_repo.read_account_by_username(username=jwt_payload.username)
     try:
         session_repo.update_sessions_by_uuid(session=session_info, account_id=current_user.id)
 
@@ -102,8 +109,7 @@ async def delete_session(
     uuid: str,
     token: str = fastapi.Depends(oauth2_scheme),
     session_repo: SessionCRUDRepository = fastapi.Depends(get_repository(repo_type=SessionCRUDRepository)),
-    account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> dict[str, str]:
     """
     Delete a session by uuid
@@ -127,7 +133,6 @@ async def delete_session(
     "notification": "Session with uuid 'fa250ff0-fb22-49f5-a7f9-2b057b7a7398' is successfully deleted!"
     }
     """
-    current_user = account_repo.read_account_by_username(username=jwt_payload.username)
     account_id=current_user.id
     if current_user.username == settings.ADMIN_USERNAME: 
         account_id=0
@@ -149,8 +154,7 @@ async def delete_session(
 async def chat_uuid(
     token: str = fastapi.Depends(oauth2_scheme),
     session_repo: SessionCRUDRepository = fastapi.Depends(get_repository(repo_type=SessionCRUDRepository)),
-    account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> ChatUUIDResponse:
     """
     Create a new session for the current user.
@@ -171,7 +175,6 @@ async def chat_uuid(
     """
 
     # multiple await keyword will caused the error
-    current_user = account_repo.read_account_by_username(username=jwt_payload.username)
     new_session = session_repo.create_session(account_id=current_user.id, name="new session")
     session_uuid = new_session.session_uuid
 
@@ -189,8 +192,7 @@ async def search(
     token: str = fastapi.Depends(oauth2_scheme),
     session_repo: SessionCRUDRepository = fastapi.Depends(get_repository(repo_type=SessionCRUDRepository)),
     rag_chat_repo: RAGChatModelRepository = fastapi.Depends(get_rag_repository(repo_type=RAGChatModelRepository)),
-    account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> SearchResponse:
     """
     Search rag result with give messages and session.
@@ -227,8 +229,6 @@ async def search(
     # Note: await keyword will cause issue. See https://github.com/sqlalchemy/sqlalchemy/discussions/9757
     #
 
-    current_user = account_repo.read_account_by_username(username=jwt_payload.username)
-
     # TODO: Only read session here @Micost
     session = session_repo.read_create_sessions_by_uuid(
         session_uuid=search_in_msg.sessionUuid, account_id=current_user.id, name=search_in_msg.message[:20]
@@ -239,7 +239,7 @@ async def search(
             if session.dataset_name is None:
                 return SearchResponse(context= None, score=0)
             else:
-                context = rag_chat_repo.search_context(
+                context = await rag_chat_repo.search_context(
                     input_msg=search_in_msg.message,
                     collection_name=session.dataset_name
                     )
@@ -261,8 +261,7 @@ async def chat(
     token: str = fastapi.Depends(oauth2_scheme),
     session_repo: SessionCRUDRepository = fastapi.Depends(get_repository(repo_type=SessionCRUDRepository)),
     rag_chat_repo: RAGChatModelRepository = fastapi.Depends(get_rag_repository(repo_type=RAGChatModelRepository)),
-    account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> StreamingResponse:
     """
     Chat with the AI-powered chatbot.
@@ -312,12 +311,19 @@ async def chat(
     # Note: await keyword will cause issue. See https://github.com/sqlalchemy/sqlalchemy/discussions/9757
     #
 
-    current_user = account_repo.read_account_by_username(username=jwt_payload.username)
-
     # TODO: Only read session here @Micost
     session = session_repo.read_create_sessions_by_uuid(
         session_uuid=chat_in_msg.sessionUuid, account_id=current_user.id, name=chat_in_msg.message[:20]
     )
+    # Wait for a free slot of the inference engine, the status code can't change once the stream started.
+    # All anonymous users share one account, they are queued per session instead
+    admission_key = session.session_uuid if current_user.username == ANONYMOUS_USER else current_user.id
+    try:
+        permit = await admission_controller.acquire(admission_key)
+    except AdmissionRejected as e:
+        if e.overloaded:
+            raise await http_503_exc_inference_overloaded_request(retry_after=e.retry_after)
+        raise await http_429_exc_too_many_generations_request(retry_after=e.retry_after)
     match session.session_type:
         case "rag":
             # Verify dataset_name exist
@@ -351,8 +357,12 @@ async def chat(
             )
 
     # Buffering (the real problem) https://serverfault.com/questions/801628/for-server-sent-events-sse-what-nginx-proxy-configuration-is-appropriate/801629#
-    return StreamingResponse(
-        stream_func, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, media_type="text/event-stream"
+    # The permit is released by the response, even if the client leaves before the stream starts
+    return AdmittedStreamingResponse(
+        permit,
+        admission_controller.admitted(permit, stream_func),
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        media_type="text/event-stream",
     )
 
 
@@ -365,14 +375,12 @@ async def chat(
 async def get_session(
     token: str = fastapi.Depends(oauth2_scheme),
     session_repo: SessionCRUDRepository = fastapi.Depends(get_repository(repo_type=SessionCRUDRepository)),
-    account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> list[SessionResponse]:
     sessions_list: list = list()
     # Anonymous user won't related to any session
-    if jwt_payload.username == ANONYMOUS_USER:
+    if current_user.username == ANONYMOUS_USER:
         return sessions_list
-    current_user = account_repo.read_account_by_username(username=jwt_payload.username)
     sessions = session_repo.read_sessions_by_account_id(id=current_user.id)
     for session in sessions:
         loguru.logger.info(f"Session Details --- {session.name}")
@@ -401,11 +409,13 @@ async def get_session(
 )
 async def get_chathistory(
     uuid: str,
+    response: fastapi.Response,
+    limit: int = fastapi.Query(default=50, ge=1, le=settings.CHAT_HISTORY_MAX_PAGE_SIZE),
+    cursor: str | None = None,
     token: str = fastapi.Depends(oauth2_scheme),
     chat_repo: ChatHistoryCRUDRepository = fastapi.Depends(get_repository(repo_type=ChatHistoryCRUDRepository)),
     session_repo: SessionCRUDRepository = fastapi.Depends(get_repository(repo_type=SessionCRUDRepository)),
-    account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> list[ChatsWithTime]:
     """
 
@@ -413,7 +423,8 @@ async def get_chathistory(
     
     **Note:**
     Will verify if the user has access to the session
-    Upper limit of the chat history is 50
+    The messages are returned in order, `limit` (50 by default) per page. If there are more, the cursor of
+    the next page is in the `X-Next-Cursor` header, pass it as `cursor` to get the next page.
     
     **Example of the request body:**
 
@@ -450,20 +461,72 @@ async def get_chathistory(
     ]
     ```
     """
-    current_user = account_repo.read_account_by_username(username=jwt_payload.username)
     if session_repo.verify_session_by_account_id(session_uuid=uuid, account_id=current_user.id) is False:
-        raise http_404_exc_uuid_not_found_request(uuid=uuid)
-    chats = chat_repo.read_chat_history_by_session_uuid(uuid=uuid)
-    chats_list: list = list()
-    for chat in chats:
-        res_session = ChatsWithTime(
-            role=chat.role,
-            message=chat.message,
-            create_at=chat.created_at,
-        )
-        chats_list.append(res_session)
+        raise await http_404_exc_uuid_not_found_request(uuid=uuid)
+    try:
+        chats, next_cursor = chat_repo.read_chat_history_page(uuid=uuid, limit=limit, cursor=cursor)
+    except ValueError:
+        raise await http_400_exc_bad_cursor_request(cursor=cursor)
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    # Validated and serialized once by the response model
+    return [{"role": chat["role"], "message": chat["message"], "create_at": chat["created_at"]} for chat in chats]
 
-    return chats_list
+
+@router.get(
+    path="/history/{uuid}/export",
+    name="chat:export-chat-history-by-session-uuid",
+    status_code=fastapi.status.HTTP_200_OK,
+)
+async def export_chathistory(
+    uuid: str,
+    token: str = fastapi.Depends(oauth2_scheme),
+    chat_repo: ChatHistoryCRUDRepository = fastapi.Depends(get_repository(repo_type=ChatHistoryCRUDRepository)),
+    session_repo: SessionCRUDRepository = fastapi.Depends(get_repository(repo_type=SessionCRUDRepository)),
+    current_user: Principal = fastapi.Depends(get_current_principal),
+) -> StreamingResponse:
+    """
+
+    Export the whole chat history of a session as NDJSON, one message per line in order
+
+    **Note:**
+    Will verify if the user has access to the session
+    The history is read and sent page by page, so long conversations are never held in memory at once
+
+    **Example of the request:**
+
+    ```bash
+    curl -X 'GET' \
+    'http://127.0.0.1:8000/api/chat/history/6dcf3f30-4521-4d8e-b944-e7e1b80c4861/export' \
+    -H 'Authorization: Bearer <token>'
+    ```
+
+    **Returns**
+    ```
+    {"role": "user", "message": "hello 1", "createAt": "2024-07-12T14:01:22.368000Z"}
+    {"role": "assistant", "message": "hello 2", "createAt": "2024-07-12T14:01:22.368000Z"}
+    ```
+    """
+    if session_repo.verify_session_by_account_id(session_uuid=uuid, account_id=current_user.id) is False:
+        raise await http_404_exc_uuid_not_found_request(uuid=uuid)
+
+    def ndjson_pages():
+        # A sync generator, so starlette reads the pages from the meta database in its thread pool
+        for page in chat_repo.iter_chat_history(uuid=uuid, page_size=settings.CHAT_HISTORY_MAX_PAGE_SIZE):
+            yield "".join(
+                json.dumps(
+                    {
+                        "role": chat["role"],
+                        "message": chat["message"],
+                        "createAt": format_datetime_into_isoformat(chat["created_at"]),
+                    }
+                )
+                + "\n"
+                for chat in page
+            )
+
+    return StreamingResponse(ndjson_pages(), media_type="application/x-ndjson")
 
 
 @router.post(
@@ -477,8 +540,7 @@ async def save_chats(
     token: str = fastapi.Depends(oauth2_scheme),
     session_repo: SessionCRUDRepository = fastapi.Depends(get_repository(repo_type=SessionCRUDRepository)),
     chat_repo: ChatHistoryCRUDRepository = fastapi.Depends(get_repository(repo_type=ChatHistoryCRUDRepository)),
-    account_repo: AccountCRUDRepository = fastapi.Depends(get_repository(repo_type=AccountCRUDRepository)),
-    jwt_payload: dict = fastapi.Depends(jwt_required),
+    current_user: Principal = fastapi.Depends(get_current_principal),
 ) -> ChatUUIDResponse:
     """
 
@@ -525,7 +587,6 @@ async def save_chats(
     {"sessionUuid": "6dcf3f30-4521-4d8e-b944-e7e1b80c4861"}
 
     """
-    current_user = account_repo.read_account_by_username(username=jwt_payload.username)
     if (
         session_repo.verify_session_by_account_id(
             session_uuid=chat_in_msg.sessionUuid, account_id=current_user.id
@@ -534,5 +595,7 @@ async def save_chats(
     ):
         raise http_404_exc_uuid_not_found_request(uuid=chat_in_msg.sessionUuid)
     session = session_repo.read_sessions_by_uuid(session_uuid=chat_in_msg.sessionUuid)
-    chat_repo.load_create_chat_history(session_uuid=session.session_uuid, chats=chat_in_msg.chats)
+    await asyncio.to_thread(
+        chat_repo.load_create_chat_history, session_uuid=session.session_uuid, chats=chat_in_msg.chats
+    )
     return ChatUUIDResponse(sessionUuid=chat_in_msg.sessionUuid)
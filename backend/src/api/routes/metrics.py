@@ -0,0 +1,51 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fastapi
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+
+router = fastapi.APIRouter(prefix="/metrics", tags=["metrics"])
+
+
+@router.get(
+    path="",
+    name="metrics:get-metrics",
+    response_model=dict,
+    status_code=fastapi.status.HTTP_200_OK,
+)
+async def get_metrics() -> dict:
+    """
+    Get the runtime metrics of the current worker
+
+    ```bash
+    curl http://localhost:8000/api/metrics
+    ```
+
+    Return a dictionary of metrics by name, histograms are reported with cumulative buckets:
+
+    ```
+    {
+        "embedding_batch_size": {
+            "type": "histogram",
+            "description": "Number of contents sent per embedding request",
+            "buckets": {"1": 3, "2": 5, ..., "+Inf": 9},
+            "sum": 31,
+            "count": 9
+        }
+    }
+    ```
+    """
+    return metrics_kit.snapshot()
@@ -20,13 +20,23 @@ import loguru
 
 from src.repository.events import (
     initialize_meta_database,
+    initialize_embedding_cache,
+    initialize_endpoint_probes,
     dispose_httpx_client,
+    dispose_meta_db,
+    dispose_vector_db,
+    dispose_embedding_cache,
+    dispose_ingestion_pool,
+    dispose_hashing_pool,
+    dispose_endpoint_probes,
 )
 
 
 def execute_backend_server_event_handler(backend_app: fastapi.FastAPI) -> typing.Any:
     async def launch_backend_server_events() -> None:
         await initialize_meta_database()
+        await initialize_embedding_cache()
+        await initialize_endpoint_probes()
 
     return launch_backend_server_events
 
@@ -34,6 +44,12 @@ def execute_backend_server_event_handler(backend_app: fastapi.FastAPI) -> typing
 def terminate_backend_server_event_handler(backend_app: fastapi.FastAPI) -> typing.Any:
     @loguru.logger.catch
     async def stop_backend_server_events() -> None:
+        await dispose_ingestion_pool()
+        await dispose_hashing_pool()
+        await dispose_endpoint_probes()
         await dispose_httpx_client()
+        await dispose_meta_db()
+        await dispose_vector_db()
+        await dispose_embedding_cache()
 
     return stop_backend_server_events
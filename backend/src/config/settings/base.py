@@ -85,15 +85,74 @@ class BackendBaseSettings(BaseSettings):
     HASHING_ALGORITHM_LAYER_2: str = decouple.config("HASHING_ALGORITHM_LAYER_2", cast=str)  # type: ignore
     HASHING_SALT: str = decouple.config("HASHING_SALT", cast=str)  # type: ignore
     JWT_ALGORITHM: str = decouple.config("JWT_ALGORITHM", cast=str)  # type: ignore
+    # Verified tokens kept in memory until they expire, so a token is only decoded on its first request
+    JWT_CACHE_ENTRIES: int = decouple.config("JWT_CACHE_ENTRIES", default=10000, cast=int)  # type: ignore
+    # Processes hashing the passwords, a signin storm queues up here instead of stalling the event loop
+    HASHING_WORKERS: int = decouple.config("HASHING_WORKERS", default=2, cast=int)  # type: ignore
 
     INFERENCE_ENG: str = decouple.config("INFERENCE_ENG", cast=str)  # type: ignore
     INFERENCE_ENG_PORT: int = decouple.config("INFERENCE_ENG_PORT", cast=int)  # type: ignore
     INFERENCE_ENG_VERSION: str = decouple.config("INFERENCE_ENG_VERSION", cast=str)  # type: ignore
+    # Context size the inference engine is started with (`-c`), shared by its slots, the prompt and n_predict
+    # must fit in the context of one slot
+    INFERENCE_ENG_CTX_SIZE: int = decouple.config("INFERENCE_ENG_CTX_SIZE", default=8192, cast=int)  # type: ignore
+    # Tokens kept free for the answer when n_predict does not bound it (-1, generate until stop)
+    INFERENCE_ENG_ANSWER_TOKENS: int = decouple.config("INFERENCE_ENG_ANSWER_TOKENS", default=512, cast=int)  # type: ignore
+    # Connection pool of each upstream engine, the inference and the embedding engines get one each
+    HTTPX_MAX_CONNECTIONS: int = decouple.config("HTTPX_MAX_CONNECTIONS", default=100, cast=int)  # type: ignore
+    HTTPX_MAX_KEEPALIVE_CONNECTIONS: int = decouple.config("HTTPX_MAX_KEEPALIVE_CONNECTIONS", default=20, cast=int)  # type: ignore
+    HTTPX_KEEPALIVE_EXPIRY_SEC: float = decouple.config("HTTPX_KEEPALIVE_EXPIRY_SEC", default=30.0, cast=float)  # type: ignore
+    # Timeouts of the upstream requests, the read timeout is the longest silence between two chunks of a stream,
+    # including the prompt processing before the first token
+    HTTPX_CONNECT_TIMEOUT_SEC: float = decouple.config("HTTPX_CONNECT_TIMEOUT_SEC", default=5.0, cast=float)  # type: ignore
+    HTTPX_READ_TIMEOUT_SEC: float = decouple.config("HTTPX_READ_TIMEOUT_SEC", default=300.0, cast=float)  # type: ignore
+    HTTPX_WRITE_TIMEOUT_SEC: float = decouple.config("HTTPX_WRITE_TIMEOUT_SEC", default=30.0, cast=float)  # type: ignore
+    # Longest wait for a free connection of the pool
+    HTTPX_POOL_TIMEOUT_SEC: float = decouple.config("HTTPX_POOL_TIMEOUT_SEC", default=10.0, cast=float)  # type: ignore
+    # Bytes of SSE frames read ahead of a slow client and sent to it as one chunk, 0 to send frame by frame
+    SSE_COALESCE_MAX_BYTES: int = decouple.config("SSE_COALESCE_MAX_BYTES", default=65536, cast=int)  # type: ignore
+    # Replicas of the inference engine as comma separated host:port, INFERENCE_ENG:INFERENCE_ENG_PORT if empty
+    INFERENCE_ENG_ENDPOINTS: str = decouple.config("INFERENCE_ENG_ENDPOINTS", default="", cast=str)  # type: ignore
+    # An endpoint failing this many requests in a row, or its `/health` probe, is left out for ENDPOINT_EJECT_SEC
+    ENDPOINT_MAX_FAILURES: int = decouple.config("ENDPOINT_MAX_FAILURES", default=3, cast=int)  # type: ignore
+    ENDPOINT_EJECT_SEC: float = decouple.config("ENDPOINT_EJECT_SEC", default=30.0, cast=float)  # type: ignore
+    ENDPOINT_PROBE_INTERVAL_SEC: float = decouple.config("ENDPOINT_PROBE_INTERVAL_SEC", default=10.0, cast=float)  # type: ignore
+    # A session stays on its endpoint unless it has this many more requests in flight than the least busy one
+    ENDPOINT_STICKY_SLACK: int = decouple.config("ENDPOINT_STICKY_SLACK", default=2, cast=int)  # type: ignore
+    # Parallel slots the inference engine is started with (`-np`), every slot keeps the prompt of its last request
+    INFERENCE_ENG_SLOTS: int = decouple.config("INFERENCE_ENG_SLOTS", default=1, cast=int)  # type: ignore
+    # Pin the sessions to the slots of the engine, see `SlotAffinity`. The pins are kept per worker process and
+    # llama.cpp queues a request for a busy slot instead of failing it, so the workers would wait on each other's
+    # slots: on by default with a single worker only, the engine picks the slots otherwise
+    INFERENCE_ENG_SLOT_AFFINITY: bool = decouple.config("INFERENCE_ENG_SLOT_AFFINITY", default=BACKEND_SERVER_WORKERS <= 1, cast=bool)  # type: ignore
+    # At most INFERENCE_ENG_SLOTS generations per replica run at once, the others wait in a queue fair between the
+    # accounts and are rejected with a Retry-After once the queue is full or they waited too long. The slots are
+    # split between the BACKEND_SERVER_WORKERS worker processes, the queue limits are per worker process
+    ADMISSION_MAX_QUEUED: int = decouple.config("ADMISSION_MAX_QUEUED", default=64, cast=int)  # type: ignore
+    ADMISSION_MAX_QUEUED_PER_ACCOUNT: int = decouple.config("ADMISSION_MAX_QUEUED_PER_ACCOUNT", default=4, cast=int)  # type: ignore
+    ADMISSION_QUEUE_TIMEOUT_SEC: float = decouple.config("ADMISSION_QUEUE_TIMEOUT_SEC", default=30.0, cast=float)  # type: ignore
+    # Number of token counts of prompts and contexts kept in memory
+    TOKENIZER_CACHE_ENTRIES: int = decouple.config("TOKENIZER_CACHE_ENTRIES", default=10000, cast=int)  # type: ignore
+    # Prior turns of a session sent with every question, at most this many messages and tokens
+    CONVERSATION_MAX_MESSAGES: int = decouple.config("CONVERSATION_MAX_MESSAGES", default=64, cast=int)  # type: ignore
+    CONVERSATION_MAX_TOKENS: int = decouple.config("CONVERSATION_MAX_TOKENS", default=2048, cast=int)  # type: ignore
+    # Once the turns overflow, the oldest are dropped down to this share of the budget, so the prompt prefix
+    # stays the same for the next few turns and the inference engine reuses its prompt cache
+    CONVERSATION_WINDOW_REFILL: float = decouple.config("CONVERSATION_WINDOW_REFILL", default=0.5, cast=float)  # type: ignore
+    # Sessions whose window start is kept in memory
+    CONVERSATION_WINDOW_SESSIONS: int = decouple.config("CONVERSATION_WINDOW_SESSIONS", default=10000, cast=int)  # type: ignore
+    # Share of the prompt budget of a RAG question kept for the retrieved contexts, the prior turns get the rest
+    CONVERSATION_RAG_CONTEXT_SHARE: float = decouple.config("CONVERSATION_RAG_CONTEXT_SHARE", default=0.5, cast=float)  # type: ignore
 
     # Configurations for language model
     LANGUAGE_MODEL_NAME: str = decouple.config("LANGUAGE_MODEL_NAME", cast=str)  # type: ignore
     EMBEDDING_MODEL_NAME: str = decouple.config("EMBEDDING_MODEL_NAME", cast=str)  # type: ignore
 
+    # Accounts resolved from the JWT of every request, a cached account is at most ACCOUNT_CACHE_TTL_SEC old
+    # in the other workers after it was updated or deleted
+    ACCOUNT_CACHE_ENTRIES: int = decouple.config("ACCOUNT_CACHE_ENTRIES", default=10000, cast=int)  # type: ignore
+    ACCOUNT_CACHE_TTL_SEC: float = decouple.config("ACCOUNT_CACHE_TTL_SEC", default=60.0, cast=float)  # type: ignore
+
     # Admin setting
     ADMIN_USERNAME: str = decouple.config("ADMIN_USERNAME", cast=str)  # type: ignore
     ADMIN_EMAIL: str = decouple.config("ADMIN_EMAIL", cast=str)  # type: ignore
@@ -106,7 +165,56 @@ class BackendBaseSettings(BaseSettings):
 
     EMBEDDING_ENG: str = decouple.config("EMBEDDING_ENG", cast=str)  # type: ignore
     EMBEDDING_ENG_PORT: int = decouple.config("EMBEDDING_ENG_PORT", cast=int)  # type: ignore
+    # Replicas of the embedding engine as comma separated host:port, EMBEDDING_ENG:EMBEDDING_ENG_PORT if empty
+    EMBEDDING_ENG_ENDPOINTS: str = decouple.config("EMBEDDING_ENG_ENDPOINTS", default="", cast=str)  # type: ignore
     NUM_CPU_CORES_EMBEDDING: int = decouple.config("NUM_CPU_CORES_EMBEDDING", cast=str)  # type: ignore
+    # Micro-batching in front of the embedding engine, tune them against NUM_CPU_CORES_EMBEDDING
+    EMBEDDING_BATCH_SIZE: int = decouple.config("EMBEDDING_BATCH_SIZE", default=32, cast=int)  # type: ignore
+    EMBEDDING_BATCH_WAIT_MS: float = decouple.config("EMBEDDING_BATCH_WAIT_MS", default=5.0, cast=float)  # type: ignore
+    # Embedding cache, the disk tier is shared by all workers and disabled when the path is empty
+    EMBEDDING_CACHE_MAX_BYTES: int = decouple.config("EMBEDDING_CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int)  # type: ignore
+    EMBEDDING_CACHE_TTL_SEC: float = decouple.config("EMBEDDING_CACHE_TTL_SEC", default=3600.0, cast=float)  # type: ignore
+    EMBEDDING_CACHE_DISK_PATH: str = decouple.config("EMBEDDING_CACHE_DISK_PATH", default="", cast=str)  # type: ignore
+
+    # Replay the answer of a near-duplicate RAG question instead of generating it again
+    SEMANTIC_CACHE_ENABLED: bool = decouple.config("SEMANTIC_CACHE_ENABLED", default=True, cast=bool)  # type: ignore
+    SEMANTIC_CACHE_MAX_DISTANCE: float = decouple.config("SEMANTIC_CACHE_MAX_DISTANCE", default=0.05, cast=float)  # type: ignore
+    # Cached answers expire after SEMANTIC_CACHE_TTL_SEC, the oldest are evicted beyond SEMANTIC_CACHE_MAX_ENTRIES
+    SEMANTIC_CACHE_TTL_SEC: float = decouple.config("SEMANTIC_CACHE_TTL_SEC", default=86400.0, cast=float)  # type: ignore
+    SEMANTIC_CACHE_MAX_ENTRIES: int = decouple.config("SEMANTIC_CACHE_MAX_ENTRIES", default=100000, cast=int)  # type: ignore
+
+    # Size of the thread pool running the blocking vector database queries
+    VECTOR_DB_SEARCH_WORKERS: int = decouple.config("VECTOR_DB_SEARCH_WORKERS", default=4, cast=int)  # type: ignore
+    # Seconds between two checks of the latest version of a cached table handle
+    VECTOR_DB_TABLE_REFRESH_SEC: float = decouple.config("VECTOR_DB_TABLE_REFRESH_SEC", default=1.0, cast=float)  # type: ignore
+    # Same for the meta database, kept short so the writes of the other workers are seen almost at once
+    META_DB_TABLE_REFRESH_SEC: float = decouple.config("META_DB_TABLE_REFRESH_SEC", default=0.1, cast=float)  # type: ignore
+    # Background compaction and indexing of the meta tables, every append leaves a small unindexed fragment behind
+    META_DB_MAINTENANCE_INTERVAL_SEC: float = decouple.config("META_DB_MAINTENANCE_INTERVAL_SEC", default=300.0, cast=float)  # type: ignore
+    META_DB_COMPACTION_MIN_FRAGMENTS: int = decouple.config("META_DB_COMPACTION_MIN_FRAGMENTS", default=16, cast=int)  # type: ignore
+    # Versions older than this are deleted after a compaction, readers of other workers may still use them until then
+    META_DB_VERSION_RETENTION_SEC: float = decouple.config("META_DB_VERSION_RETENTION_SEC", default=3600.0, cast=float)  # type: ignore
+    # Ids reserved at once by a worker from the `next_id` table, the unused ones of a block are lost on restart
+    META_DB_ID_BLOCK_SIZE: int = decouple.config("META_DB_ID_BLOCK_SIZE", default=32, cast=int)  # type: ignore
+    # Largest page of `/chat/history`, and the page size the NDJSON export reads with
+    CHAT_HISTORY_MAX_PAGE_SIZE: int = decouple.config("CHAT_HISTORY_MAX_PAGE_SIZE", default=500, cast=int)  # type: ignore
+    # A dataset table gets an IVF-PQ index once it holds this many rows, smaller tables are scanned
+    VECTOR_DB_INDEX_MIN_ROWS: int = decouple.config("VECTOR_DB_INDEX_MIN_ROWS", default=50000, cast=int)  # type: ignore
+    # Partitions probed and candidates re-ranked with the full vectors per searched row of an indexed table
+    VECTOR_DB_SEARCH_NPROBES: int = decouple.config("VECTOR_DB_SEARCH_NPROBES", default=20, cast=int)  # type: ignore
+    VECTOR_DB_SEARCH_REFINE_FACTOR: int = decouple.config("VECTOR_DB_SEARCH_REFINE_FACTOR", default=10, cast=int)  # type: ignore
+    # Hits fetched per requested hit, the duplicated contexts are dropped from them before the top k are kept
+    VECTOR_DB_SEARCH_OVERFETCH: int = decouple.config("VECTOR_DB_SEARCH_OVERFETCH", default=2, cast=int)  # type: ignore
+
+    # Dataset ingestion jobs, the pool is kept small so loading datasets does not starve the chat traffic
+    INGESTION_WORKERS: int = decouple.config("INGESTION_WORKERS", default=1, cast=int)  # type: ignore
+    INGESTION_MAX_ATTEMPTS: int = decouple.config("INGESTION_MAX_ATTEMPTS", default=3, cast=int)  # type: ignore
+    INGESTION_PROGRESS_INTERVAL_SEC: float = decouple.config("INGESTION_PROGRESS_INTERVAL_SEC", default=2.0, cast=float)  # type: ignore
+    # Raw text datasets are split into chunks of words, the chunks must fit in the context of the embedding engine
+    INGESTION_CHUNK_SIZE: int = decouple.config("INGESTION_CHUNK_SIZE", default=128, cast=int)  # type: ignore
+    INGESTION_CHUNK_OVERLAP: int = decouple.config("INGESTION_CHUNK_OVERLAP", default=16, cast=int)  # type: ignore
+    # Embedding requests in flight per ingestion job, match it with the parallel slots of the embedding engine
+    INGESTION_EMBEDDING_CONCURRENCY: int = decouple.config("INGESTION_EMBEDDING_CONCURRENCY", default=4, cast=int)  # type: ignore
 
     METRICS_PATHS: str = decouple.config("METRICS_PATHS", cast=str)  # type: ignore
     DEFAULT_RAG_DS_NAME: str = decouple.config("DEFAULT_RAG_DS_NAME", cast=str)  # type: ignore
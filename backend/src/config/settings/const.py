@@ -7,6 +7,7 @@ DATASET_LANCEDB = "/vdata/rag-lancedb"
 META_LANCEDB = "/vdata/meta-lancedb"
 # embedding dimension depending on model
 DEFAULT_DIM = 384
+SEMANTIC_CACHE_TABLE = "semantic_cache"
 
 # DEFAULT MODELS
 # CONVERSATION
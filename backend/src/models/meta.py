@@ -1,5 +1,7 @@
 import pyarrow as pa
 
+from src.config.settings.const import DEFAULT_DIM
+
 Account = pa.schema(
   [
       pa.field("id", pa.int64()),
@@ -32,6 +34,7 @@ Session = pa.schema(
 ChatHistory = pa.schema(
   [
       pa.field("session_uuid", pa.string()),
+      pa.field("seq", pa.int64()),
       pa.field("role", pa.string()),
       pa.field("message", pa.string()),
       pa.field("created_at", pa.timestamp('ms')),
@@ -46,3 +49,31 @@ DataSet = pa.schema(
       pa.field("created_at", pa.timestamp('s')),
       pa.field("updated_at", pa.timestamp('s')),
   ])
+
+IngestionJob = pa.schema(
+  [
+      pa.field("job_id", pa.string()),
+      pa.field("account_id", pa.int64()),
+      pa.field("dataset_name", pa.string()),
+      pa.field("table_name", pa.string()),
+      pa.field("text_column", pa.string()),
+      pa.field("status", pa.string()),
+      pa.field("attempts", pa.int64()),
+      pa.field("rows_ingested", pa.int64()),
+      pa.field("total_rows", pa.int64()),
+      pa.field("error", pa.string()),
+      pa.field("created_at", pa.timestamp('s')),
+      pa.field("started_at", pa.timestamp('s')),
+      pa.field("updated_at", pa.timestamp('s')),
+      pa.field("finished_at", pa.timestamp('s')),
+  ])
+
+SemanticCacheEntry = pa.schema(
+  [
+      pa.field("table_name", pa.string()),
+      pa.field("params_key", pa.string()),
+      pa.field("question", pa.string()),
+      pa.field("answer", pa.string()),
+      pa.field("vector", pa.list_(pa.float32(), DEFAULT_DIM)),
+      pa.field("created_at", pa.timestamp('s')),
+  ])
@@ -133,6 +133,7 @@ class Session(BaseSchemaModel):
 
 class ChatHistory(BaseSchemaModel):
     session_uuid: str
+    seq: int
     role: str
     message: str
     created_at: datetime.datetime
@@ -38,6 +38,11 @@ class RagDatasetCreate(BaseSchemaModel):
     dataset_name: str = Field(..., title="DataSet Name", description="DataSet Name")
     des: str | None = Field(..., title="Details", description="Details")
     ratio: Optional[float] = Field(..., title="Ratio", description="Ratio")
+    text_column: Optional[str] = Field(
+        default=None,
+        title="Text Column",
+        description="Column of raw texts to chunk and embed, leave it empty for a dataset with embeddings",
+    )
 
 
 class RagDatasetResponse(BaseSchemaModel):
@@ -52,10 +57,24 @@ class LoadRAGDSResponse(BaseSchemaModel):
     dataset_name: str = Field(..., title="DataSet Name", description="DataSet Name")
     status: bool = Field(default=False, title="Status", description="Status")
     session_uuid: str = Field(..., title="Session UUID", description="Session UUID")
+    job_id: str | None = Field(default=None, title="Job ID", description="ID of the ingestion job loading the dataset")
     # created_at: datetime.datetime | None = Field(..., title="Creation time", description="Creation time")
     # updated_at: datetime.datetime | None = Field(..., title="Update  time", description="Update time")
     # ratio: Optional[float] = Field(..., title="Ratio", description="Ratio")
 
+class IndexRebuild(BaseSchemaModel):
+    dataset_name: str = Field(..., title="DataSet Name", description="DataSet Name")
+
+
+class IndexStatusResponse(BaseSchemaModel):
+    dataset_name: str = Field(..., title="DataSet Name", description="DataSet Name")
+    table_name: str = Field(..., title="Table Name", description="Table Name")
+    num_rows: int = Field(..., title="Rows", description="Number of rows in the table")
+    index_type: str | None = Field(..., title="Index Type", description="Type of the vector index, None if scanned")
+    num_indexed_rows: int = Field(..., title="Indexed Rows", description="Number of rows covered by the index")
+    num_unindexed_rows: int = Field(..., title="Unindexed Rows", description="Number of rows appended since the index was updated")
+
+
 class DataSet(BaseSchemaModel):  # type: ignore
     uuid: str
     name: str
@@ -66,4 +85,63 @@ class DataSet(BaseSchemaModel):  # type: ignore
 
     @classmethod
     def from_dict(cls, data: dict):
-        return cls(**data)
\ No newline at end of file
+        return cls(**data)
+
+
+class IngestionJob(BaseSchemaModel):  # type: ignore
+    job_id: str
+    account_id: int
+    dataset_name: str
+    table_name: str
+    text_column: Optional[str] = None
+    status: str
+    attempts: int
+    rows_ingested: int
+    total_rows: Optional[int] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime.datetime] = None
+    started_at: Optional[datetime.datetime] = None
+    updated_at: Optional[datetime.datetime] = None
+    finished_at: Optional[datetime.datetime] = None
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(**data)
+
+
+class IngestionJobResponse(BaseSchemaModel):
+    job_id: str = Field(..., title="Job ID", description="Job ID")
+    dataset_name: str = Field(..., title="DataSet Name", description="DataSet Name")
+    status: str = Field(..., title="Status", description="queued, running, succeeded, failed or cancelled")
+    attempts: int = Field(..., title="Attempts", description="Number of attempts so far")
+    rows_ingested: int = Field(..., title="Rows Ingested", description="Rows written by the current attempt")
+    total_rows: int | None = Field(..., title="Total Rows", description="Rows of the dataset, None if unknown")
+    rows_per_second: float | None = Field(..., title="Throughput", description="Rows written per second")
+    eta_seconds: float | None = Field(..., title="ETA", description="Seconds left, None if unknown")
+    error: str | None = Field(..., title="Error", description="Error of the last failed attempt")
+    created_at: datetime.datetime | None = Field(..., title="Creation time", description="Creation time")
+    finished_at: datetime.datetime | None = Field(..., title="Finish time", description="Finish time")
+
+    @classmethod
+    def from_job(cls, job: IngestionJob) -> "IngestionJobResponse":
+        rows_per_second = eta_seconds = None
+        end = job.finished_at or job.updated_at
+        if job.started_at is not None and end is not None and end > job.started_at:
+            rows_per_second = job.rows_ingested / (end - job.started_at).total_seconds()
+        if job.status == "succeeded":
+            eta_seconds = 0.0
+        elif rows_per_second and job.total_rows:
+            eta_seconds = max(0, job.total_rows - job.rows_ingested) / rows_per_second
+        return cls(
+            job_id=job.job_id,
+            dataset_name=job.dataset_name,
+            status=job.status,
+            attempts=job.attempts,
+            rows_ingested=job.rows_ingested,
+            total_rows=job.total_rows,
+            rows_per_second=rows_per_second,
+            eta_seconds=eta_seconds,
+            error=job.error,
+            created_at=job.created_at,
+            finished_at=job.finished_at,
+        )
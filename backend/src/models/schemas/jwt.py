@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 import datetime
 
 
@@ -8,5 +8,17 @@ class JWToken(BaseModel):
 
 
 class JWTAccount(BaseModel):
+    # Shared by the requests of the same token through the cache of verified tokens
+    model_config = ConfigDict(frozen=True)
+
     username: str = Field(..., title="username", description="username")
     email: EmailStr = Field(..., title="email", description="email")
+    account_id: int | None = Field(default=None, title="account id", description="account id")
+
+
+class Principal(BaseModel):
+    # The account of a request, see `get_current_principal`
+    model_config = ConfigDict(frozen=True)
+
+    id: int = Field(..., title="account id", description="account id")
+    username: str = Field(..., title="username", description="username")
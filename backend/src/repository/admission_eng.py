@@ -0,0 +1,219 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import collections
+import math
+import time
+import typing
+from collections.abc import AsyncGenerator
+
+from fastapi.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from src.config.manager import settings
+from src.repository.inference_eng import inference_pool
+from src.utilities.exceptions.admission import AdmissionRejected
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+# Seconds a generation is assumed to take until the first one is done
+INITIAL_GENERATION_SECONDS = 10.0
+# Weight of the last generation in the moving average of the generation time
+GENERATION_SECONDS_SMOOTHING = 0.2
+
+
+class Permit:
+    """
+    The right to run one generation, released once the generation is done
+    """
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+
+    def release(self) -> None:
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self._started)
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    Stream a generation and release its permit once the response is done, also when the client went away
+    before the stream was started, the stream itself is then never run and can not release the permit
+
+    Args:
+    permit (Permit): the permit of the generation
+    """
+
+    def __init__(self, permit: Permit, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.permit = permit
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.permit.release()
+
+
+class AdmissionController:
+    """
+    Admit the generations to the inference engine
+
+    At most `max_in_flight` generations run at once, the others would only slow every stream down. The count is
+    kept per process, so by default the slots of the engine replicas are split between the workers of the
+    backend, every worker admitting its share rounded up. The waiting generations are queued per account and the
+    queues are served round robin, so an account with many chats open does not delay the others. A generation
+    is rejected when its account already has `max_queued_per_account` of them waiting, when `max_queued` are
+    waiting overall, or when it waited more than `queue_timeout` seconds.
+
+    Args:
+    max_in_flight (int): maximum number of generations running at once
+    max_queued (int): maximum number of generations waiting
+    max_queued_per_account (int): maximum number of generations waiting per account
+    queue_timeout (float): seconds a generation waits at most
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = math.ceil(
+            settings.INFERENCE_ENG_SLOTS * len(inference_pool.endpoints) / max(1, settings.BACKEND_SERVER_WORKERS)
+        ),
+        max_queued: int = settings.ADMISSION_MAX_QUEUED,
+        max_queued_per_account: int = settings.ADMISSION_MAX_QUEUED_PER_ACCOUNT,
+        queue_timeout: float = settings.ADMISSION_QUEUE_TIMEOUT_SEC,
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queued = max_queued
+        self.max_queued_per_account = max_queued_per_account
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._num_queued = 0
+        # account -> its waiting generations, the account served next first
+        self._queues: collections.OrderedDict[typing.Hashable, collections.deque[asyncio.Future]] = (
+            collections.OrderedDict()
+        )
+        self._generation_seconds = INITIAL_GENERATION_SECONDS
+        self._queue_depth = metrics_kit.gauge("admission_queue_depth", "Generations waiting to be admitted")
+        self._running = metrics_kit.gauge("admission_in_flight", "Generations admitted and not done yet")
+        self._rejected = metrics_kit.counter("admission_rejected", "Generations rejected with a Retry-After")
+        self._wait = metrics_kit.histogram(
+            "admission_wait_seconds", (0.01, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0), "Time the generations waited"
+        )
+
+    async def acquire(self, account_id: typing.Hashable) -> Permit:
+        """
+        Wait for the turn of the generation
+
+        Args:
+        account_id (Hashable): the account asking for the generation, the session for the shared anonymous account
+
+        Returns:
+        Permit: to release once the generation is done
+
+        Raises:
+        AdmissionRejected: if the generation is not admitted
+        """
+        started = time.monotonic()
+        if self._in_flight < self.max_in_flight and self._num_queued == 0:
+            self._wait.observe(0.0)
+            return self._grant()
+        queue = self._queues.get(account_id)
+        if queue is not None and len(queue) >= self.max_queued_per_account:
+            raise self._reject(overloaded=False)
+        if self._num_queued >= self.max_queued:
+            raise self._reject(overloaded=True)
+
+        future: asyncio.Future[Permit] = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(account_id, collections.deque()).append(future)
+        self._num_queued += 1
+        self._queue_depth.set(self._num_queued)
+        try:
+            await asyncio.wait([future], timeout=self.queue_timeout)
+        except BaseException:
+            # Cancelled right after the turn came
+            if future.done() and not future.cancelled():
+                future.result().release()
+            raise
+        finally:
+            if not future.done():
+                # Timed out, or the request was cancelled meanwhile
+                future.cancel()
+                self._withdraw(account_id, future)
+        if future.cancelled():
+            raise self._reject(overloaded=True)
+        self._wait.observe(time.monotonic() - started)
+        return future.result()
+
+    async def admitted(
+        self, permit: Permit, stream: AsyncGenerator[typing.Any, None]
+    ) -> AsyncGenerator[typing.Any, None]:
+        """
+        Stream the generation and release its permit once it is done, failed or was abandoned by the client
+        """
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            permit.release()
+
+    @property
+    def retry_after(self) -> int:
+        """
+        Seconds until the generations queued now are likely done
+        """
+        return max(1, math.ceil(self._generation_seconds * (self._num_queued + 1) / self.max_in_flight))
+
+    def _grant(self) -> Permit:
+        self._in_flight += 1
+        self._running.set(self._in_flight)
+        return Permit(self)
+
+    def _reject(self, overloaded: bool) -> AdmissionRejected:
+        self._rejected.inc()
+        return AdmissionRejected(retry_after=self.retry_after, overloaded=overloaded)
+
+    def _withdraw(self, account_id: typing.Hashable, future: asyncio.Future) -> None:
+        queue = self._queues.get(account_id)
+        if queue is None or future not in queue:
+            return
+        queue.remove(future)
+        if not queue:
+            del self._queues[account_id]
+        self._num_queued -= 1
+        self._queue_depth.set(self._num_queued)
+
+    def _release(self, generation_seconds: float) -> None:
+        self._generation_seconds += GENERATION_SECONDS_SMOOTHING * (generation_seconds - self._generation_seconds)
+        self._in_flight -= 1
+        while self._in_flight < self.max_in_flight and self._queues:
+            account_id, queue = next(iter(self._queues.items()))
+            future = queue.popleft()
+            self._num_queued -= 1
+            if queue:
+                # The other accounts are served before the next generation of this one
+                self._queues.move_to_end(account_id)
+            else:
+                del self._queues[account_id]
+            if not future.done():
+                future.set_result(self._grant())
+        self._queue_depth.set(self._num_queued)
+        self._running.set(self._in_flight)
+
+
+admission_controller: AdmissionController = AdmissionController()
@@ -1,32 +1,43 @@
 
 
-import lancedb
 import loguru
-from src.config.settings.const import META_LANCEDB
 from datetime import datetime
+from src.config.manager import settings
 from src.models.schemas.account import AccountInCreate, AccountInLogin, AccountInUpdate, Account
 from src.repository.crud.base import BaseCRUDRepository
+from src.repository.id_allocator import IdAllocator, id_allocator
+from src.repository.meta_database import MetaDBHelper, meta_db
 from src.securities.hashing.password import pwd_generator
+from src.utilities.cachekit.lru_cache import LRUCache
 from src.utilities.exceptions.database import EntityDoesNotExist
 from src.utilities.exceptions.password import PasswordDoesNotMatch
 
+# Shared by the per-request repositories, keyed by username
+account_cache: LRUCache = LRUCache(
+    name="account_cache", max_entries=settings.ACCOUNT_CACHE_ENTRIES, ttl=settings.ACCOUNT_CACHE_TTL_SEC
+)
+
 
 class AccountCRUDRepository(BaseCRUDRepository):
-    def __init__(self):
-        self.db = lancedb.connect(META_LANCEDB)
-        self.tbl = self.db.open_table("account")
+    def __init__(
+        self, meta_db: MetaDBHelper = meta_db, cache: LRUCache = account_cache, id_allocator: IdAllocator = id_allocator
+    ):
+        self.meta_db = meta_db
+        self.cache = cache
+        self.id_allocator = id_allocator
+        self.tbl = meta_db.open_table("account")
 
-    def create_account(self, account_create: AccountInCreate) -> Account:
+    async def create_account(self, account_create: AccountInCreate) -> Account:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        hash_salt = pwd_generator.generate_salt
-        new_id = self._get_next_id()
+        hash_salt, hashed_password = await pwd_generator.async_generate_salt_and_hashed_password(
+            new_password=account_create.password
+        )
+        new_id = self.id_allocator.next_id()
         self.tbl.add([{
         "id": new_id,
         "username": account_create.username,
         "email": account_create.email,
-        "_hashed_password": pwd_generator.generate_hashed_password(
-            hash_salt=hash_salt, new_password=account_create.password
-        ),
+        "_hashed_password": hashed_password,
         "_hash_salt": hash_salt,
         "is_verified": True,
         "is_active": True,
@@ -53,13 +64,18 @@ class AccountCRUDRepository(BaseCRUDRepository):
         return Account.from_dict(account)
 
     def read_account_by_username(self, username: str) -> Account:
+        cached = self.cache.get(username)
+        if cached is not None:
+            return cached.model_copy()
         try:
             account = self.tbl.search().where(f"username = '{username}'", prefilter=True).limit(1).to_list()[0]
         except Exception as e:
             loguru.logger.error(f"{e}")
             raise EntityDoesNotExist("Account with username `{username}` does not exist!")
         loguru.logger.info(f"Read user {username}")
-        return Account.from_dict(account)
+        account = Account.from_dict(account)
+        self.cache.put(username, account)
+        return account.model_copy()
 
     def read_account_by_email(self, email: str) -> Account:
         try:
@@ -70,26 +86,25 @@ class AccountCRUDRepository(BaseCRUDRepository):
         loguru.logger.info(f"Read user {email}")
         return Account.from_dict(account)
 
-    def read_user_by_password_authentication(self, account_login: AccountInLogin) -> Account:
+    async def read_user_by_password_authentication(self, account_login: AccountInLogin) -> Account:
         try:
             account = self.tbl.search().where(f"username = '{account_login.username}'", prefilter=True).limit(1).to_list()[0]
         except Exception as e:
             loguru.logger.error(f"{e}")
             raise EntityDoesNotExist("Account with username `{account_login.username}` does not exist!")
-        try:
-            hash_salt=account.get("_hash_salt")
-            if not pwd_generator.is_password_authenticated(
-                hash_salt=hash_salt, password=account_login.password, hashed_password=account.get("_hashed_password")
-            ):  # type: ignore
-                raise PasswordDoesNotMatch("Password does not match!")
-        except Exception as e:
-            loguru.logger.error(f"{e}")
+        if not await pwd_generator.async_is_password_authenticated(
+            hash_salt=account.get("_hash_salt"),
+            password=account_login.password,
+            hashed_password=account.get("_hashed_password"),
+        ):
+            loguru.logger.error(f"Password of user {account_login.username} does not match")
+            raise PasswordDoesNotMatch("Password does not match!")
         loguru.logger.info(f"Read user {account_login.username} with password authentication")
         return Account.from_dict(account)  # type: ignore
 
-    def update_account_by_id(self, id: int, account_update: AccountInUpdate) -> Account:
+    async def update_account_by_id(self, id: int, account_update: AccountInUpdate) -> Account:
         try:
-            self.tbl.search().where(f"id = {id}", prefilter=True).limit(1).to_list()[0]
+            account = self.tbl.search().where(f"id = {id}", prefilter=True).limit(1).to_list()[0]
         except Exception as e:
             loguru.logger.error(f"{e}")
             raise EntityDoesNotExist("Account with id `{id}` does not exist!")
@@ -98,19 +113,26 @@ class AccountCRUDRepository(BaseCRUDRepository):
         if account_update.email:
             self.tbl.update(where=f"id = {id}", values={"email": account_update.email, "updated_at": current_time})
         if account_update.password:
+            # The password must be hashed with the salt that is stored next to it
+            hash_salt, hashed_password = await pwd_generator.async_generate_salt_and_hashed_password(
+                new_password=account_update.password
+            )
             self.tbl.update(where=f"id = {id}", values={
-                "_hashed_password": pwd_generator.generate_hashed_password(
-                            hash_salt=pwd_generator.generate_salt, new_password=account_update.password
-                            ),
-                "_hash_salt": pwd_generator.generate_salt,
+                "_hashed_password": hashed_password,
+                "_hash_salt": hash_salt,
                 "updated_at": current_time})
+        # Dropped once the row is written, a read in the meantime would cache the row as it was before
+        self.cache.invalidate(account.get("username"))
         update_account = self.tbl.search().where(f"id = {id}", prefilter=True).limit(1).to_list()[0]
         loguru.logger.info(f"Update user {id}")
         return Account.from_dict(update_account)
 
     def delete_account_by_id(self, id: int) -> str:
         try:
+            accounts = self.tbl.search().where(f"id = {id}", prefilter=True).select(["username"]).to_list()
             self.tbl.delete(f"id = {id}")
+            for account in accounts:
+                self.cache.invalidate(account.get("username"))
         except Exception as e:
             loguru.logger.error(f"{e}")
             raise EntityDoesNotExist(f"Account with id `{id}` does not exist!")  # type: ignore
@@ -130,9 +152,3 @@ class AccountCRUDRepository(BaseCRUDRepository):
         except Exception :
             return True
         return False
-
-    def _get_next_id(self):
-        tbl = self.db.open_table("next_id")
-        next_id = tbl.search().select(["id"]).limit(1).to_list()[0].get("id")
-        tbl.update(where=f"id = {next_id}", values={"id":next_id+1})
-        return next_id
@@ -12,35 +12,49 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import base64
+import contextlib
+import fcntl
 import lancedb
 import loguru
+import os
 import uuid
-import time
+import zlib
+import pyarrow.compute as pc
 from datetime import datetime
-from src.config.settings.const import META_LANCEDB
+from typing import Iterator
 from src.models.schemas.chat import SessionUpdate, Chats, Session, ChatHistory
 from src.repository.crud.base import BaseCRUDRepository
+from src.repository.meta_database import MetaDBHelper, meta_db
 from src.utilities.exceptions.database import EntityDoesNotExist
 
+# Messages are ordered by (created_at, seq), the messages of one save share the timestamp
+CHAT_HISTORY_ORDER = [("created_at", "ascending"), ("seq", "ascending")]
+CHAT_HISTORY_PAGE_COLUMNS = ["seq", "role", "message", "created_at"]
+# The sessions share this many lock files, a save only waits for the saves of the sessions of its file
+CHAT_HISTORY_LOCK_FILES = 64
+
+
 class SessionCRUDRepository(BaseCRUDRepository):
-    def __init__(self):
-        self.db = lancedb.connect(META_LANCEDB)
-        self.tbl = self.db.open_table("session")
+    def __init__(self, meta_db: MetaDBHelper = meta_db):
+        self.meta_db = meta_db
+        self.tbl = meta_db.open_table("session")
         
-    def create_session(self, account_id: int, name: str) -> Session:
+    def create_session(self, account_id: int, name: str, session_type: str = "chat") -> Session:
         current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         uuid_id=str(uuid.uuid4())
-        self.tbl.add([{
+        new_session = {
             "session_uuid": uuid_id,
             "account_id": account_id,
             "name": name,
-            "session_type": "chat",
+            "session_type": session_type,
             "dataset_name": "",
             "created_at": current_time
-        }])
-        new_session = self.tbl.search().where(f"session_uuid = '{uuid_id}'", prefilter=True).limit(1).to_list()[0]
+        }
+        # The uuid is new, so a plain append can't conflict and the written row is returned as is
+        self.tbl.add([new_session])
         loguru.logger.info(f"Session {name} {uuid_id} created ")
-        return Session.from_dict(new_session) 
+        return Session.from_dict(new_session)
 
     def read_sessions(self) -> list[Session]:
         loguru.logger.info("Read all sesssion")
@@ -58,18 +72,17 @@ class SessionCRUDRepository(BaseCRUDRepository):
 
     def update_sessions_by_uuid(self, session: SessionUpdate, account_id: int) -> Session:
         try:
-            self.tbl.search().where(f"session_uuid = '{session.sessionUuid}' , account_id = {account_id}", prefilter=True).limit(1).to_list()[0]
+            current_session = self._read_session(session.sessionUuid, account_id)
         except Exception as e:
             loguru.logger.error(f"{e}")
-            raise EntityDoesNotExist("Session with uuid `{session.session_uuid}}` does not exist!")
-        
+            raise EntityDoesNotExist(f"Session with uuid `{session.sessionUuid}` does not exist!")
+
         if session.name:
-            self.tbl.update(where=f"session_uuid = '{session.sessionUuid}'", values={"name": session.name})
+            current_session["name"] = session.name
         if session.session_type:
-            self.tbl.update(where=f"session_uuid = '{session.sessionUuid}'", values={"session_type": session.session_type})
-        update_session = self.tbl.search().where(f"session_uuid = '{session.sessionUuid}'", prefilter=True).limit(1).to_list()[0]
+            current_session["session_type"] = session.session_type
         loguru.logger.info(f"Update session {session.sessionUuid}")
-        return Session.from_dict(update_session)
+        return self._upsert_session(current_session)
 
     def delete_session_by_uuid(self, uuid: str, account_id: int) -> Session:
         if account_id == 0:
@@ -80,7 +93,7 @@ class SessionCRUDRepository(BaseCRUDRepository):
                 raise EntityDoesNotExist("Session with uuid `{session.session_uuid}}` does not exist!")
         else:
             try:
-                self.tbl.search().where(f"session_uuid = '{uuid}' , account_id = {account_id}", prefilter=True).limit(1).to_list()[0]
+                self._read_session(uuid, account_id)
             except Exception as e:
                 loguru.logger.error(f"{e}")
                 raise EntityDoesNotExist("Session with uuid `{session.session_uuid}}` does not exist!")
@@ -105,34 +118,21 @@ class SessionCRUDRepository(BaseCRUDRepository):
             Session: Updated Session instance
         """
         try:
-            self.tbl.search().where(f"session_uuid = '{session_uuid}' , account_id = {account_id}", prefilter=True).limit(1).to_list()[0]
+            current_session = self._read_session(session_uuid, account_id)
         except Exception as e:
             loguru.logger.error(f"{e}")
-            raise EntityDoesNotExist("Session with uuid `{session_uuid}}` does not exist!")
+            raise EntityDoesNotExist(f"Session with uuid `{session_uuid}` does not exist!")
 
-        self.tbl.update(where=f"session_uuid = '{session_uuid}'", values={"dataset_name": ds_name})
-        loguru.logger.info(f"Update session {session_uuid}")
-        update_session = self.tbl.search().where(f"session_uuid = '{session_uuid}'", prefilter=True).limit(1).to_list()[0]
+        current_session["dataset_name"] = ds_name
         loguru.logger.info(f"Update session {session_uuid}")
-        return Session.from_dict(update_session)
+        return self._upsert_session(current_session)
 
     def read_create_sessions_by_uuid(self, session_uuid: str, account_id: int, name: str, session_type: str = "chat") -> Session:
         try:
-            session=self.tbl.search().where(f"session_uuid = '{session_uuid}' , account_id = {account_id}", prefilter=True).limit(1).to_list()[0]
+            return Session.from_dict(self._read_session(session_uuid, account_id))
         except Exception:
             loguru.logger.info(f"Session with uuid `{session_uuid}` does not exist! Create new one")
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            uuid_id=str(uuid.uuid4())
-            self.tbl.add([{
-                "session_uuid": uuid_id,
-                "account_id": account_id,
-                "name": name,
-                "session_type": session_type,
-                "dataset_name": "",
-                "created_at": current_time
-            }])
-            session = self.tbl.search().where(f"session_uuid = '{uuid_id}'", prefilter=True).limit(1).to_list()[0]
-        return Session.from_dict(session)
+        return self.create_session(account_id=account_id, name=name, session_type=session_type)
 
     def read_sessions_by_account_id(self, id: int) -> list[Session]:
         loguru.logger.info(f"Read all sesssion of account id {id}")
@@ -145,37 +145,182 @@ class SessionCRUDRepository(BaseCRUDRepository):
 
     def verify_session_by_account_id(self, session_uuid: str, account_id: int) -> bool:
         try:
-            self.tbl.search().where(f"session_uuid = '{session_uuid}' , account_id = {account_id}", prefilter=True).limit(1).to_list()[0]
+            self._read_session(session_uuid, account_id)
             return True
         except Exception as e:
             loguru.logger.error(f"{e}")
             return False
 
+    def _read_session(self, session_uuid: str, account_id: int) -> dict:
+        return self.tbl.search().where(
+            f"session_uuid = '{session_uuid}' AND account_id = {account_id}", prefilter=True
+        ).limit(1).to_list()[0]
+
+    def _upsert_session(self, session: dict) -> Session:
+        """
+        Write the whole row of a session in one table operation and return it without reading it back
+
+        Args:
+            session (dict): the row, keyed by `session_uuid`
+
+        Returns:
+            Session: the written session
+        """
+        self.tbl.merge_insert("session_uuid").when_matched_update_all().when_not_matched_insert_all().execute(
+            [session]
+        )
+        return Session.from_dict(session)
+
 
 class ChatHistoryCRUDRepository(BaseCRUDRepository):
-    def __init__(self):
-        self.db = lancedb.connect(META_LANCEDB)
-        self.tbl = self.db.open_table("chat_history")
+    def __init__(self, meta_db: MetaDBHelper = meta_db):
+        self.meta_db = meta_db
+        self.tbl = meta_db.open_table("chat_history")
 
     def read_chat_history_by_session_uuid(self, uuid: str, limit_num=50) -> list[ChatHistory]:
         loguru.logger.info(f"Read all chat history of session uuid {uuid}")
         try:
-            chat_history_list = self.tbl.search().where(f"session_uuid = '{uuid}'", prefilter=True).limit(limit_num).to_list()
+            chat_history_list, _ = self.read_chat_history_page(uuid=uuid, limit=limit_num)
         except Exception as e:
             loguru.logger.error(f"{e}")
             raise EntityDoesNotExist("Chat history with session uuid `{uuid}}` does not exist!")
-        return [ChatHistory.from_dict(chat_history) for chat_history in chat_history_list]
+        return [ChatHistory.from_dict({"session_uuid": uuid, **chat_history}) for chat_history in chat_history_list]
+
+    def read_chat_history_page(
+        self, uuid: str, limit: int = 50, cursor: str | None = None
+    ) -> tuple[list[dict], str | None]:
+        """
+        Read a page of the chat history of a session in order, only the sort keys of the remaining messages
+        are scanned, the messages themselves are read for the page only
+
+        Args:
+            uuid (str): Session UUID
+            limit (int): maximum number of messages of the page
+            cursor (str | None): the cursor returned with the previous page, None for the first page
+
+        Returns:
+            tuple[list[dict], str | None]: the seq, role, message and created_at of the messages, and the
+            cursor of the next page, None if this page is the last one
+
+        Raises:
+            ValueError: if the cursor is malformed
+        """
+        row_filter = f"session_uuid = '{uuid}'"
+        if cursor is not None:
+            row_filter += f" AND {self._after(*self.decode_cursor(cursor))}"
+        ds = self.tbl.to_lance()
+        keys = ds.to_table(columns=["created_at", "seq"], filter=row_filter).sort_by(CHAT_HISTORY_ORDER)
+        if keys.num_rows == 0:
+            return list(), None
+        last = keys.slice(min(limit, keys.num_rows) - 1, 1).to_pylist()[0]
+        page = ds.to_table(
+            columns=CHAT_HISTORY_PAGE_COLUMNS,
+            filter=f"{row_filter} AND NOT {self._after(last['created_at'], last['seq'])}",
+        ).sort_by(CHAT_HISTORY_ORDER)
+        next_cursor = self.encode_cursor(last["created_at"], last["seq"]) if keys.num_rows > limit else None
+        return page.to_pylist(), next_cursor
+
+    def read_chat_history_tail(self, uuid: str, limit: int) -> list[dict]:
+        """
+        Read the last messages of a session in order, e.g. the prior turns of a conversation
+
+        Args:
+            uuid (str): Session UUID
+            limit (int): maximum number of messages
+
+        Returns:
+            list[dict]: the seq, role, message and created_at of the messages
+        """
+        row_filter = f"session_uuid = '{uuid}'"
+        ds = self.tbl.to_lance()
+        keys = ds.to_table(columns=["created_at", "seq"], filter=row_filter).sort_by(CHAT_HISTORY_ORDER)
+        if keys.num_rows == 0 or limit <= 0:
+            return list()
+        first = keys.slice(max(keys.num_rows - limit, 0), 1).to_pylist()[0]
+        return ds.to_table(
+            columns=CHAT_HISTORY_PAGE_COLUMNS,
+            # seq is an integer, so after seq - 1 is from seq on
+            filter=f"{row_filter} AND {self._after(first['created_at'], first['seq'] - 1)}",
+        ).sort_by(CHAT_HISTORY_ORDER).to_pylist()
+
+    def iter_chat_history(self, uuid: str, page_size: int = 500) -> Iterator[list[dict]]:
+        """
+        Read the whole chat history of a session page by page, e.g. to export it without holding it in memory
+        """
+        cursor = None
+        while True:
+            page, cursor = self.read_chat_history_page(uuid=uuid, limit=page_size, cursor=cursor)
+            if page:
+                yield page
+            if cursor is None:
+                return
+
+    @staticmethod
+    def encode_cursor(created_at: datetime, seq: int) -> str:
+        return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{seq}".encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple[datetime, int]:
+        try:
+            created_at, seq = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+            # Parsed back so nothing but a timestamp and an integer ends up in the filter
+            return datetime.fromisoformat(created_at), int(seq)
+        except Exception as e:
+            raise ValueError(f"Malformed cursor `{cursor}`") from e
+
+    @staticmethod
+    def _after(created_at: datetime, seq: int) -> str:
+        timestamp = created_at.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+        return f"(created_at > timestamp '{timestamp}' OR (created_at = timestamp '{timestamp}' AND seq > {seq}))"
+
+    @staticmethod
+    def _next_seq(tbl: lancedb.table.LanceTable, session_uuid: str) -> int:
+        seqs = tbl.to_lance().to_table(columns=["seq"], filter=f"session_uuid = '{session_uuid}'").column("seq")
+        return 0 if len(seqs) == 0 else pc.max(seqs).as_py() + 1
+
+    @contextlib.contextmanager
+    def _session_lock(self, session_uuid: str) -> Iterator[None]:
+        """
+        Exclusive file lock of the session next to the meta database, across the threads and the worker
+        processes, so the seq read by a save is still the next one when its messages are written
+        """
+        lock_path = os.path.join(
+            self.meta_db.uri, f"chat_history.{zlib.crc32(session_uuid.encode()) % CHAT_HISTORY_LOCK_FILES}.lock"
+        )
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        with open(lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
     def load_create_chat_history(self, session_uuid: str, chats: list[Chats]):
+        """
+        Append the messages of the session in one write, their order is kept by a per session sequence
+        number, the messages share the same timestamp. (created_at, seq) is unique within a session, the
+        pages and the tail of the history rely on it.
+
+        Blocking, reads and writes the table under a file lock: call it off the event loop.
+        """
+        if not chats:
+            return
         try:
-            for chat in chats:
+            with self._session_lock(session_uuid):
+                # The cached handle may not have seen the last save of another worker yet, and other threads
+                # read through it: the seq is read and written on a fresh handle of its own
+                tbl = self.meta_db.db.open_table("chat_history")
                 current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
-                self.tbl.add([{
+                next_seq = self._next_seq(tbl, session_uuid)
+                tbl.add([{
                     "session_uuid": session_uuid,
+                    "seq": next_seq + i,
                     "role": chat.role,
                     "message": chat.message[:4096],
                     "created_at": current_time
-                }])
-                time.sleep(0.001)
+                } for i, chat in enumerate(chats)])
+            # The next reads of this worker see the save
+            self.meta_db.tables.put("chat_history", tbl)
+            self.tbl = tbl
         except Exception as e:
             loguru.logger.error(f"Error: {e}")
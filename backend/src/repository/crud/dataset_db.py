@@ -12,20 +12,19 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-import lancedb
 import loguru
 import uuid
 from datetime import datetime
-from src.config.settings.const import META_LANCEDB
 from src.repository.crud.base import BaseCRUDRepository
+from src.repository.meta_database import MetaDBHelper, meta_db
 from src.models.schemas.dataset import DatasetCreate, DataSet
 from src.utilities.exceptions.database import EntityDoesNotExist
 
 
 class DataSetCRUDRepository(BaseCRUDRepository):
-    def __init__(self):
-        self.db = lancedb.connect(META_LANCEDB)
-        self.tbl = self.db.open_table("data_set")
+    def __init__(self, meta_db: MetaDBHelper = meta_db):
+        self.meta_db = meta_db
+        self.tbl = meta_db.open_table("data_set")
         
     def create_datasset(self,account_id: int, dataset_create: DatasetCreate) -> DataSet:
         try:
@@ -0,0 +1,66 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import loguru
+import uuid
+from datetime import datetime
+from src.models.schemas.dataset import IngestionJob
+from src.repository.crud.base import BaseCRUDRepository
+from src.repository.meta_database import MetaDBHelper, meta_db
+from src.utilities.exceptions.database import EntityDoesNotExist
+
+
+class IngestionJobCRUDRepository(BaseCRUDRepository):
+    def __init__(self, meta_db: MetaDBHelper = meta_db):
+        self.meta_db = meta_db
+        self.tbl = meta_db.open_table("ingestion_job")
+
+    def create_job(
+        self, account_id: int, dataset_name: str, table_name: str, text_column: str | None = None
+    ) -> IngestionJob:
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        job_id = str(uuid.uuid4())
+        self.tbl.add([{
+            "job_id": job_id,
+            "account_id": account_id,
+            "dataset_name": dataset_name,
+            "table_name": table_name,
+            "text_column": text_column,
+            "status": "queued",
+            "attempts": 0,
+            "rows_ingested": 0,
+            "total_rows": None,
+            "error": None,
+            "created_at": current_time,
+            "started_at": None,
+            "updated_at": current_time,
+            "finished_at": None,
+        }])
+        loguru.logger.info(f"Ingestion job {job_id} for {dataset_name} queued")
+        return self.read_job_by_id(job_id)
+
+    def read_job_by_id(self, job_id: str) -> IngestionJob:
+        try:
+            job = self.tbl.search().where(f"job_id = '{job_id}'", prefilter=True).limit(1).to_list()[0]
+        except Exception as e:
+            loguru.logger.error(f"{e}")
+            raise EntityDoesNotExist(f"Ingestion job with id `{job_id}` does not exist!")
+        return IngestionJob.from_dict(job)
+
+    def update_job(self, job_id: str, **values) -> None:
+        """
+        Update the given columns of the job, timestamps as "%Y-%m-%d %H:%M:%S" strings
+        """
+        values["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.tbl.update(where=f"job_id = '{job_id}'", values=values)
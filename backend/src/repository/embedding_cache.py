@@ -0,0 +1,160 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import array
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+
+import loguru
+
+from src.config.manager import settings
+from src.config.settings.const import DEFAULT_DIM
+from src.utilities.cachekit.lru_cache import LRUCache
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+# Python object overhead of an `array.array` plus the sha256 key, on top of 4 bytes per dimension
+_ENTRY_OVERHEAD_BYTES = 64 + 33 + 32
+
+
+class EmbeddingCache:
+    """
+    Cache the embedding vectors by normalized message text
+
+    The vectors are kept as float32 `array.array` buffers, 4 bytes per dimension instead of a Python
+    float object per dimension, in an in-process LRU bounded in bytes with a TTL. An optional sqlite
+    file is used as a second tier shared by all the workers of the backend server.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = settings.EMBEDDING_CACHE_MAX_BYTES,
+        ttl: float = settings.EMBEDDING_CACHE_TTL_SEC,
+        disk_path: str = settings.EMBEDDING_CACHE_DISK_PATH,
+    ):
+        self.ttl = ttl
+        self.memory = LRUCache(
+            name="embedding_cache",
+            max_bytes=max_bytes,
+            ttl=ttl,
+            sizeof=lambda key, vector: _ENTRY_OVERHEAD_BYTES + vector.itemsize * len(vector),
+        )
+        self.disk_path = disk_path
+        self._disk: sqlite3.Connection | None = None
+        self._disk_lock = threading.Lock()
+        self.disk_hits = metrics_kit.counter("embedding_cache_disk_hits", "Lookups served by the disk tier")
+
+    @staticmethod
+    def normalize(message: str) -> str:
+        """
+        Questions differing only by case or whitespace share the same embedding
+        """
+        return " ".join(message.split()).casefold()
+
+    @classmethod
+    def key(cls, message: str) -> bytes:
+        return hashlib.sha256(cls.normalize(message).encode("utf-8")).digest()
+
+    async def get(self, message: str) -> array.array | None:
+        """
+        Get the cached embedding of the message
+
+        Returns:
+        array.array | None: float32 vector, None if it is not cached
+        """
+        key = self.key(message)
+        vector = self.memory.get(key)
+        if vector is None and self.disk_path:
+            vector = await asyncio.to_thread(self._disk_get, key)
+            if vector is not None:
+                self.disk_hits.inc()
+                self.memory.put(key, vector)
+        return vector
+
+    async def put(self, message: str, embedding: list[float]) -> array.array:
+        key = self.key(message)
+        vector = array.array("f", embedding)
+        if len(vector) != DEFAULT_DIM:
+            loguru.logger.warning(f"Embedding Cache --- Unexpected dimension {len(vector)}, expected {DEFAULT_DIM}")
+        self.memory.put(key, vector)
+        if self.disk_path:
+            await asyncio.to_thread(self._disk_put, key, vector)
+        return vector
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._disk is None:
+            self._disk = sqlite3.connect(self.disk_path, timeout=1.0, check_same_thread=False)
+            # WAL lets the workers read while one of them is writing
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS embedding (key BLOB PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._disk.commit()
+        return self._disk
+
+    def _disk_get(self, key: bytes) -> array.array | None:
+        try:
+            with self._disk_lock:
+                row = (
+                    self._connect()
+                    .execute("SELECT vector FROM embedding WHERE key = ? AND created_at > ?", (key, time.time() - self.ttl))
+                    .fetchone()
+                )
+        except sqlite3.Error as e:
+            loguru.logger.error(f"Embedding Cache --- Disk tier error: {e}")
+            return None
+        if row is None:
+            return None
+        vector = array.array("f")
+        vector.frombytes(row[0])
+        return vector
+
+    def _disk_put(self, key: bytes, vector: array.array) -> None:
+        try:
+            with self._disk_lock:
+                disk = self._connect()
+                disk.execute(
+                    "INSERT OR REPLACE INTO embedding (key, vector, created_at) VALUES (?, ?, ?)",
+                    (key, vector.tobytes(), time.time()),
+                )
+                disk.commit()
+        except sqlite3.Error as e:
+            loguru.logger.error(f"Embedding Cache --- Disk tier error: {e}")
+
+    def purge_expired(self) -> int:
+        """
+        Delete the expired vectors of the disk tier
+
+        Returns:
+        int: number of deleted vectors
+        """
+        if not self.disk_path:
+            return 0
+        with self._disk_lock:
+            disk = self._connect()
+            deleted = disk.execute("DELETE FROM embedding WHERE created_at <= ?", (time.time() - self.ttl,)).rowcount
+            disk.commit()
+        return deleted
+
+    def close(self) -> None:
+        with self._disk_lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
+
+
+embedding_cache: EmbeddingCache = EmbeddingCache()
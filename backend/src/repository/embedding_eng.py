@@ -0,0 +1,154 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import httpx
+import loguru
+
+from src.config.manager import settings
+from src.repository.inference_eng import InferenceHelper, embedding_pool
+from src.utilities.httpkit.httpx_kit import httpx_kit
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+QUEUE_WAIT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+
+
+class EmbeddingBatcher:
+    """
+    Gather concurrent embedding requests into one multi-content request to the embedding engine
+
+    Every caller of `embed` waits on its own future. The pending contents are flushed to the embedding
+    engine when `max_batch_size` is reached or `max_wait_ms` after the first pending content arrived,
+    whatever comes first, and the vectors are fanned back to the waiting callers in order.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        max_wait_ms: float = settings.EMBEDDING_BATCH_WAIT_MS,
+        client: httpx.AsyncClient | None = None,
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._client = client
+        self._pending: list[tuple[str, asyncio.Future, float]] = list()
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+        self._batch_size = metrics_kit.histogram(
+            "embedding_batch_size", BATCH_SIZE_BUCKETS, "Number of contents sent per embedding request"
+        )
+        self._queue_wait = metrics_kit.histogram(
+            "embedding_queue_wait_seconds", QUEUE_WAIT_BUCKETS, "Time a content waited before its batch was sent"
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client if self._client is not None else httpx_kit.embedding_client
+
+    async def embed(self, content: str) -> list[float]:
+        """
+        Get the embedding of a single content, batched together with the concurrent callers
+
+        Args:
+        content (str): the content to embed
+
+        Returns:
+        list[float]: the embedding vector
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((content, future, loop.time()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch, self._pending = self._pending[: self.max_batch_size], self._pending[self.max_batch_size :]
+            task = asyncio.create_task(self._send(batch))
+            # Keep a reference, otherwise the task may be garbage collected before it is done
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: list[tuple[str, asyncio.Future, float]]) -> None:
+        now = asyncio.get_running_loop().time()
+        self._batch_size.observe(len(batch))
+        for _, _, enqueued_at in batch:
+            self._queue_wait.observe(now - enqueued_at)
+        try:
+            vectors = await self.embed_batch([content for content, _, _ in batch])
+        except Exception as e:
+            loguru.logger.error(f"Embedding Engine --- Error: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except BaseException:
+            # The batch is cancelled, e.g. at shutdown, its callers must not wait for it forever
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        for (_, future, _), vector in zip(batch, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def embed_batch(self, contents: list[str]) -> list[list[float]]:
+        """
+        Send the contents to the embedding engine as one request
+
+        Args:
+        contents (list[str]): the contents to embed
+
+        Returns:
+        list[list[float]]: one embedding vector per content, in the same order
+        """
+        with embedding_pool.use() as endpoint:
+            res = await self.client.post(
+                InferenceHelper.instruct_embedding_url(endpoint),
+                headers={"Content-Type": "application/json"},
+                json={"content": contents},
+            )
+            res.raise_for_status()
+        return self.parse_embeddings(res.json(), len(contents))
+
+    @staticmethod
+    def parse_embeddings(payload: dict | list, expected: int) -> list[list[float]]:
+        """
+        Parse the response of llama.cpp `/embedding`, the layout depends on the server version:
+
+        * `{"embedding": [...]}` for a single content
+        * `{"results": [{"embedding": [...]}, ...]}` for multiple contents
+        * `[{"index": 0, "embedding": [...]}, ...]` for multiple contents on newer servers
+        """
+        if isinstance(payload, dict) and "results" in payload:
+            items = payload["results"]
+        elif isinstance(payload, dict):
+            items = [payload]
+        else:
+            items = sorted(payload, key=lambda item: item.get("index", 0))
+        vectors = [item.get("embedding") for item in items]
+        if len(vectors) != expected or any(vector is None for vector in vectors):
+            raise ValueError(f"Expected {expected} embeddings from the embedding engine, got {len(vectors)}")
+        return vectors
+
+
+embedding_batcher: EmbeddingBatcher = EmbeddingBatcher()
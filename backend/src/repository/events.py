@@ -18,16 +18,22 @@ import lancedb
 import loguru
 
 from datetime import datetime
-from src.models.meta import Account, NextID, Session, ChatHistory, DataSet
+from src.models.meta import Account, NextID, Session, ChatHistory, DataSet, IngestionJob
 
 
-from src.config.settings.const import ANONYMOUS_USER, ANONYMOUS_EMAIL, ANONYMOUS_PASS, META_LANCEDB
+from src.config.settings.const import ANONYMOUS_USER, ANONYMOUS_EMAIL, ANONYMOUS_PASS
 from src.config.manager import settings
 from src.securities.hashing.password import pwd_generator
 from src.utilities.httpkit.httpx_kit import httpx_kit
+from src.repository.vector_database import vector_db
+from src.repository.meta_database import MetaDBHelper, meta_db
+from src.repository.embedding_cache import embedding_cache
+from src.repository.ingestion_eng import ingestion_pool
+from src.securities.hashing.hashing_pool import hashing_pool
+from src.repository.inference_eng import embedding_pool, inference_pool
 
 
-async def initialize_meta_table( db: lancedb.db) -> None:
+async def initialize_meta_table( db: MetaDBHelper) -> None:
     loguru.logger.info("Meta Table Creation --- Initializing . . .")
     tbl = db.create_table("account", schema = Account, mode="overwrite")
     await initialize_meta_data( tbl )
@@ -38,19 +44,20 @@ async def initialize_meta_table( db: lancedb.db) -> None:
     db.create_table("session", schema = Session, mode="overwrite")
     db.create_table("chat_history", schema = ChatHistory, mode="overwrite")
     db.create_table("data_set", schema = DataSet, mode="overwrite")
+    db.create_table("ingestion_job", schema = IngestionJob, mode="overwrite")
     
     loguru.logger.info("Meta Table Creation --- Successfully Initialized!")
     
 async def initialize_meta_data( tbl: lancedb.table.Table) -> None:
     current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    hash_salt = pwd_generator.generate_salt
+    hash_salt, hashed_password = await pwd_generator.async_generate_salt_and_hashed_password(
+        new_password=ANONYMOUS_PASS
+    )
     tbl.add([{
         "id": 1,
         "username": ANONYMOUS_USER,
         "email": ANONYMOUS_EMAIL,
-        "_hashed_password": pwd_generator.generate_hashed_password(
-            hash_salt=hash_salt, new_password=ANONYMOUS_PASS
-        ),
+        "_hashed_password": hashed_password,
         "_hash_salt": hash_salt,
         "is_verified": True,
         "is_active": True,
@@ -59,14 +66,14 @@ async def initialize_meta_data( tbl: lancedb.table.Table) -> None:
         "updated_at": current_time
     }])
     loguru.logger.info("Anonymous user added!")
-    hash_salt = pwd_generator.generate_salt
+    hash_salt, hashed_password = await pwd_generator.async_generate_salt_and_hashed_password(
+        new_password=settings.ADMIN_PASS
+    )
     tbl.add([{
         "id": 2,
         "username": settings.ADMIN_USERNAME,
         "email": settings.ADMIN_EMAIL,
-        "_hashed_password": pwd_generator.generate_hashed_password(
-            hash_salt=hash_salt, new_password=settings.ADMIN_PASS
-        ),
+        "_hashed_password": hashed_password,
         "_hash_salt": hash_salt,
         "is_verified": True,
         "is_active": True,
@@ -79,8 +86,10 @@ async def initialize_meta_data( tbl: lancedb.table.Table) -> None:
 
 async def initialize_meta_database() -> None:
     loguru.logger.info("Meta database initializing . . .")
-    meta_db = lancedb.connect(META_LANCEDB)
     await initialize_meta_table( meta_db )
+    # Only the tables with rows get their indexes now, the others get them from the maintenance task
+    meta_db.ensure_scalar_indexes()
+    meta_db.start_maintenance()
     loguru.logger.info("Meta database initialized!")
 
 
@@ -98,3 +107,50 @@ async def dispose_httpx_client() -> None:
     loguru.logger.info(
         "Httpx Sync Client --- Successfully Disposed!" if close_sync else "Httpx Sync Client --- Failed to Dispose!"
     )
+
+
+async def dispose_meta_db() -> None:
+    loguru.logger.info("Meta Database --- Disposing . . .")
+    meta_db.dispose()
+    loguru.logger.info("Meta Database --- Successfully Disposed!")
+
+
+async def dispose_vector_db() -> None:
+    loguru.logger.info("Vector Database --- Disposing . . .")
+    vector_db.shutdown()
+    loguru.logger.info("Vector Database --- Successfully Disposed!")
+
+
+async def initialize_embedding_cache() -> None:
+    if embedding_cache.disk_path:
+        deleted = embedding_cache.purge_expired()
+        loguru.logger.info(f"Embedding Cache --- Purged {deleted} expired vectors from {embedding_cache.disk_path}")
+
+
+async def dispose_embedding_cache() -> None:
+    embedding_cache.close()
+    loguru.logger.info("Embedding Cache --- Successfully Disposed!")
+
+
+async def dispose_ingestion_pool() -> None:
+    loguru.logger.info("Ingestion Pool --- Disposing . . .")
+    ingestion_pool.shutdown()
+    loguru.logger.info("Ingestion Pool --- Successfully Disposed!")
+
+
+async def initialize_endpoint_probes() -> None:
+    for pool, client in ((inference_pool, httpx_kit.inference_client), (embedding_pool, httpx_kit.embedding_client)):
+        pool.start_probing(client, interval=settings.ENDPOINT_PROBE_INTERVAL_SEC)
+        loguru.logger.info(f"Endpoint Pool --- {pool.name}: {[endpoint.base_url for endpoint in pool.endpoints]}")
+
+
+async def dispose_endpoint_probes() -> None:
+    for pool in (inference_pool, embedding_pool):
+        await pool.stop_probing()
+    loguru.logger.info("Endpoint Pool --- Probes Successfully Stopped!")
+
+
+async def dispose_hashing_pool() -> None:
+    loguru.logger.info("Hashing Pool --- Disposing . . .")
+    hashing_pool.shutdown()
+    loguru.logger.info("Hashing Pool --- Successfully Disposed!")
@@ -0,0 +1,81 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import fcntl
+import os
+import threading
+
+import loguru
+
+from src.config.manager import settings
+from src.repository.meta_database import MetaDBHelper, meta_db
+
+
+class IdAllocator:
+    """
+    Hand out unique ids from the `next_id` table in blocks (hi/lo)
+
+    A worker reserves `block_size` ids at once by moving the counter of the table forward while holding an
+    exclusive file lock next to the meta database, then serves the ids of its block from memory. The lock
+    makes the read-modify-write of the counter safe across the worker processes, and the table is only
+    written once per block instead of once per id. The unused ids of a block are skipped after a restart.
+
+    Args:
+    meta_db (MetaDBHelper): the meta database holding the counter table
+    table_name (str): the single row table holding the next free id
+    block_size (int): number of ids reserved per write of the counter
+    """
+
+    def __init__(
+        self,
+        meta_db: MetaDBHelper = meta_db,
+        table_name: str = "next_id",
+        block_size: int = settings.META_DB_ID_BLOCK_SIZE,
+    ):
+        self.meta_db = meta_db
+        self.table_name = table_name
+        self.block_size = max(1, block_size)
+        self.lock_path = os.path.join(meta_db.uri, f"{table_name}.lock")
+        self._lock = threading.Lock()
+        self._next = 0
+        self._limit = 0
+        self._pid = os.getpid()
+
+    def next_id(self) -> int:
+        with self._lock:
+            # A block reserved before a fork belongs to the parent, the child must reserve its own
+            if self._next >= self._limit or self._pid != os.getpid():
+                self._next, self._limit = self._reserve_block()
+                self._pid = os.getpid()
+            new_id = self._next
+            self._next += 1
+            return new_id
+
+    def _reserve_block(self) -> tuple[int, int]:
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                tbl = self.meta_db.open_table(self.table_name)
+                tbl.checkout_latest()
+                start = tbl.search().select(["id"]).limit(1).to_list()[0].get("id")
+                tbl.update(where=f"id = {start}", values={"id": start + self.block_size})
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        loguru.logger.info(f"Meta Database --- Reserved {self.block_size} ids from {start} in {self.table_name}")
+        return start, start + self.block_size
+
+
+id_allocator: IdAllocator = IdAllocator()
@@ -18,6 +18,7 @@ import pydantic
 import openai
 
 from src.config.manager import settings
+from src.utilities.httpkit.endpoint_pool import Endpoint, EndpointPool, parse_endpoints
 
 
 class InferenceHelper:
@@ -44,26 +45,64 @@ class InferenceHelper:
         return openai.OpenAI(base_url=url, api_key=api_key)
 
     @classmethod
-    def tokenizer_url(cls) -> str:
+    def tokenizer_url(cls, endpoint: Endpoint | None = None) -> str:
         """
         Get the URL for the tokenization engine
 
+        Args:
+        endpoint (Endpoint | None): the replica of `inference_pool`, None for the configured host
+
         Returns:
         str: URL for the tokenization
         """
+        if endpoint is not None:
+            return endpoint.url("/tokenize")
         return f"http://{cls.infer_eng_url}:{cls.infer_eng_port}/tokenize"
 
     @classmethod
-    def instruct_infer_url(cls) -> str:
+    def instruct_infer_url(cls, endpoint: Endpoint | None = None) -> str:
         """
         Get the URL for the inference engine
 
+        Args:
+        endpoint (Endpoint | None): the replica of `inference_pool`, None for the configured host
+
         Returns:
         str: URL for the inference engine
         """
+        if endpoint is not None:
+            return endpoint.url("/completion")
         return f"http://{cls.infer_eng_url}:{cls.infer_eng_port}/completion"
 
     @classmethod
-    def instruct_embedding_url(cls) -> str:
-        """ """
+    def instruct_embedding_url(cls, endpoint: Endpoint | None = None) -> str:
+        """
+        Get the URL for the embedding engine
+
+        Args:
+        endpoint (Endpoint | None): the replica of `embedding_pool`, None for the configured host
+
+        Returns:
+        str: URL for the embedding engine
+        """
+        if endpoint is not None:
+            return endpoint.url("/embedding")
         return f"http://{cls.embedding_url}:{cls.embedding_port}/embedding"
+
+
+def get_endpoint_pool(name: str, endpoints: str, default: str) -> EndpointPool:
+    return EndpointPool(
+        name=name,
+        base_urls=parse_endpoints(endpoints, default=default),
+        max_failures=settings.ENDPOINT_MAX_FAILURES,
+        eject_seconds=settings.ENDPOINT_EJECT_SEC,
+        sticky_slack=settings.ENDPOINT_STICKY_SLACK,
+    )
+
+
+inference_pool: EndpointPool = get_endpoint_pool(
+    "inference_pool", settings.INFERENCE_ENG_ENDPOINTS, f"{settings.INFERENCE_ENG}:{settings.INFERENCE_ENG_PORT}"
+)
+embedding_pool: EndpointPool = get_endpoint_pool(
+    "embedding_pool", settings.EMBEDDING_ENG_ENDPOINTS, f"{settings.EMBEDDING_ENG}:{settings.EMBEDDING_ENG_PORT}"
+)
@@ -0,0 +1,195 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import typing
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+
+import loguru
+
+from src.config.manager import settings
+from src.repository.crud.ingestion_job import IngestionJobCRUDRepository
+from src.repository.rag_datasets_eng import DatasetEng
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+
+def now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class IngestionWorkerPool:
+    """
+    Run the dataset ingestion jobs in a bounded pool of threads
+
+    The jobs wait in the queue of the pool until a worker is free, so however many datasets are loaded at
+    the same time, at most `max_workers` of them download and write concurrently. The state of every job
+    is persisted in the `ingestion_job` meta table and a failed job is retried from scratch up to
+    `max_attempts` times. The jobs still queued at shutdown are recorded as cancelled.
+
+    Rebuilding the vector index of a loaded dataset is run by the same pool, as a job of a single attempt.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = settings.INGESTION_WORKERS,
+        max_attempts: int = settings.INGESTION_MAX_ATTEMPTS,
+        progress_interval: float = settings.INGESTION_PROGRESS_INTERVAL_SEC,
+        retry_backoff: float = 1.0,
+        repo_type: typing.Type[IngestionJobCRUDRepository] = IngestionJobCRUDRepository,
+    ):
+        self.max_attempts = max(1, max_attempts)
+        self.progress_interval = progress_interval
+        self.retry_backoff = retry_backoff
+        self.repo_type = repo_type
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="ingestion")
+        self._queued = metrics_kit.gauge("ingestion_jobs_queued", "Ingestion jobs waiting for a worker")
+        self._running = metrics_kit.gauge("ingestion_jobs_running", "Ingestion jobs being run")
+        self._rows = metrics_kit.counter("ingestion_rows", "Rows written by the ingestion jobs")
+
+    def submit(
+        self,
+        job_id: str,
+        dataset_name: str,
+        text_column: str | None = None,
+        on_success: Callable[[], None] | None = None,
+    ) -> Future:
+        """
+        Queue the job, it is run as soon as a worker is free. A dataset with a text column is chunked and
+        embedded, otherwise it must come with its embeddings. `on_success` is called by the worker once the
+        dataset is written, before the job is marked as succeeded.
+        """
+        return self._submit(self.run, job_id, dataset_name, text_column, on_success)
+
+    def submit_index_rebuild(self, job_id: str, table_name: str) -> Future:
+        """
+        Queue the rebuild of the vector index of a loaded table, it is run as soon as a worker is free
+        """
+        return self._submit(self.rebuild_index, job_id, table_name)
+
+    def _submit(self, func: Callable[..., None], job_id: str, *args) -> Future:
+        self._queued.inc()
+        future = self._executor.submit(self._dequeue_and_run, func, job_id, *args)
+        future.add_done_callback(lambda future: self._cancelled(job_id) if future.cancelled() else None)
+        return future
+
+    def _dequeue_and_run(self, func: Callable[..., None], *args) -> None:
+        self._queued.dec()
+        func(*args)
+
+    def _cancelled(self, job_id: str) -> None:
+        self._queued.dec()
+        try:
+            self.repo_type().update_job(job_id, status="cancelled", finished_at=now())
+        except Exception as e:
+            loguru.logger.error(f"Ingestion job {job_id} --- Can not record the cancellation: {e}")
+
+    def run(
+        self,
+        job_id: str,
+        dataset_name: str,
+        text_column: str | None = None,
+        on_success: Callable[[], None] | None = None,
+    ) -> None:
+        """
+        Run the job in the calling thread, the outcome is recorded in the job and never raised
+        """
+        self._running.inc()
+        try:
+            self._run(job_id, dataset_name, text_column, on_success)
+        except Exception as e:
+            loguru.logger.error(f"Ingestion job {job_id} --- Error: {e}")
+        finally:
+            self._running.dec()
+
+    def _run(
+        self, job_id: str, dataset_name: str, text_column: str | None, on_success: Callable[[], None] | None
+    ) -> None:
+        # A new repository per update, the API appends jobs to the same table in the meantime
+        self.repo_type().update_job(job_id, status="running")
+        for attempt in range(1, self.max_attempts + 1):
+            # The throughput and the ETA are those of the current attempt
+            self.repo_type().update_job(job_id, attempts=attempt, rows_ingested=0, error=None, started_at=now())
+            last_report = time.monotonic()
+            reported = 0
+
+            def progress(written: int) -> None:
+                nonlocal last_report, reported
+                self._rows.inc(written - reported)
+                reported = written
+                if time.monotonic() - last_report >= self.progress_interval:
+                    last_report = time.monotonic()
+                    self.repo_type().update_job(job_id, rows_ingested=written)
+
+            try:
+                if text_column:
+                    # The number of chunks is only known once the texts are chunked, there is no ETA
+                    written = DatasetEng.load_text_dataset(dataset_name, text_column, progress=progress)
+                else:
+                    DatasetEng.validate_dataset(dataset_name)
+                    total_rows = DatasetEng.count_rows(dataset_name)
+                    if total_rows is not None:
+                        self.repo_type().update_job(job_id, total_rows=total_rows)
+                    written = DatasetEng.load_dataset(dataset_name, progress=progress)
+            except Exception as e:
+                loguru.logger.error(f"Ingestion job {job_id} --- attempt {attempt} failed: {e}")
+                self.repo_type().update_job(job_id, error=str(e))
+                if attempt < self.max_attempts:
+                    time.sleep(self.retry_backoff * attempt)
+                continue
+            if on_success is not None:
+                try:
+                    on_success()
+                except Exception as e:
+                    loguru.logger.error(f"Ingestion job {job_id} --- Can not record the loaded dataset: {e}")
+                    self.repo_type().update_job(job_id, status="failed", error=str(e), finished_at=now())
+                    return
+            self.repo_type().update_job(job_id, status="succeeded", rows_ingested=written, finished_at=now())
+            loguru.logger.info(f"Ingestion job {job_id} --- {written} rows of {dataset_name} loaded")
+            return
+        self.repo_type().update_job(job_id, status="failed", finished_at=now())
+
+    def rebuild_index(self, job_id: str, table_name: str) -> None:
+        """
+        Rebuild the vector index in the calling thread, the outcome is recorded in the job and never raised
+        """
+        self._running.inc()
+        try:
+            self.repo_type().update_job(job_id, status="running", attempts=1, started_at=now())
+            try:
+                status = DatasetEng.rebuild_index(table_name)
+            except Exception as e:
+                loguru.logger.error(f"Ingestion job {job_id} --- Can not rebuild the index of {table_name}: {e}")
+                self.repo_type().update_job(job_id, status="failed", error=str(e), finished_at=now())
+                return
+            self.repo_type().update_job(
+                job_id,
+                status="succeeded",
+                rows_ingested=status["num_indexed_rows"],
+                total_rows=status["num_rows"],
+                finished_at=now(),
+            )
+            loguru.logger.info(f"Ingestion job {job_id} --- Index of {table_name} rebuilt")
+        except Exception as e:
+            loguru.logger.error(f"Ingestion job {job_id} --- Error: {e}")
+        finally:
+            self._running.dec()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+ingestion_pool: IngestionWorkerPool = IngestionWorkerPool()
@@ -1,10 +1,128 @@
-from src.config.settings.const import META_LANCEDB
+import asyncio
+from datetime import timedelta
 
 import lancedb
+import loguru
+
+from src.config.manager import settings
+from src.config.settings.const import META_LANCEDB
+from src.repository.vector_database import TableHandleCache
+
+# Columns filtered on by the CRUD repositories, BTREE for the high cardinality ones and BITMAP for the
+# few distinct values of role and session type
+SCALAR_INDEXES: dict[str, list[tuple[str, str]]] = {
+    "account": [("id", "BTREE"), ("username", "BTREE"), ("email", "BTREE")],
+    "session": [("session_uuid", "BTREE"), ("account_id", "BTREE"), ("session_type", "BITMAP")],
+    "chat_history": [("session_uuid", "BTREE"), ("role", "BITMAP")],
+    "data_set": [("uuid", "BTREE"), ("name", "BTREE"), ("account_id", "BTREE")],
+    "ingestion_job": [("job_id", "BTREE")],
+}
+
 
 class MetaDBHelper:
-    def __init__(self):
-        self.db = lancedb.connect(META_LANCEDB)
+    """
+    One connection to the meta database for the whole process, the CRUD repositories get their tables here
+    instead of connecting and opening them on every request
+
+    The handles are checked against the latest version of their table every `refresh_interval` seconds,
+    with the default of 0.1 a write of another worker process is seen within a tenth of a second, while
+    the requests in between do not read the manifest of the table.
+    """
+
+    def __init__(self, uri: str = META_LANCEDB, refresh_interval: float = settings.META_DB_TABLE_REFRESH_SEC):
+        self.uri = uri
+        self.db = lancedb.connect(uri)
+        self.tables = TableHandleCache(self.db, refresh_interval=refresh_interval)
+        self._maintenance_task: asyncio.Task | None = None
+
+    def open_table(self, table_name: str) -> lancedb.table.LanceTable:
+        return self.tables.open_table(table_name)
+
+    def create_table(self, table_name: str, **kwargs) -> lancedb.table.LanceTable:
+        """
+        Create or overwrite a table, the cached handle of the previous table is dropped
+        """
+        self.tables.invalidate(table_name)
+        tbl = self.db.create_table(table_name, **kwargs)
+        self.tables.put(table_name, tbl)
+        return tbl
+
+    def compact_table(
+        self,
+        table_name: str,
+        min_fragments: int = settings.META_DB_COMPACTION_MIN_FRAGMENTS,
+        retention: float = settings.META_DB_VERSION_RETENTION_SEC,
+    ) -> bool:
+        """
+        Merge the fragments of the table once there are `min_fragments` of them, and delete the files of
+        the versions older than `retention` seconds
+
+        Returns:
+        bool: True if the table was compacted
+        """
+        tbl = self.open_table(table_name)
+        num_fragments = len(tbl.to_lance().get_fragments())
+        if num_fragments < min_fragments:
+            return False
+        tbl.compact_files()
+        tbl.cleanup_old_versions(older_than=timedelta(seconds=retention))
+        loguru.logger.info(f"Meta Database --- Compacted {num_fragments} fragments of {table_name}")
+        return True
+
+    def ensure_scalar_indexes(self, indexes: dict[str, list[tuple[str, str]]] = SCALAR_INDEXES) -> None:
+        """
+        Create the missing scalar indexes and add the rows appended since to the existing ones
+
+        Lance can not train an index on an empty table, so the indexes of an empty table are created by a
+        later run once it has rows. Until then, or for the rows not indexed yet, a filter scans.
+        """
+        for table_name, columns in indexes.items():
+            try:
+                tbl = self.open_table(table_name)
+            except FileNotFoundError:
+                continue
+            if tbl.count_rows() == 0:
+                continue
+            ds = tbl.to_lance()
+            existing = ds.list_indices()
+            indexed = {column for index in existing for column in index["fields"]}
+            # Checked before creating the new indexes, they cover all the rows
+            stale = any(ds.stats.index_stats(index["name"])["num_unindexed_rows"] > 0 for index in existing)
+            for column, index_type in columns:
+                if column not in indexed:
+                    tbl.create_scalar_index(column, index_type=index_type)
+                    loguru.logger.info(f"Meta Database --- Created {index_type} index on {table_name}.{column}")
+            if stale:
+                tbl.to_lance().optimize.optimize_indices()
+
+    async def run_maintenance(self, interval: float = settings.META_DB_MAINTENANCE_INTERVAL_SEC) -> None:
+        """
+        Compact the tables and update their indexes every `interval` seconds, in a thread so the requests
+        keep being served
+        """
+        while True:
+            await asyncio.sleep(interval)
+            for table_name in self.db.table_names():
+                try:
+                    await asyncio.to_thread(self.compact_table, table_name)
+                except Exception as e:
+                    # Usually another worker committed a compaction of the same table first
+                    loguru.logger.warning(f"Meta Database --- Compaction of {table_name} failed: {e}")
+            try:
+                await asyncio.to_thread(self.ensure_scalar_indexes)
+            except Exception as e:
+                loguru.logger.warning(f"Meta Database --- Indexing failed: {e}")
+
+    def start_maintenance(self, interval: float = settings.META_DB_MAINTENANCE_INTERVAL_SEC) -> None:
+        if self._maintenance_task is None and interval > 0:
+            self._maintenance_task = asyncio.create_task(self.run_maintenance(interval))
+
+    def dispose(self) -> None:
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        self.tables.invalidate()
+        loguru.logger.info("Meta Database --- Table handles released")
+
 
-        
 meta_db: MetaDBHelper = MetaDBHelper()
@@ -13,19 +13,148 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import collections
 from typing import Any
 from collections.abc import AsyncGenerator
 import loguru
 import httpx
 
 from src.repository.rag.base import BaseRAGRepository
-from src.repository.inference_eng import InferenceHelper
+from src.repository.rag.conversation import conversation_window
+from src.repository.crud.chat import ChatHistoryCRUDRepository
+from src.repository.meta_database import MetaDBHelper, meta_db
+from src.repository.inference_eng import InferenceHelper, inference_pool
+from src.repository.embedding_eng import embedding_batcher
+from src.repository.embedding_cache import embedding_cache
+from src.repository.semantic_cache import CompletionRecorder, semantic_cache
+from src.repository.tokenizer_eng import token_counter
+from src.config.manager import settings
+from src.config.settings.const import RAG_NUM
 from src.utilities.httpkit.httpx_kit import httpx_kit
+from src.utilities.httpkit.sse_relay import relay_sse
 from src.repository.vector_database import vector_db
 from src.utilities.formatters.ds_formatter import DatasetFormatter
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+RAG_CONTEXT_PREFIX = "Please answer the question based on answer "
+RAG_CONTEXT_SEPARATOR = "\n"
+# Let the inference engine pick the slot
+ANY_SLOT = -1
+
+
+class SlotAffinity:
+    """
+    Pin the chat sessions to the slots of the inference engine, so a follow-up question is processed by the
+    slot that still holds the prompt of the previous one
+
+    A session gets a slot no other session holds, or the slot of the least recently used session whose
+    slot is idle. When the slot of a session is busy, or no slot is idle, the engine picks one and the
+    session is pinned to the slot reported back. The prompt cache hit ratio is tracked from the statistics
+    of the last frame of every completion.
+
+    The pins and the busy slots are only known to this process, the sessions of several workers sharing an
+    engine are not pinned (`pin_sessions`), the engine picks their slots by prompt similarity.
+
+    Args:
+    num_slots (int): number of parallel slots of the inference engine
+    pin_sessions (bool): False to let the engine pick every slot, the hit ratio is still tracked
+    """
+
+    def __init__(
+        self, num_slots: int = settings.INFERENCE_ENG_SLOTS, pin_sessions: bool = settings.INFERENCE_ENG_SLOT_AFFINITY
+    ):
+        self.num_slots = num_slots
+        self.pin_sessions = pin_sessions
+        # session uuid -> slot, the least recently used session first
+        self._sessions: collections.OrderedDict[str, int] = collections.OrderedDict()
+        self._busy: collections.Counter[int] = collections.Counter()
+        self._fallbacks = metrics_kit.counter("slot_affinity_fallbacks", "Completions the engine picked a slot for")
+        self._evaluated = metrics_kit.counter("prompt_cache_tokens_evaluated", "Prompt tokens of the completions")
+        self._reused = metrics_kit.counter("prompt_cache_tokens_reused", "Prompt tokens found in the slot cache")
+        self._hit_ratio = metrics_kit.gauge("prompt_cache_hit_ratio", "Share of the prompt tokens found in cache")
+
+    def acquire(self, session_uuid: str) -> int:
+        """
+        The slot to send the completion of the session to, release it once the completion is done
+
+        Returns:
+        int: the slot, ANY_SLOT if the slot of the session is busy or no slot is idle
+        """
+        if not self.pin_sessions:
+            return ANY_SLOT
+        slot = self._sessions.get(session_uuid)
+        if slot is None:
+            slot = self._idle_slot()
+            if slot is not None:
+                self._sessions[session_uuid] = slot
+        if slot is None or self._busy[slot]:
+            self._fallbacks.inc()
+            return ANY_SLOT
+        self._sessions.move_to_end(session_uuid)
+        self._busy[slot] += 1
+        return slot
+
+    def release(self, session_uuid: str, slot: int, final: dict | None = None) -> None:
+        """
+        Release the slot acquired for the session
+
+        Args:
+        session_uuid (str): session uuid
+        slot (int): the slot returned by `acquire`
+        final (dict | None): the last frame of the completion, None if it did not complete
+        """
+        if slot != ANY_SLOT:
+            self._busy[slot] -= 1
+        if final is None:
+            return
+        used_slot = final.get("id_slot", slot)
+        if self.pin_sessions and isinstance(used_slot, int) and 0 <= used_slot < self.num_slots and used_slot != slot:
+            # The prompt of the session now lives in the slot the engine picked, the prompt of its previous
+            # session was overwritten
+            self._unpin(used_slot)
+            self._sessions[session_uuid] = used_slot
+        self.record(final)
+
+    def record(self, final: dict) -> None:
+        """
+        Count the prompt tokens of the completion that were served from the slot cache
+
+        `tokens_cached` also counts the generated tokens, the reused ones are the prompt tokens
+        (`tokens_evaluated`) the engine did not have to process (`timings.prompt_n`).
+        """
+        evaluated = final.get("tokens_evaluated")
+        processed = (final.get("timings") or dict()).get("prompt_n")
+        if not evaluated or processed is None:
+            return
+        self._evaluated.inc(evaluated)
+        self._reused.inc(max(evaluated - processed, 0))
+        self._hit_ratio.set(self._reused.value / self._evaluated.value)
+
+    def _idle_slot(self) -> int | None:
+        pinned = set(self._sessions.values())
+        for slot in range(self.num_slots):
+            if slot not in pinned:
+                return slot
+        for session_uuid, slot in self._sessions.items():
+            if not self._busy[slot]:
+                del self._sessions[session_uuid]
+                return slot
+        return None
+
+    def _unpin(self, slot: int) -> None:
+        for session_uuid in [session_uuid for session_uuid, pinned in self._sessions.items() if pinned == slot]:
+            del self._sessions[session_uuid]
+
+
+# One per replica of the inference engine, by base URL, the slots of a replica only cache the prompts sent to it
+slot_affinities: collections.defaultdict[str, SlotAffinity] = collections.defaultdict(SlotAffinity)
 
 
 class RAGChatModelRepository(BaseRAGRepository):
+    def __init__(self, meta_db: MetaDBHelper = meta_db):
+        self.meta_db = meta_db
+
     async def load_model(self, session_id: int, model_name: str) -> bool:
         """
         TODO: Load the model into the memory
@@ -37,18 +166,62 @@ class RAGChatModelRepository(BaseRAGRepository):
             return False
         return True
 
-    def format_prompt(self, prmpt: str, current_context: str = InferenceHelper.instruction) -> str:
+    def format_prompt(
+        self, prmpt: str, current_context: str = InferenceHelper.instruction, turns: list[dict] | None = None
+    ) -> str:
         """
-        Format the input questions, can be used for saving the conversation history
+        Format the input questions after the prior turns of the conversation
+
+        The system prompt and the turns come first and only change when the window of turns moves, so the
+        inference engine can reuse its cached prompt for the follow-up questions.
 
         Args:
-        prmpt (str): input message
-        current_context (str): the context we got from the vector database
+        prmpt (str): input message, with the contexts of the vector database if any
+        current_context (str): the system prompt
+        turns (list[dict] | None): the prior messages of the session, see `conversation_turns`
 
         Returns:
         str: formatted prompt
         """
-        return f"### System: {current_context}\n" + f"\n### Human: {prmpt}\n### Assistant:"
+        history = conversation_window.format_turns(turns) if turns else ""
+        return f"### System: {current_context}\n" + history + f"\n### Human: {prmpt}\n### Assistant:"
+
+    def format_question_with_context(self, input_msg: str, context: str) -> str:
+        """
+        The contexts go with the question rather than in the system prompt, they change with every question
+        """
+        return f"{RAG_CONTEXT_PREFIX}{context}{RAG_CONTEXT_SEPARATOR}{input_msg}"
+
+    async def conversation_turns(
+        self, session_uuid: str, input_msg: str, n_predict: int, context_share: float = 0.0
+    ) -> list[dict]:
+        """
+        The prior messages of the session that fit in the context window with the question and the answer
+
+        Args:
+        session_uuid (str): session uuid
+        input_msg (str): input message
+        n_predict (int): number of tokens reserved for the answer
+        context_share (float): share of the budget kept for the retrieved contexts, the turns are left the rest
+
+        Returns:
+        list[dict]: the messages in order, empty for a new session
+        """
+        try:
+            messages = await asyncio.to_thread(
+                ChatHistoryCRUDRepository(meta_db=self.meta_db).read_chat_history_tail,
+                session_uuid,
+                settings.CONVERSATION_MAX_MESSAGES,
+            )
+        except Exception as e:
+            loguru.logger.error(f"Conversation --- Can not read the history of {session_uuid}: {e}")
+            return list()
+        if not messages:
+            return list()
+        prompt_tokens = await token_counter.count(self.format_prompt(input_msg))
+        budget = self.prompt_budget(n_predict) - prompt_tokens
+        budget -= int(max(0, budget) * min(1.0, max(0.0, context_share)))
+        return await conversation_window.select(session_uuid, messages, budget)
 
     async def inference(
         self,
@@ -74,65 +247,175 @@ class RAGChatModelRepository(BaseRAGRepository):
         **Returns:**
         AsyncGenerator[Any, None]: response message
         """
+        n_predict = 128 if n_predict == 0 else n_predict
+        turns = await self.conversation_turns(session_uuid, input_msg, n_predict)
 
         data = {
-            "prompt": self.format_prompt(input_msg),
+            "prompt": self.format_prompt(input_msg, turns=turns),
             "temperature": temperature,
             "top_k": top_k,
             "top_p": top_p,
             "n_keep": 0,  # If the context window is full, we keep 0 tokens
-            "n_predict": 128 if n_predict == 0 else n_predict,
+            "n_predict": n_predict,
             "cache_prompt": True,
-            "slot_id": -1,  # for cached prompt
             "stop": ["\n### Human:"],
             "stream": True,
         }
 
         try:
-            async with httpx_kit.async_client.stream(
-                "POST",
-                InferenceHelper.instruct_infer_url(),
-                headers={"Content-Type": "application/json"},
-                json=data,
-                # We disable all timeout and trying to fix streaming randomly cutting off
-                timeout=httpx.Timeout(timeout=None),
-            ) as response:
-                response.raise_for_status()
-                async for chunk in response.aiter_text():
-                    yield chunk
-        except httpx.ReadError as e:
-            loguru.logger.error(f"An error occurred while requesting {e.request.url!r}.")
+            # Only the last frame is parsed, for the slot and the prompt cache statistics
+            recorder = CompletionRecorder(keep_content=False)
+            async for chunk in self.stream_completion(session_uuid, data, recorder):
+                yield chunk
+        # A connection error, or the engine was silent longer than the read timeout
+        except httpx.TransportError as e:
+            loguru.logger.error(f"An error occurred while requesting {e.request.url!r}: {e!r}")
         except httpx.HTTPStatusError as e:
             loguru.logger.error(f"Error response {e.response.status_code} while requesting {e.request.url!r}.")
 
-    def search_context(self, input_msg: str, collection_name: str) -> str:
+    async def stream_completion(
+        self, session_uuid: str, data: dict, recorder: CompletionRecorder
+    ) -> AsyncGenerator[bytes, None]:
         """
-        Search the context from the vector database
+        Stream the completion from the replica and the slot of the session, see `EndpointPool` and
+        `SlotAffinity`
+
+        The SSE frames of the engine are relayed as bytes, without decoding them and encoding them again,
+        and coalesced while the client is slower than the engine, see `relay_sse`
+
+        Args:
+        session_uuid (str): session uuid
+        data (dict): the body of the completion request, without the slot
+        recorder (CompletionRecorder): fed with every chunk
+
+        Returns:
+        AsyncGenerator[bytes, None]: whole SSE frames of the completion
+        """
+        with inference_pool.use(session_uuid) as endpoint:
+            slot_affinity = slot_affinities[endpoint.base_url]
+            slot = slot_affinity.acquire(session_uuid)
+            try:
+                for id_slot in [slot, ANY_SLOT] if slot != ANY_SLOT else [ANY_SLOT]:
+                    # The read timeout of the client bounds the silence between two chunks, not the whole stream
+                    async with httpx_kit.inference_client.stream(
+                        "POST",
+                        InferenceHelper.instruct_infer_url(endpoint),
+                        headers={"Content-Type": "application/json"},
+                        json={**data, "id_slot": id_slot},
+                    ) as response:
+                        if response.is_error and id_slot != ANY_SLOT:
+                            # e.g. the engine runs fewer slots than INFERENCE_ENG_SLOTS, let it pick one
+                            loguru.logger.warning(f"Slot {id_slot} --- Error response {response.status_code}, retrying")
+                            continue
+                        response.raise_for_status()
+                        async for frames in relay_sse(response.aiter_bytes(), settings.SSE_COALESCE_MAX_BYTES):
+                            recorder.feed(frames)
+                            yield frames
+                        return
+            finally:
+                slot_affinity.release(session_uuid, slot, recorder.final)
+
+    async def get_embedding(self, input_msg: str) -> list[float]:
+        """
+        Get the embedding of the message, from the embedding cache if the same question was asked before
+
+        Args:
+        input_msg (str): input message
+
+        Returns:
+        list[float]: embedding vector
+        """
+        embedding = await embedding_cache.get(input_msg)
+        if embedding is None:
+            embedding = await embedding_batcher.embed(input_msg)
+            await embedding_cache.put(input_msg, embedding)
+        return list(embedding)
+
+    async def context_budget(self, input_msg: str, n_predict: int, turns: list[dict] | None = None) -> int:
+        """
+        Number of tokens left for the contexts once the prompt and the answer fit in the context of a slot
+
+        Args:
+        input_msg (str): input message
+        n_predict (int): number of tokens to predict
+        turns (list[dict] | None): the prior messages of the session sent with the question
+
+        Returns:
+        int: token budget of the contexts
+        """
+        prompt_tokens = await token_counter.count(
+            self.format_prompt(self.format_question_with_context(input_msg, ""), turns=turns)
+        )
+        return self.prompt_budget(n_predict) - prompt_tokens
+
+    @staticmethod
+    def prompt_budget(n_predict: int) -> int:
+        """
+        Number of tokens of the context of a slot left for the prompt once the answer fits in it, llama.cpp
+        splits its context (`-c`) evenly between its slots (`-np`)
+
+        Args:
+        n_predict (int): number of tokens to predict, INFERENCE_ENG_ANSWER_TOKENS are kept if not positive
+
+        Returns:
+        int: token budget of the prompt
+        """
+        slot_ctx_size = settings.INFERENCE_ENG_CTX_SIZE // max(1, settings.INFERENCE_ENG_SLOTS)
+        return slot_ctx_size - (n_predict if n_predict > 0 else settings.INFERENCE_ENG_ANSWER_TOKENS)
+
+    async def pack_context(self, hits: list[dict], budget: int) -> str:
+        """
+        Pack as many hits as fit in the token budget, nearest first
+
+        Args:
+        hits (list[dict]): hits of the vector database, nearest first
+        budget (int): token budget of the contexts
+
+        Returns:
+        str: the packed contexts, empty if none of them fits
+        """
+        separator_tokens = await token_counter.count(RAG_CONTEXT_SEPARATOR)
+        hit_tokens = await asyncio.gather(*[token_counter.count(hit["context"]) for hit in hits])
+        packed: list[str] = list()
+        for hit, num_tokens in zip(hits, hit_tokens):
+            cost = num_tokens + (separator_tokens if packed else 0)
+            # A shorter but farther hit may still fit after a long one was skipped
+            if cost > budget:
+                continue
+            packed.append(hit["context"])
+            budget -= cost
+        return RAG_CONTEXT_SEPARATOR.join(packed)
+
+    async def search_context(
+        self, input_msg: str, collection_name: str, n_predict: int = 128, turns: list[dict] | None = None
+    ) -> str | None:
+        """
+        Search the k nearest contexts from the vector database and pack them into the context window
 
         Args:
         input_msg (str): input message
         collection_name (str): collection name
+        n_predict (int): number of tokens reserved for the answer
+        turns (list[dict] | None): the prior messages of the session sent with the question
 
         Returns:
-        str: context
+        str | None: context, None if the message can not be embedded or nothing fits
         """
         try:
-            res = httpx_kit.sync_client.post(
-                InferenceHelper.instruct_embedding_url(),
-                headers={"Content-Type": "application/json"},
-                json={"content": input_msg},
-                timeout=httpx.Timeout(timeout=None),
-            )
-            res.raise_for_status()
-            embedd_input = res.json().get("embedding")
+            embedd_input = await self.get_embedding(input_msg)
         except Exception as e:
             loguru.logger.error(e)
+            return None
         # collection name for testing
-        context = vector_db.search(
-            list(embedd_input), 1, table_name=DatasetFormatter.format_dataset_by_name(collection_name)
+        hits = await vector_db.asearch(
+            list(embedd_input), RAG_NUM, table_name=DatasetFormatter.format_dataset_by_name(collection_name)
         )
-        loguru.logger.info(f"Context: {context}")
-        return context
+        if not hits:
+            return None
+        budget = await self.context_budget(input_msg, n_predict, turns)
+        context = await self.pack_context(hits, budget)
+        loguru.logger.info(f"Context: {len(context)} chars from {len(hits)} hits, budget {budget} tokens")
+        return context or None
 
     async def inference_with_rag(
         self,
@@ -151,61 +434,63 @@ class RAGChatModelRepository(BaseRAGRepository):
         AsyncGenerator[Any, None]: response message
         """
 
-        async def get_context_by_question(input_msg: str):
+        async def get_question_with_context(input_msg: str) -> str:
             """
             Get the context from v-db by the question
             """
-
-            try:
-                res = await httpx_kit.async_client.post(
-                    InferenceHelper.instruct_embedding_url(),
-                    headers={"Content-Type": "application/json"},
-                    json={"content": input_msg},
-                    timeout=httpx.Timeout(timeout=None),
-                )
-                res.raise_for_status()
-                embedd_input = res.json().get("embedding")
-            except Exception as e:
-                loguru.logger.error(e)
-            # collection name for testing
-            context = vector_db.search(
-                list(embedd_input), 1, table_name=DatasetFormatter.format_dataset_by_name(collection_name)
+            context = await self.search_context(
+                input_msg=input_msg, collection_name=collection_name, n_predict=n_predict, turns=turns
             )
-            if context:
-                context = f"Please answer the question based on answer {context}"
-            else:
-                context = InferenceHelper.instruction
             loguru.logger.info(f"Context: {context}")
-            return context
+            return self.format_question_with_context(input_msg, context) if context else input_msg
 
-        current_context = await get_context_by_question(input_msg)
+        # Replay the answer of a near-duplicate question asked against the same dataset with the same parameters
+        table_name = DatasetFormatter.format_dataset_by_name(collection_name)
+        n_predict = 128 if n_predict == 0 else n_predict
+        # Keyed by the parameters the answer is generated with
+        params_key = semantic_cache.params_key(temperature=temperature, top_k=top_k, top_p=top_p, n_predict=n_predict)
+        # The turns must leave room for the contexts, a long session would starve them otherwise
+        turns = await self.conversation_turns(
+            session_uuid, input_msg, n_predict, context_share=settings.CONVERSATION_RAG_CONTEXT_SHARE
+        )
+        try:
+            question_embedding = await self.get_embedding(input_msg)
+        except Exception as e:
+            loguru.logger.error(e)
+            question_embedding = None
+        # A follow-up question depends on the prior turns, only the first question of a session is replayed
+        if question_embedding is not None and not turns:
+            cached_answer = await semantic_cache.lookup(table_name, question_embedding, params_key)
+            if cached_answer is not None:
+                async for chunk in semantic_cache.replay(cached_answer):
+                    yield chunk
+                return
+
+        question = await get_question_with_context(input_msg)
 
         data_with_context = {
-            "prompt": self.format_prompt(input_msg, current_context=current_context),
+            "prompt": self.format_prompt(question, turns=turns),
             "temperature": temperature,
             "top_k": top_k,
             "top_p": top_p,
             "n_keep": 0,  # If the context window is full, we keep 0 tokens
-            "n_predict": 128 if n_predict == 0 else n_predict,
-            "cache_prompt": False,
-            "slot_id": -1,  # for cached prompt
+            "n_predict": n_predict,
+            "cache_prompt": True,
             "stop": ["\n### Human:"],
             "stream": True,
         }
 
+        recorder = CompletionRecorder()
         try:
-            async with httpx_kit.async_client.stream(
-                "POST",
-                InferenceHelper.instruct_infer_url(),
-                headers={"Content-Type": "application/json"},
-                json=data_with_context,
-                # We disable all timeout and trying to fix streaming randomly cutting off
-                timeout=httpx.Timeout(timeout=None),
-            ) as response:
-                response.raise_for_status()
-                async for chunk in response.aiter_text():
-                    yield chunk
-        except httpx.ReadError as e:
-            loguru.logger.error(f"An error occurred while requesting {e.request.url!r}.")
+            async for chunk in self.stream_completion(session_uuid, data_with_context, recorder):
+                yield chunk
+        # A connection error, or the engine was silent longer than the read timeout
+        except httpx.TransportError as e:
+            loguru.logger.error(f"An error occurred while requesting {e.request.url!r}: {e!r}")
+            return
         except httpx.HTTPStatusError as e:
             loguru.logger.error(f"Error response {e.response.status_code} while requesting {e.request.url!r}.")
+            return
+        # Only complete answers are worth replaying
+        if question_embedding is not None and not turns and recorder.stopped:
+            await semantic_cache.store(table_name, input_msg, question_embedding, params_key, recorder.content)
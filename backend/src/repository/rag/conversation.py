@@ -0,0 +1,98 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+from src.config.manager import settings
+from src.repository.tokenizer_eng import token_counter
+from src.utilities.cachekit.lru_cache import LRUCache
+
+HUMAN_PREFIX = "\n### Human: "
+ASSISTANT_PREFIX = "\n### Assistant: "
+
+
+class ConversationWindow:
+    """
+    Choose the prior turns of a session that are sent with its next question
+
+    llama.cpp only reuses the cached prompt of a slot up to the first token that differs, so a window
+    sliding by one turn per question would change the prompt right after the system prompt every time.
+    Instead the start of the window (the seq of its first message) is kept per session, and only moved
+    forward once the turns after it overflow the budget, past enough of the oldest turns to leave room
+    for the next few questions.
+
+    Args:
+    max_tokens (int): maximum number of tokens of the turns
+    refill_ratio (float): share of the budget the turns are cut down to when they overflow
+    max_sessions (int): number of sessions whose window start is kept in memory
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = settings.CONVERSATION_MAX_TOKENS,
+        refill_ratio: float = settings.CONVERSATION_WINDOW_REFILL,
+        max_sessions: int = settings.CONVERSATION_WINDOW_SESSIONS,
+    ):
+        self.max_tokens = max_tokens
+        self.refill_ratio = refill_ratio
+        self.starts = LRUCache(name="conversation_window", max_entries=max_sessions)
+
+    @staticmethod
+    def format_message(message: dict) -> str:
+        """
+        Format a message of the chat history as a turn of the prompt
+        """
+        prefix = HUMAN_PREFIX if message["role"] == "user" else ASSISTANT_PREFIX
+        return prefix + message["message"].strip()
+
+    def format_turns(self, messages: list[dict]) -> str:
+        return "".join(self.format_message(message) for message in messages)
+
+    async def select(self, session_uuid: str, messages: list[dict], budget: int) -> list[dict]:
+        """
+        Select the last messages of the session that fit in the token budget, starting with a question
+
+        Args:
+        session_uuid (str): session uuid
+        messages (list[dict]): the last messages of the session in order, with their seq, role and message
+        budget (int): tokens left in the context window for the turns
+
+        Returns:
+        list[dict]: the messages of the window in order
+        """
+        budget = min(budget, self.max_tokens)
+        if budget <= 0 or not messages:
+            return list()
+        costs = await asyncio.gather(*[token_counter.count(self.format_message(message)) for message in messages])
+        start_seq = self.starts.get(session_uuid)
+        start = 0
+        if start_seq is not None:
+            start = next((i for i, message in enumerate(messages) if message["seq"] >= start_seq), 0)
+        total = sum(costs[start:])
+        if start_seq is None or total > budget:
+            # A session seen for the first time gets as many turns as fit, later the window jumps ahead
+            target = budget if start_seq is None else budget * self.refill_ratio
+            while start < len(messages) and (total > target or messages[start]["role"] != "user"):
+                total -= costs[start]
+                start += 1
+        window = messages[start:]
+        if window:
+            self.starts.put(session_uuid, window[0]["seq"])
+        else:
+            self.starts.invalidate(session_uuid)
+        return window
+
+
+conversation_window: ConversationWindow = ConversationWindow()
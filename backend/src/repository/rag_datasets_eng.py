@@ -13,9 +13,24 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from datasets import load_dataset
+import asyncio
+import time
+from collections.abc import Callable, Iterator
+
+import loguru
+import pyarrow as pa
+import pyarrow.compute as pc
+from datasets import load_dataset, load_dataset_builder
+from src.config.settings.const import LOAD_BATCH_SIZE
+from src.repository.embedding_eng import EmbeddingBatcher
+from src.repository.text_ingestion import TextIngestionPipeline
 from src.repository.vector_database import vector_db
+from src.repository.semantic_cache import semantic_cache
 from src.utilities.formatters.ds_formatter import DatasetFormatter
+from src.utilities.httpkit.httpx_kit import httpx_kit
+
+# Seconds between two progress logs of a dataset being loaded
+PROGRESS_LOG_INTERVAL = 5.0
 
 
 class DatasetEng:
@@ -28,27 +43,152 @@ class DatasetEng:
     def get_dataset_by_name(self, name: str):
         pass
 
+    @staticmethod
+    def to_vector_batch(batch: pa.Table) -> pa.Table:
+        """
+        Rename the list column of the batch to `vector`, as a fixed size list of float32 so LanceDB can
+        search it. If there are several list columns the last one is kept.
+
+        Args:
+        batch (pa.Table): a batch of the dataset
+
+        Returns:
+        pa.Table: the batch in the layout of the vector database
+        """
+        list_columns = [
+            field.name for field in batch.schema if pa.types.is_list(field.type) or pa.types.is_large_list(field.type)
+        ]
+        if not list_columns:
+            raise ValueError("The dataset has no embedding column")
+        embeddings = batch.column(list_columns[-1]).combine_chunks()
+        dims = pc.unique(pc.list_value_length(embeddings))
+        if len(dims) != 1 or dims[0].as_py() is None:
+            raise ValueError("The embeddings of the dataset are not of the same dimension")
+        vectors = pa.FixedSizeListArray.from_arrays(pc.list_flatten(embeddings).cast(pa.float32()), dims[0].as_py())
+        batch = batch.drop_columns(list_columns).append_column("vector", vectors)
+        # The Hugging Face features are not the features of the table anymore
+        return batch.replace_schema_metadata(None)
+
+    @classmethod
+    def iter_batches(cls, name: str, batch_size: int = LOAD_BATCH_SIZE) -> Iterator[pa.Table]:
+        """
+        Stream the validation split of the dataset in batches, the split is never materialized
+        """
+        ds = load_dataset(name, split="validation", streaming=True)
+        for batch in ds.with_format("arrow").iter(batch_size=batch_size):
+            yield cls.to_vector_batch(batch)
+
     @classmethod
-    def validate_dataset(cls, name: str) -> list:
+    def count_rows(cls, name: str) -> int | None:
         """
-        Validate the dataset by the given name
+        Number of rows of the validation split from the dataset card, None if the card does not tell
         """
-        ds = load_dataset(name)
-        ds_list = ds.get("validation").to_list()
-        for item in ds_list:
-            for key, value in list(item.items()):
-                if isinstance(value, list):
-                    item['vector'] = item.pop(key)
+        try:
+            split = load_dataset_builder(name).info.splits["validation"]
+        except Exception as e:
+            loguru.logger.warning(f"Dataset Engine --- Unknown size of {name}: {e}")
+            return None
+        return split.num_examples or None
+
+    @classmethod
+    def validate_dataset(cls, name: str) -> pa.Schema:
+        """
+        Validate the dataset by the given name and create its empty table
+
+        Returns:
+        pa.Schema: the schema of the table
+        """
+        first = next(cls.iter_batches(name, batch_size=1))
         name = DatasetFormatter.format_dataset_by_name(name) if name else None
-        vector_db.create_table(table_name=name, data=[ds_list[0]])
-        return ds_list
+        vector_db.create_table(table_name=name, data=first.slice(0, 0))
+        # The table is recreated, the answers cached against its previous content are stale
+        semantic_cache.invalidate(table_name=name)
+        return first.schema
 
     @classmethod
-    def load_dataset(cls, name: str, ds_list: list) -> dict:
+    def load_dataset(cls, name: str, progress: Callable[[int], None] | None = None) -> int:
         """
         Load dataset from the given name, must connect to the internet
 
-        No need to consider the memory usage
+        The dataset is streamed and written `LOAD_BATCH_SIZE` rows at a time, so the memory usage does not
+        depend on the size of the dataset.
+
+        Args:
+        name (str): dataset name
+        progress (Callable[[int], None] | None): called with the number of rows written so far, the
+            progress is logged if not given
+
+        Returns:
+        int: number of rows written
         """
-        name = DatasetFormatter.format_dataset_by_name(name) if name else None
-        return vector_db.insert_list(table_name=name, data_list=ds_list)
+        table_name = DatasetFormatter.format_dataset_by_name(name) if name else None
+        return vector_db.insert_batches(
+            table_name=table_name, batches=cls.iter_batches(name), progress=progress or cls.progress_logger(name)
+        )
+
+    @staticmethod
+    def rebuild_index(table_name: str) -> dict:
+        """
+        Retrain the vector index of a loaded table from all its rows
+
+        Returns:
+        dict: the index status after the rebuild
+        """
+        return vector_db.ensure_index(table_name, rebuild=True)
+
+    @staticmethod
+    def progress_logger(name: str) -> Callable[[int], None]:
+        """
+        A progress callback logging the rows written at most every `PROGRESS_LOG_INTERVAL` seconds
+        """
+        last_log = time.monotonic()
+
+        def progress(written: int) -> None:
+            nonlocal last_log
+            if time.monotonic() - last_log >= PROGRESS_LOG_INTERVAL:
+                last_log = time.monotonic()
+                loguru.logger.info(f"Dataset Engine --- {name}: {written} rows written")
+
+        return progress
+
+    @classmethod
+    def iter_texts(cls, name: str, text_column: str, batch_size: int = LOAD_BATCH_SIZE) -> Iterator[list[str]]:
+        """
+        Stream the texts of a raw text dataset in batches
+        """
+        ds = load_dataset(name, split="validation", streaming=True)
+        for batch in ds.with_format("arrow").iter(batch_size=batch_size):
+            if text_column not in batch.column_names:
+                raise ValueError(f"The dataset has no `{text_column}` column")
+            yield batch.column(text_column).to_pylist()
+
+    @classmethod
+    def load_text_dataset(cls, name: str, text_column: str, progress: Callable[[int], None] | None = None) -> int:
+        """
+        Load a raw text dataset, the texts are chunked and embedded by the embedding engine
+
+        It runs its own event loop, so it must be called from a worker thread and not from the server.
+
+        Args:
+        name (str): dataset name
+        text_column (str): column holding the raw texts
+        progress (Callable[[int], None] | None): called with the number of chunks written so far
+
+        Returns:
+        int: number of chunks written
+        """
+        table_name = DatasetFormatter.format_dataset_by_name(name) if name else None
+        # The table is recreated, the answers cached against its previous content are stale
+        semantic_cache.invalidate(table_name=table_name)
+        return asyncio.run(cls._load_text_dataset(name, text_column, table_name, progress or cls.progress_logger(name)))
+
+    @classmethod
+    async def _load_text_dataset(
+        cls, name: str, text_column: str, table_name: str, progress: Callable[[int], None]
+    ) -> int:
+        # The shared client of httpx_kit belongs to the event loop of the server
+        async with httpx_kit.init_upstream_client("embedding") as client:
+            pipeline = TextIngestionPipeline(lance_helper=vector_db)
+            return await pipeline.run(
+                cls.iter_texts(name, text_column), table_name, EmbeddingBatcher(client=client).embed_batch, progress
+            )
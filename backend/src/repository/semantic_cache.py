@@ -0,0 +1,236 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import re
+import time
+from collections.abc import AsyncGenerator
+from datetime import datetime, timedelta
+
+import loguru
+
+from src.config.manager import settings
+from src.config.settings.const import SEMANTIC_CACHE_TABLE
+from src.models.meta import SemanticCacheEntry
+from src.repository.vector_database import LanceHelper, vector_db
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+# Seconds between two evictions of the expired and the oldest entries, checked when an answer is stored
+EVICTION_INTERVAL_SEC = 60.0
+
+
+class CompletionRecorder:
+    """
+    Rebuild the generated answer from the SSE chunks of llama.cpp `/completion`
+
+    The chunks are not aligned with the `data: {...}` lines, so the incomplete tail is kept until the rest
+    of the line arrives.
+
+    Args:
+    keep_content (bool): False to only parse the last frame, when the answer itself is not needed
+    """
+
+    def __init__(self, keep_content: bool = True):
+        self.keep_content = keep_content
+        self._buffer = b""
+        self._content: list[str] = list()
+        self.stopped = False
+        # The last frame carries the slot and the prompt cache statistics of the completion
+        self.final: dict | None = None
+
+    def feed(self, chunk: bytes | str) -> None:
+        if isinstance(chunk, str):
+            chunk = chunk.encode("utf-8")
+        # Whole lines without the last frame have nothing to record
+        if not self.keep_content and not self._buffer and chunk.endswith(b"\n") and not self._has_stop(chunk):
+            return
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split(b"\n")
+        for line in lines:
+            if not line.startswith(b"data: "):
+                continue
+            if not self.keep_content and not self._has_stop(line):
+                continue
+            try:
+                frame = json.loads(line[len(b"data: ") :])
+            except ValueError:
+                continue
+            self._content.append(frame.get("content", ""))
+            if frame.get("stop"):
+                self.stopped = True
+                self.final = frame
+
+    @property
+    def content(self) -> str:
+        return "".join(self._content)
+
+    @staticmethod
+    def _has_stop(data: bytes) -> bool:
+        return b'"stop":true' in data or b'"stop": true' in data
+
+
+class SemanticCache:
+    """
+    Cache the RAG answers by question embedding, per dataset table and generation parameters
+
+    The entries live in a dedicated LanceDB table next to the datasets. A question is a hit when the
+    cosine distance to a cached question of the same dataset, asked with the same generation
+    parameters, is within `max_distance`.
+
+    An entry older than `ttl` seconds is not served anymore. The expired entries, and the oldest ones
+    beyond `max_entries`, are deleted at most every `eviction_interval` seconds when an answer is stored.
+    """
+
+    def __init__(
+        self,
+        lance_helper: LanceHelper = vector_db,
+        table_name: str = SEMANTIC_CACHE_TABLE,
+        max_distance: float = settings.SEMANTIC_CACHE_MAX_DISTANCE,
+        enabled: bool = settings.SEMANTIC_CACHE_ENABLED,
+        ttl: float = settings.SEMANTIC_CACHE_TTL_SEC,
+        max_entries: int = settings.SEMANTIC_CACHE_MAX_ENTRIES,
+        eviction_interval: float = EVICTION_INTERVAL_SEC,
+    ):
+        self.lance_helper = lance_helper
+        self.table_name = table_name
+        self.max_distance = max_distance
+        self.enabled = enabled
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.eviction_interval = eviction_interval
+        self._last_eviction: float | None = None
+        self.hits = metrics_kit.counter("semantic_cache_hits", "RAG answers replayed from the semantic cache")
+        self.misses = metrics_kit.counter("semantic_cache_misses", "RAG questions sent to the inference engine")
+
+    @staticmethod
+    def params_key(**params) -> str:
+        return json.dumps(params, sort_keys=True, separators=(",", ":"))
+
+    def _open_table(self):
+        try:
+            return self.lance_helper.tables.open_table(self.table_name)
+        except FileNotFoundError:
+            tbl = self.lance_helper.db.create_table(self.table_name, schema=SemanticCacheEntry, exist_ok=True)
+            self.lance_helper.tables.put(self.table_name, tbl)
+            return tbl
+
+    def _lookup(self, table_name: str, embedding: list[float], params_key: str) -> str | None:
+        hits = (
+            self._open_table()
+            .search(embedding)
+            .metric("cosine")
+            .where(
+                f"table_name = '{table_name}' AND params_key = '{params_key}' "
+                f"AND created_at >= timestamp '{self._expiry()}'",
+                prefilter=True,
+            )
+            .select(["answer"])
+            .limit(1)
+            .to_list()
+        )
+        if hits and hits[0]["_distance"] <= self.max_distance:
+            return hits[0]["answer"]
+        return None
+
+    def _store(self, table_name: str, question: str, embedding: list[float], params_key: str, answer: str) -> None:
+        self._open_table().add(
+            [
+                {
+                    "table_name": table_name,
+                    "params_key": params_key,
+                    "question": question,
+                    "answer": answer,
+                    "vector": embedding,
+                    "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                }
+            ]
+        )
+        if self._last_eviction is None or time.monotonic() - self._last_eviction >= self.eviction_interval:
+            self._last_eviction = time.monotonic()
+            self.evict()
+
+    def _expiry(self) -> str:
+        """
+        Creation time of the oldest entry still served
+        """
+        return (datetime.now() - timedelta(seconds=self.ttl)).strftime("%Y-%m-%d %H:%M:%S")
+
+    def evict(self) -> None:
+        """
+        Delete the expired entries, then the oldest ones until at most `max_entries` are left. The entries
+        created in the same second as the last evicted one are evicted with it.
+        """
+        tbl = self._open_table()
+        tbl.delete(f"created_at < timestamp '{self._expiry()}'")
+        excess = tbl.count_rows() - self.max_entries
+        if excess <= 0:
+            return
+        created_at = tbl.to_lance().to_table(columns=["created_at"]).column("created_at").to_pylist()
+        cutoff = sorted(created_at)[excess - 1].strftime("%Y-%m-%d %H:%M:%S")
+        tbl.delete(f"created_at <= timestamp '{cutoff}'")
+        loguru.logger.info(f"Semantic Cache --- Evicted the entries created until {cutoff}")
+
+    async def lookup(self, table_name: str, embedding: list[float], params_key: str) -> str | None:
+        """
+        Find the cached answer of a near-duplicate question
+
+        Args:
+        table_name (str): dataset table the question is asked against
+        embedding (list[float]): embedding of the question
+        params_key (str): generation parameters, see `params_key`
+
+        Returns:
+        str | None: the cached answer
+        """
+        if not self.enabled:
+            return None
+        try:
+            answer = await self.lance_helper.run(self._lookup, table_name, embedding, params_key)
+        except Exception as e:
+            loguru.logger.error(f"Semantic Cache --- Error: {e}")
+            answer = None
+        (self.hits if answer is not None else self.misses).inc()
+        return answer
+
+    async def store(self, table_name: str, question: str, embedding: list[float], params_key: str, answer: str) -> None:
+        if not self.enabled or not answer:
+            return
+        try:
+            await self.lance_helper.run(self._store, table_name, question, embedding, params_key, answer)
+        except Exception as e:
+            loguru.logger.error(f"Semantic Cache --- Error: {e}")
+
+    def invalidate(self, table_name: str) -> None:
+        """
+        Drop the cached answers of a dataset table, its content changed
+        """
+        try:
+            self._open_table().delete(f"table_name = '{table_name}'")
+        except Exception as e:
+            loguru.logger.error(f"Semantic Cache --- Error: {e}")
+
+    @staticmethod
+    async def replay(answer: str) -> AsyncGenerator[str, None]:
+        """
+        Stream a cached answer in the same `data: {...}` chunks as llama.cpp `/completion`
+        """
+        for piece in re.findall(r"\s*\S+|\s+", answer):
+            frame = {"content": piece, "stop": False, "id_slot": -1, "multimodal": False}
+            yield f"data: {json.dumps(frame, separators=(',', ':'))}\n\n"
+        frame = {"content": "", "stop": True, "id_slot": -1, "multimodal": False, "semantic_cache": True}
+        yield f"data: {json.dumps(frame, separators=(',', ':'))}\n\n"
+
+
+semantic_cache: SemanticCache = SemanticCache()
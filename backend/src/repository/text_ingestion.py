@@ -0,0 +1,130 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from collections.abc import Awaitable, Callable, Iterator
+
+import pyarrow as pa
+
+from src.config.manager import settings
+from src.repository.vector_database import LanceHelper, vector_db
+from src.utilities.formatters.chunk_formatter import ChunkFormatter
+
+
+class TextIngestionPipeline:
+    """
+    Chunk, embed and write a raw text dataset
+
+    The three stages run concurrently and hand over batches through bounded queues:
+
+    * the chunker reads the texts and splits them into batches of `batch_size` chunks
+    * `embedding_concurrency` embedders send the batches to the embedding engine in parallel
+    * the writer appends the embedded batches to the table
+
+    So the throughput follows the parallelism of the embedding engine, and at most `queue_size` batches
+    wait between two stages whatever the size of the dataset.
+    """
+
+    def __init__(
+        self,
+        lance_helper: LanceHelper = vector_db,
+        embedding_concurrency: int = settings.INGESTION_EMBEDDING_CONCURRENCY,
+        batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+        chunk_size: int = settings.INGESTION_CHUNK_SIZE,
+        chunk_overlap: int = settings.INGESTION_CHUNK_OVERLAP,
+        queue_size: int = 8,
+    ):
+        self.lance_helper = lance_helper
+        self.embedding_concurrency = max(1, embedding_concurrency)
+        self.batch_size = max(1, batch_size)
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.queue_size = queue_size
+
+    @staticmethod
+    def to_table(chunks: list[str], vectors: list[list[float]]) -> pa.Table:
+        dim = len(vectors[0])
+        flat = pa.array([value for vector in vectors for value in vector], type=pa.float32())
+        return pa.table({"context": chunks, "vector": pa.FixedSizeListArray.from_arrays(flat, dim)})
+
+    async def run(
+        self,
+        texts: Iterator[list[str]],
+        table_name: str,
+        embed: Callable[[list[str]], Awaitable[list[list[float]]]],
+        progress: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Ingest the texts into the table, the table is recreated with the first embedded batch
+
+        Args:
+        texts (Iterator[list[str]]): batches of raw texts, the iterator may block, it is read in a thread
+        table_name (str): table to write to
+        embed (Callable): embeds a batch of chunks, e.g. `EmbeddingBatcher.embed_batch`
+        progress (Callable[[int], None] | None): called with the number of chunks written so far
+
+        Returns:
+        int: number of chunks written
+        """
+        chunks_queue: asyncio.Queue[list[str] | None] = asyncio.Queue(maxsize=self.queue_size)
+        tables_queue: asyncio.Queue[pa.Table | None] = asyncio.Queue(maxsize=self.queue_size)
+
+        async def chunker() -> None:
+            pending: list[str] = list()
+            while (batch := await asyncio.to_thread(next, texts, None)) is not None:
+                for text in batch:
+                    pending.extend(ChunkFormatter.split_text(text or "", self.chunk_size, self.chunk_overlap))
+                while len(pending) >= self.batch_size:
+                    await chunks_queue.put(pending[: self.batch_size])
+                    pending = pending[self.batch_size :]
+            if pending:
+                await chunks_queue.put(pending)
+            for _ in range(self.embedding_concurrency):
+                await chunks_queue.put(None)
+
+        async def embedder() -> None:
+            while (chunks := await chunks_queue.get()) is not None:
+                await tables_queue.put(self.to_table(chunks, await embed(chunks)))
+            await tables_queue.put(None)
+
+        async def writer() -> int:
+            written, finished = 0, 0
+            while finished < self.embedding_concurrency:
+                table = await tables_queue.get()
+                if table is None:
+                    finished += 1
+                    continue
+                if written == 0:
+                    await asyncio.to_thread(self.lance_helper.create_table, table_name, table)
+                else:
+                    tbl = await asyncio.to_thread(self.lance_helper.tables.open_table, table_name)
+                    await asyncio.to_thread(tbl.add, table)
+                written += table.num_rows
+                if progress is not None:
+                    progress(written)
+            return written
+
+        # A failing stage cancels the others, nobody is left waiting on a queue
+        try:
+            async with asyncio.TaskGroup() as task_group:
+                task_group.create_task(chunker())
+                for _ in range(self.embedding_concurrency):
+                    task_group.create_task(embedder())
+                writer_task = task_group.create_task(writer())
+        except ExceptionGroup as e:
+            raise e.exceptions[0]
+        if writer_task.result() > 0:
+            await asyncio.to_thread(self.lance_helper.optimize_table, table_name)
+        return writer_task.result()
@@ -0,0 +1,77 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+
+import httpx
+import loguru
+
+from src.config.manager import settings
+from src.repository.inference_eng import InferenceHelper, inference_pool
+from src.utilities.cachekit.lru_cache import LRUCache
+from src.utilities.httpkit.httpx_kit import httpx_kit
+
+# Rough number of characters per token, only used when the inference engine can not tokenize
+CHARS_PER_TOKEN_ESTIMATE = 3
+
+
+class TokenCounter:
+    """
+    Count tokens with the `/tokenize` endpoint of the inference engine
+
+    The same contexts come back for every question asked against a dataset, so the counts are cached by the
+    digest of the content.
+    """
+
+    def __init__(self, max_entries: int = settings.TOKENIZER_CACHE_ENTRIES, client: httpx.AsyncClient | None = None):
+        self._client = client
+        self.cache = LRUCache(name="tokenizer_cache", max_entries=max_entries)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client if self._client is not None else httpx_kit.inference_client
+
+    async def count(self, content: str) -> int:
+        """
+        Count the tokens of the content
+
+        Args:
+        content (str): the content to tokenize
+
+        Returns:
+        int: number of tokens, an overestimate if the inference engine is not reachable
+        """
+        key = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        num_tokens = self.cache.get(key)
+        if num_tokens is not None:
+            return num_tokens
+        try:
+            with inference_pool.use() as endpoint:
+                res = await self.client.post(
+                    InferenceHelper.tokenizer_url(endpoint),
+                    headers={"Content-Type": "application/json"},
+                    json={"content": content},
+                )
+                res.raise_for_status()
+            num_tokens = len(res.json()["tokens"])
+        except Exception as e:
+            loguru.logger.error(f"Tokenizer --- Error: {e}")
+            # Do not cache the estimate, the engine may be back for the next request
+            return len(content) // CHARS_PER_TOKEN_ESTIMATE + 1
+        self.cache.put(key, num_tokens)
+        return num_tokens
+
+
+token_counter: TokenCounter = TokenCounter()
@@ -1,41 +1,262 @@
+import asyncio
+import functools
+import math
+import threading
+import time
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+
 import loguru
+from src.config.manager import settings
 from src.config.settings.const import DEFAULT_COLLECTION, DATASET_LANCEDB
 
 import lancedb
 
+
+class TableHandleCache:
+    """
+    Cache the opened LanceDB tables by name, opening a table re-reads its manifest on every call
+
+    A cached handle is checked against the latest version of the dataset at most every
+    `refresh_interval` seconds (0 checks on every access) and moved to the latest version if another
+    handle or process committed a new one. The cache is shared by the threads of the search pool.
+
+    Opening a table and checking its version read from the storage, so they run under a lock of their table
+    only: the cached handles of the other tables, and the fresh handle of this one, are served meanwhile.
+    """
+
+    def __init__(self, db: lancedb.DBConnection, refresh_interval: float = settings.VECTOR_DB_TABLE_REFRESH_SEC):
+        self.db = db
+        self.refresh_interval = refresh_interval
+        # name -> [table, time of the last version check]
+        self._tables: dict[str, list] = dict()
+        self._lock = threading.Lock()
+        self._table_locks: dict[str, threading.Lock] = dict()
+
+    def open_table(self, table_name: str) -> lancedb.table.LanceTable:
+        with self._lock:
+            entry = self._tables.get(table_name)
+            if entry is not None and time.monotonic() - entry[1] < self.refresh_interval:
+                return entry[0]
+            table_lock = self._table_locks.setdefault(table_name, threading.Lock())
+        with table_lock:
+            # Another thread may have opened or checked the table while this one was waiting
+            with self._lock:
+                entry = self._tables.get(table_name)
+            if entry is None:
+                tbl = self.db.open_table(table_name)
+                with self._lock:
+                    # A handle put meanwhile, e.g. of a recreated table, wins over the one just opened
+                    entry = self._tables.setdefault(table_name, [tbl, time.monotonic()])
+            elif time.monotonic() - entry[1] >= self.refresh_interval:
+                tbl = entry[0]
+                if tbl.to_lance().latest_version != tbl.version:
+                    tbl.checkout_latest()
+                entry[1] = time.monotonic()
+            return entry[0]
+
+    def put(self, table_name: str, tbl: lancedb.table.LanceTable) -> None:
+        with self._lock:
+            self._tables[table_name] = [tbl, time.monotonic()]
+
+    def invalidate(self, table_name: str | None = None) -> None:
+        """
+        Drop the cached handle of a table, or of all the tables if no name is given
+        """
+        with self._lock:
+            if table_name is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table_name, None)
+
+
 class LanceHelper:
-    def __init__(self):
-        self.db = lancedb.connect(DATASET_LANCEDB)
+    def __init__(
+        self,
+        uri: str = DATASET_LANCEDB,
+        search_workers: int = settings.VECTOR_DB_SEARCH_WORKERS,
+        index_min_rows: int = settings.VECTOR_DB_INDEX_MIN_ROWS,
+    ):
+        self.db = lancedb.connect(uri)
+        self.tables = TableHandleCache(self.db)
+        self.index_min_rows = index_min_rows
+        # Building an index is expensive, only one build runs at a time
+        self._index_lock = threading.Lock()
+        # LanceDB queries are blocking, they run here so the event loop keeps serving other requests
+        self._executor = ThreadPoolExecutor(max_workers=search_workers, thread_name_prefix="lancedb-search")
 
     def create_table(self, table_name=DEFAULT_COLLECTION, data: list =[], recreate=True):
         try:
+            # An overwritten table is a new dataset, the cached handle must not be used anymore
+            self.tables.invalidate(table_name)
             if recreate:
-                self.db.create_table(table_name, data=data , mode="overwrite")
+                tbl = self.db.create_table(table_name, data=data , mode="overwrite")
             else:
-                self.db.create_table(table_name, data=data)
+                tbl = self.db.create_table(table_name, data=data)
+            self.tables.put(table_name, tbl)
         except Exception as e:
             loguru.logger.error(e)
         return None
     
     def insert_list(self, table_name: str = DEFAULT_COLLECTION, data_list: list = []):
         try:
-            tbl = self.db.open_table(table_name)
+            tbl = self.tables.open_table(table_name)
             tbl.add(data_list)
+            # The index is updated by `optimize_table`, building it here would hold up every append
             loguru.logger.info(f"Vector Databse --- Inserted {len(data_list)} records")
         except Exception as e:
             loguru.logger.error(f"Vector Databse --- Error: {e}")
+
+    def insert_batches(
+        self,
+        table_name: str = DEFAULT_COLLECTION,
+        batches: Iterable = (),
+        progress: Callable[[int], None] | None = None,
+    ) -> int:
+        """
+        Append the batches one at a time, only the batch being written is held in memory. The small
+        fragments are compacted and the index is updated once all the batches are written.
+
+        Args:
+        table_name (str): table to append to
+        batches (Iterable): Arrow tables or record batches matching the schema of the table
+        progress (Callable[[int], None] | None): called with the number of rows written so far
+
+        Returns:
+        int: number of rows written
+        """
+        tbl = self.tables.open_table(table_name)
+        written = 0
+        for batch in batches:
+            tbl.add(batch)
+            written += batch.num_rows
+            if progress is not None:
+                progress(written)
+        loguru.logger.info(f"Vector Databse --- Inserted {written} records")
+        self.optimize_table(table_name)
+        return written
+
+    def optimize_table(self, table_name: str = DEFAULT_COLLECTION) -> None:
+        """
+        Merge the small fragments left by batched writes and update the vector index
+        """
+        self.tables.open_table(table_name).compact_files()
+        self.ensure_index(table_name)
+
+    @staticmethod
+    def index_params(num_rows: int, dim: int) -> dict:
+        """
+        IVF-PQ parameters for a table, about sqrt(n) partitions and sub vectors of 16 dimensions when the
+        dimension allows it
+
+        Returns:
+        dict: keyword arguments of `LanceTable.create_index`
+        """
+        num_partitions = max(1, int(math.sqrt(num_rows)))
+        num_sub_vectors = next(n for n in (dim // 16, dim // 8, dim // 4, dim // 2, 1) if n > 0 and dim % n == 0)
+        return {"num_partitions": num_partitions, "num_sub_vectors": num_sub_vectors}
+
+    def index_status(self, table_name: str = DEFAULT_COLLECTION) -> dict:
+        """
+        Status of the vector index of a table
+
+        Returns:
+        dict: number of rows, index type and number of indexed and unindexed rows
+        """
+        tbl = self.tables.open_table(table_name)
+        ds = tbl.to_lance()
+        status = {
+            "table_name": table_name,
+            "num_rows": tbl.count_rows(),
+            "index_type": None,
+            "num_indexed_rows": 0,
+            "num_unindexed_rows": 0,
+        }
+        for index in ds.list_indices():
+            if index["fields"] == ["vector"]:
+                stats = ds.stats.index_stats(index["name"])
+                status["index_type"] = stats["index_type"]
+                status["num_indexed_rows"] = stats["num_indexed_rows"]
+                status["num_unindexed_rows"] = stats["num_unindexed_rows"]
+        return status
+
+    def ensure_index(self, table_name: str = DEFAULT_COLLECTION, rebuild: bool = False) -> dict:
+        """
+        Create the vector index once the table crosses `index_min_rows`, afterwards only the appended rows
+        are added to the existing index. A rebuild retrains the index from all the rows of the table.
+
+        Returns:
+        dict: the index status after the update
+        """
+        with self._index_lock:
+            status = self.index_status(table_name)
+            tbl = self.tables.open_table(table_name)
+            if status["index_type"] is None and status["num_rows"] < self.index_min_rows:
+                # A scan of a small table is as fast as a search through an index
+                return status
+            if status["index_type"] is None or rebuild:
+                dim = tbl.schema.field("vector").type.list_size
+                params = self.index_params(status["num_rows"], dim)
+                start = time.perf_counter()
+                tbl.create_index(vector_column_name="vector", replace=True, **params)
+                loguru.logger.info(
+                    f"Vector Databse --- Built index of {table_name} with {params} "
+                    f"in {time.perf_counter() - start:.1f}s"
+                )
+            elif status["num_unindexed_rows"] > 0:
+                # Incremental, the appended rows are assigned to the trained partitions
+                tbl.to_lance().optimize.optimize_indices()
+            else:
+                return status
+            # The index is a new version of the table
+            tbl.checkout_latest()
+            return self.index_status(table_name)
     
-    def search(self, data, n_results, table_name=DEFAULT_COLLECTION):
-        print(table_name)
+    def search(self, data, n_results, table_name=DEFAULT_COLLECTION) -> list[dict]:
+        """
+        Search the k nearest contexts of the vector
+
+        Returns:
+        list[dict]: hits as {"context": str, "distance": float}, nearest first, without duplicated contexts
+        """
         try:
-            tbl = self.db.open_table(table_name)
+            tbl = self.tables.open_table(table_name)
+            # Without an index the table is scanned and these are ignored
             df = tbl.search(data) \
-                .limit(n_results) \
+                .nprobes(settings.VECTOR_DB_SEARCH_NPROBES) \
+                .refine_factor(settings.VECTOR_DB_SEARCH_REFINE_FACTOR) \
+                .limit(n_results * max(1, settings.VECTOR_DB_SEARCH_OVERFETCH)) \
                 .select(["context"]) \
                 .to_list()
-            return df[0].get("context")
         except Exception as e:
             loguru.logger.error(e)
-        return None
-    
+            return []
+        hits: list[dict] = list()
+        seen: set[str] = set()
+        for row in sorted(df, key=lambda row: row["_distance"]):
+            context = row.get("context")
+            if not context or context.strip() in seen:
+                continue
+            seen.add(context.strip())
+            hits.append({"context": context, "distance": row["_distance"]})
+            if len(hits) == n_results:
+                break
+        return hits
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking LanceDB call in the bounded search pool instead of blocking the event loop
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def asearch(self, data, n_results, table_name=DEFAULT_COLLECTION):
+        """
+        Same as `search`, but run in the bounded search pool
+        """
+        return await self.run(self.search, data, n_results, table_name=table_name)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
 vector_db: LanceHelper = LanceHelper()
@@ -14,6 +14,8 @@
 # limitations under the License.
 
 import datetime
+import hashlib
+import time
 
 import pydantic
 import jwt as pyjwt
@@ -23,11 +25,14 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from src.config.manager import settings
 from src.models.schemas.account import Account
 from src.models.schemas.jwt import JWTAccount, JWToken
+from src.utilities.cachekit.lru_cache import LRUCache
 
 
 class JWTGenerator:
-    def __init__(self):
-        pass
+    def __init__(self, cache: LRUCache | None = None):
+        # pyjwt prepares a raw key on every encode and decode, a prepared one is used as is
+        self._key = pyjwt.get_algorithm_by_name(settings.JWT_ALGORITHM).prepare_key(settings.JWT_SECRET_KEY)
+        self.cache = cache if cache is not None else LRUCache("jwt_cache", max_entries=settings.JWT_CACHE_ENTRIES)
 
     def _generate_jwt_token(
         self,
@@ -45,18 +50,28 @@ class JWTGenerator:
 
         to_encode.update(JWToken(exp=expire, sub=settings.JWT_SUBJECT).model_dump())
 
-        return pyjwt.encode(to_encode, key=settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+        return pyjwt.encode(to_encode, key=self._key, algorithm=settings.JWT_ALGORITHM)
 
     def generate_access_token(self, account: Account) -> str:
         return self._generate_jwt_token(
-            jwt_data=JWTAccount(username=account.username, email=account.email).model_dump(),  # type: ignore
+            jwt_data=JWTAccount(
+                username=account.username, email=account.email, account_id=account.id
+            ).model_dump(),  # type: ignore
             expires_delta=datetime.timedelta(minutes=settings.JWT_ACCESS_TOKEN_EXPIRATION_TIME),
         )
 
-    def retrieve_details_from_token(self, token: str) -> dict:
+    def decode_token(self, token: str) -> tuple[JWTAccount, float]:
+        """
+        Verify the signature and the expiry of the token and read the account from its payload
+
+        Returns:
+        tuple[JWTAccount, float]: the account and the expiry of the token as a unix timestamp
+        """
         try:
-            payload = pyjwt.decode(token, key=settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-            jwt_account = JWTAccount(username=payload["username"], email=payload["email"])
+            payload = pyjwt.decode(token, key=self._key, algorithms=[settings.JWT_ALGORITHM])
+            jwt_account = JWTAccount(
+                username=payload["username"], email=payload["email"], account_id=payload.get("account_id")
+            )
 
         except pyjwt.exceptions.DecodeError as token_decode_error:
             raise ValueError("Unable to decode JWT Token") from token_decode_error
@@ -64,6 +79,21 @@ class JWTGenerator:
         except pydantic.ValidationError as validation_error:
             raise ValueError("Invalid payload in token") from validation_error
 
+        return jwt_account, payload["exp"]
+
+    def retrieve_details_from_token(self, token: str) -> JWTAccount:
+        """
+        The account of a verified token, a token is only decoded on its first call and then served from the
+        cache until it expires
+        """
+        digest = hashlib.sha256(token.encode()).digest()
+        jwt_account = self.cache.get(digest)
+        if jwt_account is not None:
+            return jwt_account
+        jwt_account, expires_at = self.decode_token(token)
+        ttl = expires_at - time.time()
+        if ttl > 0:
+            self.cache.put(digest, jwt_account, ttl=ttl)
         return jwt_account
 
 
@@ -73,10 +103,14 @@ def get_jwt_generator() -> JWTGenerator:
 
 jwt_generator: JWTGenerator = get_jwt_generator()
 
+bearer_scheme: HTTPBearer = HTTPBearer()
+
 
-async def jwt_required(request: Request):
-    auth_scheme = HTTPBearer()
-    credentials: HTTPAuthorizationCredentials = await auth_scheme(request)
+async def jwt_required(request: Request) -> JWTAccount:
+    """
+    Resolve the bearer token of the request to its account (username, email and account id)
+    """
+    credentials: HTTPAuthorizationCredentials = await bearer_scheme(request)
     token = credentials.credentials
     try:
         jwt_account = jwt_generator.retrieve_details_from_token(token)
@@ -0,0 +1,98 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import multiprocessing
+import threading
+import time
+import typing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import loguru
+
+from src.config.manager import settings
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+HASHING_SECONDS_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class HashingPool:
+    """
+    Run the password hashing in a bounded pool of processes
+
+    bcrypt and argon2 are made to be slow, a hash holds the CPU for tens to hundreds of milliseconds. Run
+    on the event loop it stalls every stream of the worker, and run in a thread it still holds the GIL
+    for the parts passlib runs in Python. The calls queue up in the pool until one of the `max_workers`
+    processes is free.
+
+    The processes are started on first use with `spawn`, forking a worker running the LanceDB and httpx
+    threads is not safe.
+    """
+
+    def __init__(self, max_workers: int = settings.HASHING_WORKERS):
+        self.max_workers = max(1, max_workers)
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._queue_depth = metrics_kit.gauge("hashing_queue_depth", "Hashing calls submitted and not done yet")
+        self._duration = metrics_kit.histogram(
+            "hashing_seconds", HASHING_SECONDS_BUCKETS, "Time from the submit of a hashing call to its result"
+        )
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    async def run(self, fn: typing.Callable, *args) -> typing.Any:
+        """
+        Run a picklable module level function in the pool and wait for its result
+
+        Args:
+        fn (Callable): the function
+        args: its arguments
+
+        Returns:
+        Any: the result of the function
+        """
+        executor = self.executor
+        self._queue_depth.inc()
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            # A process died (e.g. killed by the OOM killer), start a new pool for the next calls
+            loguru.logger.error("Hashing Pool --- A process of the pool died, restarting the pool")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            self._queue_depth.dec()
+            self._duration.observe(time.perf_counter() - start)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+hashing_pool: HashingPool = HashingPool()
@@ -1,16 +1,60 @@
 from src.securities.hashing.hash import hash_generator
+from src.securities.hashing.hashing_pool import hashing_pool
+
+
+def generate_salt() -> str:
+    return hash_generator.generate_password_salt_hash
+
+
+def generate_hashed_password(hash_salt: str, new_password: str) -> str:
+    return hash_generator.generate_password_hash(hash_salt=hash_salt, password=new_password)
+
+
+def generate_salt_and_hashed_password(new_password: str) -> tuple[str, str]:
+    hash_salt = generate_salt()
+    return hash_salt, generate_hashed_password(hash_salt, new_password)
+
+
+def is_password_authenticated(hash_salt: str, password: str, hashed_password: str) -> bool:
+    return hash_generator.is_password_verified(password=hash_salt + password, hashed_password=hashed_password)
 
 
 class PasswordGenerator:
+    """
+    The blocking methods hash on the calling thread, the `async_` ones in the hashing pool so the event loop
+    keeps serving the other requests meanwhile
+    """
+
     @property
     def generate_salt(self) -> str:
-        return hash_generator.generate_password_salt_hash
+        """
+        A new bcrypt hash on every access, read it once per account
+        """
+        return generate_salt()
 
     def generate_hashed_password(self, hash_salt: str, new_password: str) -> str:
-        return hash_generator.generate_password_hash(hash_salt=hash_salt, password=new_password)
+        return generate_hashed_password(hash_salt, new_password)
 
     def is_password_authenticated(self, hash_salt: str, password: str, hashed_password: str) -> bool:
-        return hash_generator.is_password_verified(password=hash_salt + password, hashed_password=hashed_password)
+        return is_password_authenticated(hash_salt, password, hashed_password)
+
+    async def async_generate_salt(self) -> str:
+        return await hashing_pool.run(generate_salt)
+
+    async def async_generate_hashed_password(self, hash_salt: str, new_password: str) -> str:
+        return await hashing_pool.run(generate_hashed_password, hash_salt, new_password)
+
+    async def async_generate_salt_and_hashed_password(self, new_password: str) -> tuple[str, str]:
+        """
+        Both hashes of a new password in one round trip to the hashing pool
+
+        Returns:
+        tuple[str, str]: the salt and the hashed password
+        """
+        return await hashing_pool.run(generate_salt_and_hashed_password, new_password)
+
+    async def async_is_password_authenticated(self, hash_salt: str, password: str, hashed_password: str) -> bool:
+        return await hashing_pool.run(is_password_authenticated, hash_salt, password, hashed_password)
 
 
 def get_pwd_generator() -> PasswordGenerator:
@@ -0,0 +1,137 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+from src.utilities.metrics.metrics_kit import Counter, Gauge, metrics_kit
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    A thread safe LRU cache bounded by number of entries and/or bytes, with an optional TTL
+
+    The counters (hits, misses, evictions, expirations) and the current size are kept per instance, and
+    also added to the metrics of `metrics_kit` under `name`, so they are exposed through the metrics API
+    summed over the caches sharing the name.
+
+    Args:
+    name (str): prefix of the metrics of this cache
+    max_entries (int | None): maximum number of entries, None for unbounded
+    max_bytes (int | None): maximum sum of `sizeof(key, value)`, None for unbounded
+    ttl (float | None): seconds an entry stays valid after it was written, None to never expire
+    sizeof (Callable): the size in bytes of an entry
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        ttl: float | None = None,
+        sizeof: Callable[[Hashable, Any], int] = lambda key, value: sys.getsizeof(key) + sys.getsizeof(value),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof
+        self._clock = clock
+        # key -> (value, size, expires_at)
+        self._entries: OrderedDict[Hashable, tuple[Any, int, float | None]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = Counter(f"{name}_hits", f"Lookups served by the {name}")
+        self.misses = Counter(f"{name}_misses", f"Lookups not found in the {name}")
+        self.evictions = Counter(f"{name}_evictions", f"Entries evicted from the {name} to stay in bounds")
+        self.expirations = Counter(f"{name}_expirations", f"Entries of the {name} dropped by TTL")
+        self.size_bytes = Gauge(f"{name}_bytes", f"Bytes held by the {name}")
+        self._published = {
+            metric.name: metrics_kit.counter(metric.name, metric.description)
+            for metric in (self.hits, self.misses, self.evictions, self.expirations)
+        }
+        self._published_bytes = metrics_kit.gauge(self.size_bytes.name, self.size_bytes.description)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self._count(self.misses)
+                return default
+            value, _, expires_at = entry
+            if expires_at is not None and expires_at <= self._clock():
+                self._remove(key)
+                self._count(self.expirations)
+                self._count(self.misses)
+                return default
+            self._entries.move_to_end(key)
+            self._count(self.hits)
+            return value
+
+    def put(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """
+        Insert or replace an entry, `ttl` overrides the default TTL of the cache for this entry
+        """
+        size = self._sizeof(key, value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = self._clock() + ttl if ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._resize(size)
+            while (self.max_entries is not None and len(self._entries) > self.max_entries) or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self._count(self.evictions)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._resize(-self._bytes)
+
+    def _remove(self, key: Hashable) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._resize(-size)
+
+    def _resize(self, delta: int) -> None:
+        self._bytes += delta
+        self.size_bytes.set(self._bytes)
+        self._published_bytes.inc(delta)
+
+    def _count(self, counter: Counter) -> None:
+        counter.inc()
+        self._published[counter.name].inc()
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
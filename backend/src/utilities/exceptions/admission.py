@@ -0,0 +1,13 @@
+class AdmissionRejected(Exception):
+    """
+    Throw an exception when a generation is not admitted to the inference engine.
+
+    Args:
+    retry_after (int): seconds after which the request is likely to be admitted
+    overloaded (bool): True if the engine is overloaded, False if the account has too many requests queued
+    """
+
+    def __init__(self, retry_after: int, overloaded: bool):
+        super().__init__(f"Generation not admitted, retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.overloaded = overloaded
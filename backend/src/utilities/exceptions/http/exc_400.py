@@ -12,6 +12,7 @@ from src.utilities.messages.exceptions.http.exc_details import (
     http_400_signup_credentials_details,
     http_400_username_details,
     http_400_file_name_details,
+    http_400_cursor_details,
 )
 
 
@@ -56,3 +57,10 @@ async def http_400_exc_bad_file_name_request(file_name: str) -> Exception:
         status_code=fastapi.status.HTTP_400_BAD_REQUEST,
         detail=http_400_file_name_details(),
     )
+
+
+async def http_400_exc_bad_cursor_request(cursor: str) -> Exception:
+    return fastapi.HTTPException(
+        status_code=fastapi.status.HTTP_400_BAD_REQUEST,
+        detail=http_400_cursor_details(cursor=cursor),
+    )
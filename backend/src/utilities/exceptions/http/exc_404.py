@@ -5,6 +5,8 @@ The HTTP 404 Not Found response status code indicates that the server cannot fin
 import fastapi
 
 from src.utilities.messages.exceptions.http.exc_details import (
+    http_404_dataset_name_details,
+    http_404_job_id_details,
     http_404_email_details,
     http_404_id_details,
     http_404_username_details,
@@ -38,3 +40,17 @@ async def http_404_exc_uuid_not_found_request(uuid: str) -> Exception:
         status_code=fastapi.status.HTTP_404_NOT_FOUND,
         detail=http_404_uuid_details(uuid=uuid),
     )
+
+
+async def http_404_exc_dataset_name_not_found_request(dataset_name: str) -> Exception:
+    return fastapi.HTTPException(
+        status_code=fastapi.status.HTTP_404_NOT_FOUND,
+        detail=http_404_dataset_name_details(dataset_name=dataset_name),
+    )
+
+
+async def http_404_exc_job_id_not_found_request(job_id: str) -> Exception:
+    return fastapi.HTTPException(
+        status_code=fastapi.status.HTTP_404_NOT_FOUND,
+        detail=http_404_job_id_details(job_id=job_id),
+    )
@@ -0,0 +1,16 @@
+"""
+The HyperText Transfer Protocol (HTTP) 429 Too Many Requests response status code indicates the user
+has sent too many requests in a given amount of time ("rate limiting").
+"""
+
+import fastapi
+
+from src.utilities.messages.exceptions.http.exc_details import http_429_generations_details
+
+
+async def http_429_exc_too_many_generations_request(retry_after: int) -> Exception:
+    return fastapi.HTTPException(
+        status_code=fastapi.status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=http_429_generations_details(),
+        headers={"Retry-After": str(retry_after)},
+    )
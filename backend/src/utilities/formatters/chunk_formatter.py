@@ -0,0 +1,44 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+class ChunkFormatter:
+    """
+    This class is used to split raw text into chunks small enough to be embedded
+    """
+
+    def __init__(self):
+        raise NotImplementedError("This class is not meant to be instantiated")
+
+    @classmethod
+    def split_text(cls, text: str, chunk_size: int, overlap: int = 0) -> list[str]:
+        """
+        Split the text into windows of `chunk_size` words, two neighbouring windows share `overlap` words so
+        a sentence cut at a boundary is still found in one piece
+
+        Args:
+        text (str): the raw text
+        chunk_size (int): number of words per chunk
+        overlap (int): number of words shared by two neighbouring chunks
+
+        Returns:
+        list[str]: the chunks, empty if the text has no words
+        """
+        words = text.split()
+        if not words:
+            return []
+        step = max(1, chunk_size - overlap)
+        # The last window already holds the tail once fewer than `overlap` new words are left
+        return [" ".join(words[start : start + chunk_size]) for start in range(0, max(1, len(words) - overlap), step)]
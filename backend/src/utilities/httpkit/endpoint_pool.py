@@ -0,0 +1,229 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import contextlib
+import hashlib
+import random
+import time
+from collections.abc import Callable, Iterator
+
+import httpx
+import loguru
+
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+
+class Endpoint:
+    """
+    A replica of an engine, e.g. `http://llamacpp:8080`
+
+    Args:
+    base_url (str): the URL the paths of the engine are appended to
+    """
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.outstanding = 0
+        # Failed requests in a row
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def __repr__(self) -> str:
+        return f"Endpoint({self.base_url}, outstanding={self.outstanding}, failures={self.failures})"
+
+    def url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+
+def parse_endpoints(endpoints: str, default: str) -> list[str]:
+    """
+    Parse a comma separated list of host:port or URLs into base URLs
+
+    Args:
+    endpoints (str): the configured endpoints, may be empty
+    default (str): the host:port used if no endpoint is configured
+
+    Returns:
+    list[str]: base URLs without trailing slash
+    """
+    hosts = [host.strip() for host in endpoints.split(",") if host.strip()] or [default]
+    return [(host if "://" in host else f"http://{host}").rstrip("/") for host in hosts]
+
+
+class EndpointPool:
+    """
+    Spread the requests over the replicas of an engine
+
+    A request goes to the available endpoint with the least requests in flight. A request with a key, e.g. a
+    chat session, goes to the endpoint the key hashes to (rendezvous hashing), as long as this endpoint has
+    at most `sticky_slack` more requests in flight than the least busy one, so a session keeps hitting the
+    prompt cache of its replica.
+
+    An endpoint failing `max_failures` requests in a row (connection error or 5xx), or its health probe, is
+    ejected for `eject_seconds`. Once back, or once its probe succeeds again, a single failure ejects it
+    again until a request succeeds. If every endpoint is ejected, they are all used anyway.
+
+    Args:
+    name (str): prefix of the metrics of this pool
+    base_urls (list[str]): the base URLs of the endpoints
+    max_failures (int): failed requests in a row ejecting an endpoint
+    eject_seconds (float): seconds an ejected endpoint is left out
+    sticky_slack (int): extra requests in flight a keyed request accepts to stay on its endpoint
+    health_path (str): path of the health check of the engine
+    clock (Callable): the time in seconds
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_urls: list[str],
+        max_failures: int = 3,
+        eject_seconds: float = 30.0,
+        sticky_slack: int = 2,
+        health_path: str = "/health",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.endpoints = [Endpoint(base_url) for base_url in base_urls]
+        self.max_failures = max(1, max_failures)
+        self.eject_seconds = eject_seconds
+        self.sticky_slack = sticky_slack
+        self.health_path = health_path
+        self._clock = clock
+        self._probe_task: asyncio.Task | None = None
+        self._ejections = metrics_kit.counter(f"{name}_ejections", f"Endpoints of the {name} ejected")
+        self._available = metrics_kit.gauge(f"{name}_available", f"Endpoints of the {name} not ejected")
+        self._available.set(len(self.endpoints))
+
+    def is_available(self, endpoint: Endpoint) -> bool:
+        return self._clock() >= endpoint.ejected_until
+
+    def pick(self, key: str | None = None) -> Endpoint:
+        """
+        Choose the endpoint of the next request
+
+        Args:
+        key (str | None): the key the request sticks to, None to use the least busy endpoint
+
+        Returns:
+        Endpoint: the endpoint, its `outstanding` is not counted yet
+        """
+        candidates = [endpoint for endpoint in self.endpoints if self.is_available(endpoint)] or self.endpoints
+        least_busy = min(candidates, key=lambda endpoint: (endpoint.outstanding, random.random()))
+        if key is None:
+            return least_busy
+        sticky = max(candidates, key=lambda endpoint: self._weight(key, endpoint))
+        return sticky if sticky.outstanding <= least_busy.outstanding + self.sticky_slack else least_busy
+
+    @contextlib.contextmanager
+    def use(self, key: str | None = None) -> Iterator[Endpoint]:
+        """
+        Pick an endpoint and count the request in flight until the block exits, a connection error or an
+        HTTP status error with a 5xx code raised in the block counts as a failure of the endpoint
+
+        Args:
+        key (str | None): the key the request sticks to, see `pick`
+
+        Returns:
+        Iterator[Endpoint]: the endpoint
+        """
+        endpoint = self.pick(key)
+        endpoint.outstanding += 1
+        try:
+            yield endpoint
+        except httpx.TransportError:
+            self.record_failure(endpoint)
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                self.record_failure(endpoint)
+            raise
+        else:
+            self.record_success(endpoint)
+        finally:
+            endpoint.outstanding -= 1
+
+    def record_success(self, endpoint: Endpoint) -> None:
+        endpoint.failures = 0
+
+    def record_failure(self, endpoint: Endpoint) -> None:
+        endpoint.failures += 1
+        if endpoint.failures >= self.max_failures and self.is_available(endpoint):
+            self.eject(endpoint)
+
+    def eject(self, endpoint: Endpoint) -> None:
+        loguru.logger.warning(f"{self.name} --- Ejecting {endpoint.base_url} for {self.eject_seconds}s")
+        endpoint.failures = max(endpoint.failures, self.max_failures - 1)
+        endpoint.ejected_until = self._clock() + self.eject_seconds
+        self._ejections.inc()
+        self._update_available()
+
+    def reinstate(self, endpoint: Endpoint) -> None:
+        loguru.logger.info(f"{self.name} --- {endpoint.base_url} is back")
+        endpoint.ejected_until = 0.0
+        self._update_available()
+
+    async def probe(self, client: httpx.AsyncClient, timeout: float = 2.0) -> None:
+        """
+        Check the health of every endpoint once, an endpoint answering anything but 200 is ejected
+        """
+
+        async def probe_endpoint(endpoint: Endpoint) -> None:
+            try:
+                res = await client.get(endpoint.url(self.health_path), timeout=timeout)
+                healthy = res.status_code == 200
+            except httpx.HTTPError:
+                healthy = False
+            if healthy and not self.is_available(endpoint):
+                self.reinstate(endpoint)
+            elif not healthy and self.is_available(endpoint):
+                self.eject(endpoint)
+
+        await asyncio.gather(*[probe_endpoint(endpoint) for endpoint in self.endpoints])
+        self._update_available()
+
+    def start_probing(self, client: httpx.AsyncClient, interval: float) -> None:
+        """
+        Probe the endpoints every `interval` seconds in the running event loop, a single endpoint is used
+        whatever its health so it is not probed
+        """
+        if self._probe_task is not None or len(self.endpoints) < 2:
+            return
+
+        async def loop() -> None:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.probe(client)
+                except Exception as e:
+                    loguru.logger.error(f"{self.name} --- Probe error: {e}")
+
+        self._probe_task = asyncio.get_running_loop().create_task(loop())
+
+    async def stop_probing(self) -> None:
+        if self._probe_task is None:
+            return
+        self._probe_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._probe_task
+        self._probe_task = None
+
+    def _update_available(self) -> None:
+        self._available.set(sum(self.is_available(endpoint) for endpoint in self.endpoints))
+
+    @staticmethod
+    def _weight(key: str, endpoint: Endpoint) -> int:
+        return int.from_bytes(hashlib.sha1(f"{key}|{endpoint.base_url}".encode()).digest()[:8], "big")
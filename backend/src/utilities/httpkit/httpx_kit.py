@@ -16,10 +16,13 @@
 
 import httpx
 
+from src.config.manager import settings
+from src.utilities.httpkit.instrumented_transport import InstrumentedTransport
+
 
 class HttpxKit:
     """
-    A class to initialize an async and sync client using httpx
+    A class to initialize the async clients of the upstream engines and a sync client using httpx
 
     We only create one client every time is efficient and easy to manage
 
@@ -27,37 +30,40 @@ class HttpxKit:
     """
 
     def __init__(self):
-        self.async_client = self.init_async_client()
         self.sync_client = self.init_sync_client()
+        # A connection pool per upstream, a burst of embeddings can't take the connections of the chat streams
+        self.inference_client = self.init_upstream_client("inference")
+        self.embedding_client = self.init_upstream_client("embedding")
 
-    def init_async_client(self) -> httpx.AsyncClient:
+    @staticmethod
+    def init_upstream_client(name: str) -> httpx.AsyncClient:
         """
-        Create async client by using Singleletton pattern
-
-        Replace the code below:
-
-        async with httpx.AsyncClient() as client:
-            try:
-                async with client.stream(
-                    "POST",
-                    InferenceHelper.instruct_infer_url(),
-                    headers={"Content-Type": "application/json"},
-                    json=data_with_context,
-                    # We disable all timeout and trying to fix streaming randomly cutting off
-                    timeout=httpx.Timeout(timeout=None),
-                ) as response:
-                    response.raise_for_status()
-                    async for chunk in response.aiter_text():
-                        yield chunk
-            except httpx.ReadError as e:
-                loguru.logger.error(f"An error occurred while requesting {e.request.url!r}.")
-            except httpx.HTTPStatusError as e:
-                loguru.logger.error(f"Error response {e.response.status_code} while requesting {e.request.url!r}.")
+        Create an async client with its own connection pool for an upstream engine, the metrics of the pool
+        are registered under `{name}_`
+
+        The read timeout bounds the silence between two chunks rather than the whole stream, so a stalled
+        engine is given up on while a long answer keeps streaming.
+
+        Args:
+        name (str): the upstream, e.g. "inference"
 
         Returns:
         httpx.AsyncClient: An async client
         """
-        return httpx.AsyncClient()
+        limits = httpx.Limits(
+            max_connections=settings.HTTPX_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTPX_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTPX_KEEPALIVE_EXPIRY_SEC,
+        )
+        timeout = httpx.Timeout(
+            connect=settings.HTTPX_CONNECT_TIMEOUT_SEC,
+            read=settings.HTTPX_READ_TIMEOUT_SEC,
+            write=settings.HTTPX_WRITE_TIMEOUT_SEC,
+            pool=settings.HTTPX_POOL_TIMEOUT_SEC,
+        )
+        # llama.cpp only speaks HTTP/1.1
+        transport = InstrumentedTransport(name, httpx.AsyncHTTPTransport(limits=limits))
+        return httpx.AsyncClient(timeout=timeout, transport=transport)
 
     def init_sync_client(self):
         """
@@ -70,10 +76,12 @@ class HttpxKit:
 
     async def teardown_async_client(self) -> bool:
         """
-        Close the async client
+        Close the async clients of the upstream engines
         """
-        await self.async_client.aclose()
-        return self.async_client.is_closed
+        clients = [self.inference_client, self.embedding_client]
+        for client in clients:
+            await client.aclose()
+        return all(client.is_closed for client in clients)
 
     def teardown_sync_client(self) -> bool:
         """
@@ -0,0 +1,121 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import typing
+
+import httpx
+
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """
+    The body of a response, `on_close` is called once when it is closed, read to the end or not
+    """
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: typing.Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_close()
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """
+    Measure the connection pool of a transport
+
+    A request is waiting until the pool hands it a connection, a new one or a kept-alive one, and then in use
+    until its response is closed. The trace extension of httpcore tells when the connection was handed out
+    and how long it took to connect.
+
+    Args:
+    name (str): prefix of the metrics of this transport, e.g. the upstream it sends to
+    transport (httpx.AsyncHTTPTransport): the transport holding the connection pool
+    """
+
+    def __init__(self, name: str, transport: httpx.AsyncHTTPTransport):
+        self.name = name
+        self._transport = transport
+        self._waiting = metrics_kit.gauge(f"{name}_requests_waiting", f"Requests waiting for a {name} connection")
+        self._in_use = metrics_kit.gauge(f"{name}_connections_in_use", f"Requests holding a {name} connection")
+        self._pool_wait = metrics_kit.histogram(
+            f"{name}_pool_wait_seconds", LATENCY_BUCKETS, f"Time until a {name} connection was handed out"
+        )
+        self._connect = metrics_kit.histogram(
+            f"{name}_connect_seconds", LATENCY_BUCKETS, f"Time to open a new {name} connection"
+        )
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        connect_started = None
+        state = {"acquired": False, "released": False}
+        self._waiting.inc()
+
+        def acquire() -> None:
+            if not state["acquired"]:
+                state["acquired"] = True
+                self._waiting.dec()
+                self._in_use.inc()
+                self._pool_wait.observe(time.perf_counter() - started)
+
+        def release() -> None:
+            if state["released"]:
+                return
+            state["released"] = True
+            if state["acquired"]:
+                self._in_use.dec()
+            else:
+                self._waiting.dec()
+
+        user_trace = request.extensions.get("trace")
+
+        async def trace(event_name: str, info: dict) -> None:
+            nonlocal connect_started
+            if event_name == "connection.connect_tcp.started":
+                acquire()
+                connect_started = time.perf_counter()
+            elif event_name == "connection.connect_tcp.complete" and connect_started is not None:
+                self._connect.observe(time.perf_counter() - connect_started)
+            elif event_name.endswith(".send_request_headers.started"):
+                acquire()
+            if user_trace is not None:
+                await user_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
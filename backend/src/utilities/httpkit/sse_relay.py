@@ -0,0 +1,110 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import contextlib
+from collections.abc import AsyncGenerator, AsyncIterator
+
+# The server-sent events are separated by a blank line
+FRAME_SEPARATOR = b"\n\n"
+
+
+async def iter_frames(chunks: AsyncIterator[bytes]) -> AsyncGenerator[bytes, None]:
+    """
+    Regroup the chunks of an SSE byte stream at the frame boundaries, the bytes are relayed as they are
+
+    Args:
+    chunks (AsyncIterator[bytes]): the body of the upstream response, e.g. `response.aiter_bytes()`
+
+    Returns:
+    AsyncGenerator[bytes, None]: one or more whole frames per chunk, the incomplete tail of the stream last
+    """
+    tail = b""
+    async for chunk in chunks:
+        # The engine flushes every token as a whole frame, so most chunks go out as they are
+        if not tail and chunk.endswith(FRAME_SEPARATOR):
+            yield chunk
+            continue
+        data = tail + chunk if tail else chunk
+        end = data.rfind(FRAME_SEPARATOR)
+        if end < 0:
+            tail = data
+            continue
+        end += len(FRAME_SEPARATOR)
+        tail = data[end:]
+        yield data[:end]
+    if tail:
+        yield tail
+
+
+async def relay_sse(chunks: AsyncIterator[bytes], max_buffer: int = 0) -> AsyncGenerator[bytes, None]:
+    """
+    Relay an SSE byte stream frame by frame without decoding it
+
+    With `max_buffer`, the upstream is read ahead while the client is still busy with the previous chunk, and
+    the frames received meanwhile go out as a single chunk, one write for the client instead of one per
+    token. The read ahead stops once `max_buffer` bytes are waiting, until the client catches up.
+
+    Args:
+    chunks (AsyncIterator[bytes]): the body of the upstream response, e.g. `response.aiter_bytes()`
+    max_buffer (int): bytes of frames read ahead, 0 to relay every frame as soon as it is read
+
+    Returns:
+    AsyncGenerator[bytes, None]: whole frames
+    """
+    if max_buffer <= 0:
+        async for frames in iter_frames(chunks):
+            yield frames
+        return
+
+    buffer = bytearray()
+    readable = asyncio.Event()
+    writable = asyncio.Event()
+    writable.set()
+    outcome: dict[str, BaseException | None] = dict()
+
+    async def pump() -> None:
+        try:
+            async for frames in iter_frames(chunks):
+                await writable.wait()
+                buffer.extend(frames)
+                if len(buffer) >= max_buffer:
+                    writable.clear()
+                readable.set()
+            outcome["error"] = None
+        except Exception as e:
+            outcome["error"] = e
+        finally:
+            readable.set()
+
+    task = asyncio.get_running_loop().create_task(pump())
+    try:
+        while True:
+            if not buffer and "error" not in outcome:
+                await readable.wait()
+                readable.clear()
+            if buffer:
+                frames = bytes(buffer)
+                buffer.clear()
+                writable.set()
+                yield frames
+            elif "error" in outcome:
+                if outcome["error"] is not None:
+                    raise outcome["error"]
+                return
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
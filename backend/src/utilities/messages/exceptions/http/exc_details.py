@@ -38,7 +38,27 @@ def http_404_email_details(email: str) -> str:
     return f"Either the account with email `{email}` doesn't exist, has been deleted, or you are not authorized!"
 
 
+def http_404_dataset_name_details(dataset_name: str) -> str:
+    return f"Either the dataset `{dataset_name}` doesn't exist, has not been loaded yet, or you are not authorized!"
+
+
+def http_404_job_id_details(job_id: str) -> str:
+    return f"Either the ingestion job with id `{job_id}` doesn't exist, has been deleted, or you are not authorized!"
+
+
 def http_400_file_name_details() -> str:
     return (
         "The file_name already exists. Please refrain from uploading it again, or try uploading with a different name!"
     )
+
+
+def http_400_cursor_details(cursor: str) -> str:
+    return f"The cursor `{cursor}` is malformed! Use the cursor returned with the previous page."
+
+
+def http_429_generations_details() -> str:
+    return "You have too many chats waiting for an answer! Wait for them to finish before asking again."
+
+
+def http_503_inference_overloaded_details() -> str:
+    return "The inference engine is overloaded! Please try again later."
@@ -0,0 +1,160 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import bisect
+import threading
+
+
+class Counter:
+    """
+    A monotonically increasing counter
+    """
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int | float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self) -> int | float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "counter", "description": self.description, "value": self._value}
+
+
+class Gauge:
+    """
+    A value that can go up and down, e.g. queue depth
+    """
+
+    def __init__(self, name: str, description: str = ""):
+        self.name = name
+        self.description = description
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value: int | float) -> None:
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount: int | float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: int | float = 1) -> None:
+        with self._lock:
+            self._value -= amount
+
+    @property
+    def value(self) -> int | float:
+        return self._value
+
+    def snapshot(self) -> dict:
+        return {"type": "gauge", "description": self.description, "value": self._value}
+
+
+class Histogram:
+    """
+    A fixed bucket histogram, the buckets are inclusive upper bounds and reported cumulatively
+    (same layout as Prometheus), so they can be scraped and compared between releases
+    """
+
+    def __init__(self, name: str, buckets: tuple[float, ...], description: str = ""):
+        self.name = name
+        self.description = description
+        self.buckets: tuple[float, ...] = tuple(sorted(buckets))
+        self._counts: list[int] = [0] * (len(self.buckets) + 1)
+        self._sum: float = 0.0
+        self._count: int = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def sum(self) -> float:
+        return self._sum
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative: dict[str, int] = dict()
+        running = 0
+        for bound, bucket_count in zip(self.buckets, counts):
+            running += bucket_count
+            cumulative[str(bound)] = running
+        cumulative["+Inf"] = running + counts[-1]
+        return {
+            "type": "histogram",
+            "description": self.description,
+            "buckets": cumulative,
+            "sum": total,
+            "count": count,
+        }
+
+
+class MetricsKit:
+    """
+    A process wide registry of metrics
+
+    Every metric is created on first use and shared afterwards, so modules can declare the metrics they
+    need at import time without caring about the order of imports.
+    """
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Gauge | Histogram] = dict()
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory, kind: type):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = factory()
+                self._metrics[name] = metric
+        if not isinstance(metric, kind):
+            raise TypeError(f"Metric `{name}` is already registered as {type(metric).__name__}")
+        return metric
+
+    def counter(self, name: str, description: str = "") -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, description), Counter)
+
+    def gauge(self, name: str, description: str = "") -> Gauge:
+        return self._get_or_create(name, lambda: Gauge(name, description), Gauge)
+
+    def histogram(self, name: str, buckets: tuple[float, ...], description: str = "") -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, buckets, description), Histogram)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            metrics = dict(self._metrics)
+        return {name: metric.snapshot() for name, metric in sorted(metrics.items())}
+
+
+metrics_kit = MetricsKit()
@@ -0,0 +1,65 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+import unittest
+
+import loguru
+from src.repository.admission_eng import AdmissionController
+
+GENERATION_SECONDS = 0.05
+HEAVY_GENERATIONS = 8
+SLOTS = 2
+
+
+class TestAdmissionFairness(unittest.IsolatedAsyncioTestCase):
+    """
+    Benchmark: time a light user waits for an answer while a heavy user has a burst of generations queued
+    """
+
+    async def light_wait(self, heavy_account: str) -> float:
+        """
+        The heavy generations are queued under `heavy_account`, the light one under "light", passing "light"
+        queues all of them in one FIFO queue
+        """
+        controller = AdmissionController(
+            max_in_flight=SLOTS, max_queued=64, max_queued_per_account=HEAVY_GENERATIONS, queue_timeout=30
+        )
+
+        async def generate(account_id: str) -> float:
+            started = time.perf_counter()
+            permit = await controller.acquire(account_id)
+            waited = time.perf_counter() - started
+            await asyncio.sleep(GENERATION_SECONDS)
+            permit.release()
+            return waited
+
+        heavy = [asyncio.create_task(generate(heavy_account)) for _ in range(HEAVY_GENERATIONS)]
+        await asyncio.sleep(0)
+        waited = await generate("light")
+        await asyncio.gather(*heavy)
+        return waited
+
+    async def test_light_user_is_not_starved(self):
+        fifo = await self.light_wait("light")
+        fair = await self.light_wait("heavy")
+        loguru.logger.info(
+            f"Benchmark --- light user waited {fifo * 1000:.0f}ms behind {HEAVY_GENERATIONS} generations in one "
+            f"queue, {fair * 1000:.0f}ms with a queue per account"
+        )
+        # Only the generations already running are ahead of the light user
+        self.assertLess(fair, 2 * GENERATION_SECONDS)
+        self.assertGreater(fifo, (HEAVY_GENERATIONS / SLOTS - 1) * GENERATION_SECONDS)
@@ -0,0 +1,74 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import statistics
+import tempfile
+import time
+import unittest
+
+import loguru
+from src.models.meta import ChatHistory
+from src.models.schemas.chat import Chats
+from src.repository.crud.chat import ChatHistoryCRUDRepository
+from src.repository.meta_database import MetaDBHelper
+
+NUM_SAVES = 300
+NUM_READS = 50
+
+
+class TestChatHistoryCompactionBenchmark(unittest.TestCase):
+    """
+    Benchmark: latency of reading a session history from a `chat_history` table made of one small fragment
+    per `/chat/save` call, before and after the background compaction
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.meta_db = MetaDBHelper(uri=cls.tmp_dir.name)
+        cls.meta_db.create_table("chat_history", schema=ChatHistory)
+        chat_repo = ChatHistoryCRUDRepository(meta_db=cls.meta_db)
+        loguru.logger.disable("src")
+        for i in range(NUM_SAVES):
+            chat_repo.load_create_chat_history(
+                f"uuid-{i % 100}", [Chats(role="user", message=f"q{i}"), Chats(role="assistant", message=f"a{i}")]
+            )
+        loguru.logger.enable("src")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.meta_db.dispose()
+        cls.tmp_dir.cleanup()
+
+    def measure(self) -> float:
+        latencies: list[float] = list()
+        loguru.logger.disable("src")
+        for i in range(NUM_READS):
+            start = time.perf_counter()
+            ChatHistoryCRUDRepository(meta_db=self.meta_db).read_chat_history_by_session_uuid(f"uuid-{i % 100}")
+            latencies.append(time.perf_counter() - start)
+        loguru.logger.enable("src")
+        return statistics.median(latencies)
+
+    def test_compaction_speeds_up_reads(self):
+        fragments = len(self.meta_db.open_table("chat_history").to_lance().get_fragments())
+        before = self.measure()
+        self.assertTrue(self.meta_db.compact_table("chat_history"))
+        after = self.measure()
+        loguru.logger.info(
+            f"Benchmark --- chat history read, {fragments} fragments median {before * 1000:.2f}ms, "
+            f"compacted median {after * 1000:.2f}ms"
+        )
+        self.assertLess(after, before)
@@ -0,0 +1,102 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import time
+import unittest
+from unittest import mock
+
+import httpx
+import loguru
+from src.repository.embedding_eng import EmbeddingBatcher
+from src.repository.rag import chat as rag_chat
+from src.repository.rag.chat import RAGChatModelRepository
+
+# Time a single (blocking) vector search takes, and the interval between two streamed tokens
+SEARCH_SECONDS = 0.05
+TOKEN_INTERVAL_SECONDS = 0.005
+CONCURRENT_SEARCHES = 20
+TOKENS_PER_STREAM = 60
+
+
+async def completion_stream():
+    for _ in range(TOKENS_PER_STREAM):
+        await asyncio.sleep(TOKEN_INTERVAL_SECONDS)
+        yield b'data: {"content":" token","stop":false}\n\n'
+
+
+def upstream(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/embedding":
+        contents = json.loads(request.content)["content"]
+        return httpx.Response(200, json={"results": [{"embedding": [0.0] * 4} for _ in contents]})
+    if request.url.path == "/tokenize":
+        return httpx.Response(200, json={"tokens": list(range(len(json.loads(request.content)["content"].split())))})
+    return httpx.Response(200, content=completion_stream())
+
+
+def blocking_search(data, n_results, table_name=None):
+    time.sleep(SEARCH_SECONDS)
+    return [{"context": "context", "distance": 0.0}]
+
+
+class TestChatSearchConcurrency(unittest.IsolatedAsyncioTestCase):
+    """
+    Regression benchmark: `/chat` streams must keep flowing while `/chat/search` requests are in flight
+    """
+
+    async def asyncSetUp(self):
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(upstream))
+        self.patches = [
+            mock.patch.object(rag_chat.httpx_kit, "inference_client", self.client),
+            mock.patch.object(rag_chat, "embedding_batcher", EmbeddingBatcher(client=self.client)),
+            mock.patch.object(rag_chat.vector_db, "search", blocking_search),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        await self.client.aclose()
+
+    async def stream_gaps(self) -> list[float]:
+        """
+        Consume one chat stream and return the gaps between two chunks
+        """
+        gaps: list[float] = list()
+        last = time.perf_counter()
+        async for _ in RAGChatModelRepository().inference(session_uuid="uuid", input_msg="hello"):
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+        return gaps
+
+    async def test_streams_are_not_stalled_by_search(self):
+        repo = RAGChatModelRepository()
+        baseline = await self.stream_gaps()
+        gaps, *contexts = await asyncio.gather(
+            self.stream_gaps(),
+            *[repo.search_context(input_msg=f"q{i}", collection_name="aisuko/test") for i in range(CONCURRENT_SEARCHES)],
+        )
+        loguru.logger.info(
+            f"Benchmark --- max token gap {max(baseline) * 1000:.1f}ms alone, "
+            f"{max(gaps) * 1000:.1f}ms with {CONCURRENT_SEARCHES} searches in flight"
+        )
+        self.assertEqual(contexts, ["context"] * CONCURRENT_SEARCHES)
+        # The batched embeddings of all searches resolve together, so searches blocking the event loop would run
+        # back to back and stall the stream for CONCURRENT_SEARCHES * SEARCH_SECONDS. Twice SEARCH_SECONDS leaves
+        # room for a scheduling hiccup of a loaded machine and still fails on two blocking searches in a row
+        self.assertLess(max(gaps), 2 * SEARCH_SECONDS)
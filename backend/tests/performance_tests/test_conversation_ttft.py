@@ -0,0 +1,139 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import httpx
+import loguru
+from src.models.meta import ChatHistory
+from src.models.schemas.chat import Chats
+from src.repository.crud.chat import ChatHistoryCRUDRepository
+from src.repository.meta_database import MetaDBHelper
+from src.repository.rag import chat as rag_chat
+from src.repository.rag import conversation
+from src.repository.rag.chat import RAGChatModelRepository
+from src.repository.rag.conversation import ConversationWindow
+from src.repository.tokenizer_eng import TokenCounter
+
+# Prompt processing time of one token that is not in the prompt cache of the engine
+PREFILL_SECONDS_PER_TOKEN = 0.0002
+NUM_TURNS = 24
+WINDOW_TOKENS = 800
+QUESTION_WORDS = 20
+ANSWER_WORDS = 60
+
+
+class PromptCachingEngine:
+    """
+    A single slot llama.cpp lookalike: the prompt is only processed from the first token that differs from
+    the previous prompt, one token per word
+    """
+
+    def __init__(self):
+        self.cached: list[str] = list()
+        self.uncached_tokens: list[int] = list()
+
+    def reused(self, tokens: list[str]) -> int:
+        common = 0
+        for cached, token in zip(self.cached, tokens):
+            if cached != token:
+                break
+            common += 1
+        return common
+
+    async def stream(self, uncached: int):
+        await asyncio.sleep(uncached * PREFILL_SECONDS_PER_TOKEN)
+        yield b'data: {"content":" answer","stop":true}\n\n'
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        if request.url.path == "/tokenize":
+            return httpx.Response(200, json={"tokens": [0] * len(body["content"].split())})
+        tokens = body["prompt"].split()
+        uncached = len(tokens) - self.reused(tokens) if body["cache_prompt"] else len(tokens)
+        self.cached = tokens
+        self.uncached_tokens.append(uncached)
+        return httpx.Response(200, content=self.stream(uncached))
+
+
+class TestConversationTTFT(unittest.IsolatedAsyncioTestCase):
+    """
+    Benchmark: time to first token of the follow-up questions of a long conversation, with a window of turns
+    that slides by one turn per question against one that keeps its start until it overflows
+    """
+
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.meta_db = MetaDBHelper(uri=self.tmp_dir.name)
+        self.meta_db.create_table("chat_history", schema=ChatHistory)
+
+    async def asyncTearDown(self):
+        self.meta_db.dispose()
+        self.tmp_dir.cleanup()
+
+    async def converse(self, session_uuid: str, window: ConversationWindow) -> tuple[list[float], list[int]]:
+        """
+        Ask NUM_TURNS questions in one session, return the time to first token and the uncached prompt tokens
+        """
+        engine = PromptCachingEngine()
+        client = httpx.AsyncClient(transport=httpx.MockTransport(engine))
+        patches = [
+            mock.patch.object(rag_chat.httpx_kit, "inference_client", client),
+            mock.patch.object(rag_chat, "token_counter", TokenCounter(max_entries=1024, client=client)),
+            mock.patch.object(conversation, "token_counter", TokenCounter(max_entries=1024, client=client)),
+            mock.patch.object(rag_chat, "conversation_window", window),
+        ]
+        for patch in patches:
+            patch.start()
+        repo = RAGChatModelRepository(meta_db=self.meta_db)
+        chat_repo = ChatHistoryCRUDRepository(meta_db=self.meta_db)
+        ttfts: list[float] = list()
+        try:
+            for turn in range(NUM_TURNS):
+                question = " ".join([f"q{turn}"] * QUESTION_WORDS)
+                start = time.perf_counter()
+                async for _ in repo.inference(session_uuid=session_uuid, input_msg=question):
+                    ttfts.append(time.perf_counter() - start)
+                    break
+                chat_repo.load_create_chat_history(
+                    session_uuid,
+                    [Chats(role="user", message=question), Chats(role="assistant", message=f"a{turn} " * ANSWER_WORDS)],
+                )
+        finally:
+            for patch in patches:
+                patch.stop()
+            await client.aclose()
+        return ttfts, engine.uncached_tokens
+
+    async def test_follow_ups_reuse_the_prompt_cache(self):
+        sliding_ttfts, sliding_tokens = await self.converse("sliding", ConversationWindow(WINDOW_TOKENS, 1.0))
+        kept_ttfts, kept_tokens = await self.converse("kept", ConversationWindow(WINDOW_TOKENS, 0.5))
+        # The first turns fit either way, the windows only differ once the conversation overflows
+        follow_ups = slice(NUM_TURNS // 2, None)
+        loguru.logger.info(
+            f"Benchmark --- follow-up TTFT {statistics.mean(sliding_ttfts[follow_ups]) * 1000:.1f}ms with "
+            f"{statistics.mean(sliding_tokens[follow_ups]):.0f} uncached tokens sliding by one turn, "
+            f"{statistics.mean(kept_ttfts[follow_ups]) * 1000:.1f}ms with "
+            f"{statistics.mean(kept_tokens[follow_ups]):.0f} uncached tokens keeping the window start"
+        )
+        self.assertEqual(len(kept_ttfts), NUM_TURNS)
+        self.assertLess(sum(kept_tokens[follow_ups]) * 2, sum(sliding_tokens[follow_ups]))
+        self.assertLess(statistics.median(kept_ttfts[follow_ups]), statistics.median(sliding_ttfts[follow_ups]))
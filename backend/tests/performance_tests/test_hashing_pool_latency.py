@@ -0,0 +1,83 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import statistics
+import time
+import unittest
+
+import loguru
+from src.securities.hashing.hashing_pool import hashing_pool
+from src.securities.hashing.password import pwd_generator
+
+NUM_SIGNINS = 8
+TOKEN_INTERVAL = 0.01
+
+
+def p99(values: list[float]) -> float:
+    return statistics.quantiles(values, n=100)[98]
+
+
+class TestHashingPoolLatencyBenchmark(unittest.IsolatedAsyncioTestCase):
+    """
+    Benchmark: delay between two tokens of a chat stream while a storm of signins is verified on the event
+    loop (as before) and in the hashing pool
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.hash_salt = pwd_generator.generate_salt
+        cls.hashed_password = pwd_generator.generate_hashed_password(cls.hash_salt, "secret")
+
+    @classmethod
+    def tearDownClass(cls):
+        hashing_pool.shutdown()
+
+    async def stream(self, done: asyncio.Event) -> list[float]:
+        # A stream relaying a token every TOKEN_INTERVAL, the delays beyond that are caused by the others
+        delays: list[float] = list()
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(TOKEN_INTERVAL)
+            now = time.perf_counter()
+            delays.append(now - last - TOKEN_INTERVAL)
+            last = now
+        return delays
+
+    async def signin_on_loop(self) -> bool:
+        return pwd_generator.is_password_authenticated(self.hash_salt, "secret", self.hashed_password)
+
+    async def signin_in_pool(self) -> bool:
+        return await pwd_generator.async_is_password_authenticated(self.hash_salt, "secret", self.hashed_password)
+
+    async def measure(self, signin) -> list[float]:
+        done = asyncio.Event()
+        stream = asyncio.create_task(self.stream(done))
+        await asyncio.sleep(TOKEN_INTERVAL * 5)
+        results = await asyncio.gather(*[signin() for _ in range(NUM_SIGNINS)])
+        done.set()
+        self.assertTrue(all(results))
+        return await stream
+
+    async def test_stream_latency_during_signin_storm(self):
+        # Start the processes of the pool before measuring
+        await self.signin_in_pool()
+        on_loop = await self.measure(self.signin_on_loop)
+        in_pool = await self.measure(self.signin_in_pool)
+        loguru.logger.info(
+            f"Benchmark --- {NUM_SIGNINS} signins, token delay p99 {p99(on_loop) * 1000:.1f}ms hashing on the loop, "
+            f"{p99(in_pool) * 1000:.1f}ms in a pool of {hashing_pool.max_workers} processes"
+        )
+        self.assertLess(p99(in_pool), p99(on_loop) / 4)
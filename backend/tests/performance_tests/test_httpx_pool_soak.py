@@ -0,0 +1,111 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import time
+import unittest
+
+import loguru
+from src.utilities.httpkit.httpx_kit import HttpxKit
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+NUM_STREAMS = int(os.environ.get("KIRIN_SOAK_STREAMS", 10000))
+CONCURRENT_STREAMS = 50
+# One stream in ABANDON_EVERY is closed by the client before its end, like a user leaving the chat
+ABANDON_EVERY = 10
+FRAMES = 4
+
+
+async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    A keep-alive llama.cpp `/completion` stub streaming a few SSE frames in chunked encoding
+    """
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.lower().split(b"\r\n")
+            length = next((int(line.split(b":")[1]) for line in lines if line.startswith(b"content-length")), 0)
+            await reader.readexactly(length)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for i in range(FRAMES):
+                frame = b'data: {"content":" token","stop":%s}\n\n' % (b"true" if i == FRAMES - 1 else b"false")
+                writer.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+                await writer.drain()
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+def open_fds() -> int:
+    return len(os.listdir("/proc/self/fd"))
+
+
+class TestHttpxPoolSoak(unittest.IsolatedAsyncioTestCase):
+    """
+    Soak test: NUM_STREAMS completion streams through an upstream client of `HttpxKit`, some abandoned midway,
+    must not leak connections nor leave requests counted in the pool
+    """
+
+    async def asyncSetUp(self):
+        # The test case runs the loop in debug mode, which makes every stream about 5 times slower
+        asyncio.get_running_loop().set_debug(False)
+        self.server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/completion"
+        self.client = HttpxKit.init_upstream_client("soak")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def stream(self, i: int) -> int:
+        frames = 0
+        async with self.client.stream("POST", self.url, json={"prompt": "hello", "stream": True}) as response:
+            response.raise_for_status()
+            async for _ in response.aiter_lines():
+                frames += 1
+                if i % ABANDON_EVERY == 0:
+                    break
+        return frames
+
+    @unittest.skipUnless(os.path.isdir("/proc/self/fd"), "counts the open file descriptors of /proc")
+    async def test_no_connection_leak(self):
+        # Warm the pool up so the descriptors of its connections are counted in the baseline
+        await asyncio.gather(*[self.stream(1) for _ in range(CONCURRENT_STREAMS)])
+        baseline = open_fds()
+        connects = metrics_kit.histogram("soak_connect_seconds", ()).count
+        semaphore = asyncio.Semaphore(CONCURRENT_STREAMS)
+
+        async def bounded(i: int) -> int:
+            async with semaphore:
+                return await self.stream(i)
+
+        started = time.perf_counter()
+        frames = await asyncio.gather(*[bounded(i) for i in range(NUM_STREAMS)])
+        elapsed = time.perf_counter() - started
+        loguru.logger.info(
+            f"Benchmark --- {NUM_STREAMS} streams in {elapsed:.1f}s ({NUM_STREAMS / elapsed:.0f}/s), "
+            f"{metrics_kit.histogram('soak_connect_seconds', ()).count - connects} connections opened, "
+            f"{open_fds() - baseline} descriptors more"
+        )
+        self.assertEqual(len(frames), NUM_STREAMS)
+        self.assertEqual(metrics_kit.gauge("soak_connections_in_use").value, 0)
+        self.assertEqual(metrics_kit.gauge("soak_requests_waiting").value, 0)
+        # Each connection holds a descriptor in the client and one in the stub server
+        self.assertLessEqual(open_fds() - baseline, 2 * CONCURRENT_STREAMS)
@@ -0,0 +1,67 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+
+import loguru
+from fastapi import Request
+from fastapi.security import HTTPBearer
+from src.models.schemas.account import Account
+from src.securities.authorizations.jwt import jwt_generator, jwt_required
+
+NUM_CALLS = 5000
+
+
+class TestJWTAuthOverheadBenchmark(unittest.IsolatedAsyncioTestCase):
+    """
+    Benchmark: overhead of the auth dependency of every authenticated route, decoding the token on every
+    request (as before) and served from the cache of verified tokens
+    """
+
+    def setUp(self):
+        token = jwt_generator.generate_access_token(
+            Account(
+                id=7,
+                username="alice",
+                email="alice@example.com",
+                is_verified=True,
+                is_active=True,
+                is_logged_in=True,
+                created_at="2024-01-01 00:00:00",
+                updated_at="2024-01-01 00:00:00",
+            )
+        )
+        self.scope = {"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]}
+
+    async def test_auth_dependency_overhead(self):
+        start = time.perf_counter()
+        for _ in range(NUM_CALLS):
+            # A new scheme and a full decode per request
+            credentials = await HTTPBearer()(Request(self.scope))
+            jwt_generator.decode_token(credentials.credentials)
+        uncached = (time.perf_counter() - start) / NUM_CALLS
+
+        start = time.perf_counter()
+        for _ in range(NUM_CALLS):
+            jwt_account = await jwt_required(Request(self.scope))
+        cached = (time.perf_counter() - start) / NUM_CALLS
+
+        loguru.logger.info(
+            f"Benchmark --- auth dependency {uncached * 1e6:.1f}us per request decoding the token, "
+            f"{cached * 1e6:.1f}us from the cache"
+        )
+        self.assertEqual((jwt_account.username, jwt_account.account_id), ("alice", 7))
+        self.assertLess(cached, uncached)
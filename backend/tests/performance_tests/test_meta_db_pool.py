@@ -0,0 +1,93 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import statistics
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+import loguru
+from src.models.meta import Account, ChatHistory, Session
+from src.repository.crud.account import AccountCRUDRepository
+from src.repository.crud.chat import ChatHistoryCRUDRepository, SessionCRUDRepository
+from src.repository.meta_database import MetaDBHelper
+
+RPS = 200
+NUM_REQUESTS = 400
+
+
+class TestMetaDBPoolBenchmark(unittest.TestCase):
+    """
+    Benchmark: per-request overhead of the meta database for the three repositories of a `/chat` call at
+    200 RPS, with a connection per repository (as before) and with the shared pool
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        meta_db = MetaDBHelper(uri=cls.tmp_dir.name)
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        meta_db.create_table("account", schema=Account).add([{
+            "id": 1, "username": "user", "email": "user@example.com", "_hashed_password": "", "_hash_salt": "",
+            "is_verified": True, "is_active": True, "is_logged_in": True,
+            "created_at": current_time, "updated_at": current_time,
+        }])
+        meta_db.create_table("session", schema=Session).add([{
+            "session_uuid": "uuid", "account_id": 1, "name": "session", "session_type": "rag",
+            "dataset_name": "", "created_at": current_time,
+        }])
+        meta_db.create_table("chat_history", schema=ChatHistory).add([
+            {"session_uuid": "uuid", "seq": i, "role": "user", "message": f"message {i}", "created_at": current_time}
+            for i in range(20)
+        ])
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def measure(self, get_meta_db) -> list[float]:
+        latencies: list[float] = list()
+        start = time.perf_counter()
+        loguru.logger.disable("src")
+        try:
+            for i in range(NUM_REQUESTS):
+                # Paced at RPS, a request starts on its slot or as soon as the previous one is done
+                delay = start + i / RPS - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                request_start = time.perf_counter()
+                AccountCRUDRepository(meta_db=get_meta_db()).read_account_by_username("user")
+                SessionCRUDRepository(meta_db=get_meta_db()).read_sessions_by_uuid("uuid")
+                ChatHistoryCRUDRepository(meta_db=get_meta_db()).read_chat_history_by_session_uuid("uuid")
+                latencies.append(time.perf_counter() - request_start)
+        finally:
+            loguru.logger.enable("src")
+        return latencies
+
+    def test_pool_reduces_overhead(self):
+        pool = MetaDBHelper(uri=self.tmp_dir.name)
+        connect_per_repository = self.measure(lambda: MetaDBHelper(uri=self.tmp_dir.name))
+        shared_pool = self.measure(lambda: pool)
+
+        def describe(latencies: list[float]) -> str:
+            p95 = statistics.quantiles(latencies, n=20)[-1]
+            return f"median {statistics.median(latencies) * 1000:.2f}ms p95 {p95 * 1000:.2f}ms"
+
+        loguru.logger.info(
+            f"Benchmark --- meta database at {RPS} RPS, connect per repository {describe(connect_per_repository)}, "
+            f"shared pool {describe(shared_pool)}"
+        )
+        self.assertLess(statistics.median(shared_pool), statistics.median(connect_per_repository))
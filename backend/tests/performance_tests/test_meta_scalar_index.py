@@ -0,0 +1,79 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import statistics
+import tempfile
+import time
+import unittest
+import uuid
+from datetime import datetime
+
+import loguru
+import pyarrow as pa
+from src.models.meta import Session
+from src.repository.crud.chat import SessionCRUDRepository
+from src.repository.meta_database import MetaDBHelper
+
+# Below 100k sessions a scan is as fast as the index, the full run is KIRIN_BENCHMARK_SESSIONS=10000,100000,1000000
+SESSION_SIZES = [int(size) for size in os.environ.get("KIRIN_BENCHMARK_SESSIONS", "100000").split(",")]
+NUM_LOOKUPS = 50
+
+
+class TestMetaScalarIndexBenchmark(unittest.TestCase):
+    """
+    Benchmark: latency of a session lookup by uuid against the number of sessions, scanned and indexed
+    """
+
+    def measure(self, session_repo: SessionCRUDRepository, session_uuids: list[str]) -> float:
+        latencies: list[float] = list()
+        loguru.logger.disable("src")
+        for session_uuid in session_uuids:
+            start = time.perf_counter()
+            session_repo.read_sessions_by_uuid(session_uuid)
+            latencies.append(time.perf_counter() - start)
+        loguru.logger.enable("src")
+        return statistics.median(latencies)
+
+    def test_lookup_scaling(self):
+        for num_sessions in SESSION_SIZES:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                meta_db = MetaDBHelper(uri=tmp_dir)
+                session_uuids = [str(uuid.uuid4()) for _ in range(num_sessions)]
+                current_time = datetime.now().replace(microsecond=0)
+                meta_db.create_table("session", schema=Session).add(
+                    pa.table(
+                        {
+                            "session_uuid": session_uuids,
+                            "account_id": [i % 1000 for i in range(num_sessions)],
+                            "name": ["session"] * num_sessions,
+                            "session_type": ["rag" if i % 2 else "chat" for i in range(num_sessions)],
+                            "dataset_name": [""] * num_sessions,
+                            "created_at": [current_time] * num_sessions,
+                        },
+                        schema=Session,
+                    )
+                )
+                session_repo = SessionCRUDRepository(meta_db=meta_db)
+                lookups = session_uuids[:: max(1, num_sessions // NUM_LOOKUPS)][:NUM_LOOKUPS]
+                scanned = self.measure(session_repo, lookups)
+                meta_db.ensure_scalar_indexes()
+                indexed = self.measure(session_repo, lookups)
+                loguru.logger.info(
+                    f"Benchmark --- session lookup with {num_sessions} sessions, scan median {scanned * 1000:.2f}ms, "
+                    f"indexed median {indexed * 1000:.2f}ms"
+                )
+                meta_db.dispose()
+                self.assertLess(indexed, scanned)
@@ -0,0 +1,144 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import statistics
+import tempfile
+import time
+import unittest
+import uuid
+from collections import Counter
+from datetime import datetime
+
+import loguru
+import pyarrow as pa
+from src.models.meta import Session
+from src.models.schemas.chat import SessionUpdate
+from src.repository.crud.chat import SessionCRUDRepository
+from src.repository.meta_database import MetaDBHelper
+
+NUM_SESSIONS = 10000
+NUM_CALLS = 50
+TABLE_OPERATIONS = ("search", "add", "update", "delete", "merge_insert")
+
+
+class CountingTable:
+    """
+    Proxy of a LanceDB table counting the operations issued against it
+    """
+
+    def __init__(self, tbl):
+        self._tbl = tbl
+        self.operations: Counter = Counter()
+
+    def __getattr__(self, name: str):
+        if name in TABLE_OPERATIONS:
+            self.operations[name] += 1
+        return getattr(self._tbl, name)
+
+
+class TestSessionCRUDBenchmark(unittest.TestCase):
+    """
+    Benchmark: table operations and latency of each session repository method against an indexed table
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.meta_db = MetaDBHelper(uri=cls.tmp_dir.name)
+        cls.session_uuids = [str(uuid.uuid4()) for _ in range(NUM_SESSIONS)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.meta_db.dispose()
+        cls.tmp_dir.cleanup()
+
+    def reset_table(self) -> None:
+        current_time = datetime.now().replace(microsecond=0)
+        self.meta_db.create_table("session", schema=Session, mode="overwrite").add(
+            pa.table(
+                {
+                    "session_uuid": self.session_uuids,
+                    "account_id": [1] * NUM_SESSIONS,
+                    "name": ["session"] * NUM_SESSIONS,
+                    "session_type": ["chat"] * NUM_SESSIONS,
+                    "dataset_name": [""] * NUM_SESSIONS,
+                    "created_at": [current_time] * NUM_SESSIONS,
+                },
+                schema=Session,
+            )
+        )
+        self.meta_db.ensure_scalar_indexes()
+
+    def measure(self, name: str, call) -> dict[str, int]:
+        # Every method starts from the same freshly indexed table
+        self.reset_table()
+        session_repo = SessionCRUDRepository(meta_db=self.meta_db)
+        session_repo.tbl = CountingTable(session_repo.tbl)
+        latencies: list[float] = list()
+        loguru.logger.disable("src")
+        try:
+            for i in range(NUM_CALLS):
+                start = time.perf_counter()
+                call(session_repo, self.session_uuids[i])
+                latencies.append(time.perf_counter() - start)
+        finally:
+            loguru.logger.enable("src")
+        operations = {op: count // NUM_CALLS for op, count in session_repo.tbl.operations.items()}
+        loguru.logger.info(
+            f"Benchmark --- {name}: {sum(operations.values())} table operations per call {operations}, "
+            f"median {statistics.median(latencies) * 1000:.2f}ms"
+        )
+        return operations
+
+    def test_session_crud(self):
+        def update_with_reread(repo, uuid):
+            # Write then read back, as the session repository did before the upserts
+            repo.tbl.search().where(f"session_uuid = '{uuid}' AND account_id = 1", prefilter=True).limit(1).to_list()
+            repo.tbl.update(where=f"session_uuid = '{uuid}'", values={"name": "renamed"})
+            repo.tbl.update(where=f"session_uuid = '{uuid}'", values={"session_type": "rag"})
+            repo.tbl.search().where(f"session_uuid = '{uuid}'", prefilter=True).limit(1).to_list()
+
+        self.measure("update then read back", update_with_reread)
+        self.assertEqual(self.measure("create_session", lambda repo, _: repo.create_session(1, "new")), {"add": 1})
+        self.assertEqual(
+            self.measure("read_create_sessions_by_uuid (hit)", lambda repo, uuid: repo.read_create_sessions_by_uuid(
+                uuid, account_id=1, name="new"
+            )),
+            {"search": 1},
+        )
+        self.assertEqual(
+            self.measure("read_create_sessions_by_uuid (miss)", lambda repo, uuid: repo.read_create_sessions_by_uuid(
+                uuid, account_id=2, name="new"
+            )),
+            {"search": 1, "add": 1},
+        )
+        self.assertEqual(
+            self.measure("update_sessions_by_uuid", lambda repo, uuid: repo.update_sessions_by_uuid(
+                SessionUpdate(sessionUuid=uuid, name="renamed", session_type="rag"), account_id=1
+            )),
+            {"search": 1, "merge_insert": 1},
+        )
+        self.assertEqual(
+            self.measure("append_ds_name_to_session", lambda repo, uuid: repo.append_ds_name_to_session(
+                uuid, account_id=1, ds_name="ds"
+            )),
+            {"search": 1, "merge_insert": 1},
+        )
+        self.assertEqual(
+            self.measure("verify_session_by_account_id", lambda repo, uuid: repo.verify_session_by_account_id(
+                uuid, account_id=1
+            )),
+            {"search": 1},
+        )
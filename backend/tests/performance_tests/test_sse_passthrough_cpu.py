@@ -0,0 +1,174 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+import unittest
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+
+import httpx
+import loguru
+from src.repository.semantic_cache import CompletionRecorder
+from src.utilities.httpkit.httpx_kit import HttpxKit
+from src.utilities.httpkit.sse_relay import relay_sse
+
+CONCURRENT_STREAMS = 100
+TOKENS = 200
+ROUNDS = 3
+# Time between two tokens of the stub engine in the slow client benchmark
+TOKEN_INTERVAL = 0.005
+# Time the client takes to receive a chunk in the slow client benchmark
+CLIENT_WRITE_SECONDS = 0.05
+
+
+def token_frame(i: int, tokens: int) -> bytes:
+    stop = b'true,"id_slot":0,"tokens_evaluated":12' if i == tokens - 1 else b"false"
+    return b'data: {"content":" t\xc3\xa9","stop":%s}\n\n' % stop
+
+
+async def engine_body(tokens: int) -> AsyncIterator[bytes]:
+    """
+    The body of a llama.cpp `/completion` stream, one frame per token, interleaved with the other streams
+    """
+    for i in range(tokens):
+        yield token_frame(i, tokens)
+        await asyncio.sleep(0)
+
+
+async def text_relay(response: httpx.Response) -> AsyncGenerator[bytes, None]:
+    # Every chunk decoded, parsed and encoded again by the streaming response
+    recorder = CompletionRecorder()
+    async for chunk in response.aiter_text():
+        recorder.feed(chunk)
+        yield chunk.encode("utf-8")
+    assert recorder.stopped
+
+
+async def byte_relay(response: httpx.Response, max_buffer: int = 0) -> AsyncGenerator[bytes, None]:
+    recorder = CompletionRecorder(keep_content=False)
+    async for frames in relay_sse(response.aiter_bytes(), max_buffer):
+        recorder.feed(frames)
+        yield frames
+    assert recorder.stopped and recorder.final["id_slot"] == 0
+
+
+async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    A keep-alive llama.cpp `/completion` stub streaming one SSE frame per token in chunked encoding
+    """
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.lower().split(b"\r\n")
+            length = next((int(line.split(b":")[1]) for line in lines if line.startswith(b"content-length")), 0)
+            await reader.readexactly(length)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+            for i in range(TOKENS):
+                frame = token_frame(i, TOKENS)
+                writer.write(b"%x\r\n%s\r\n" % (len(frame), frame))
+                await writer.drain()
+                await asyncio.sleep(TOKEN_INTERVAL)
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def client(chunks: AsyncIterator[bytes], write_seconds: float = 0) -> tuple[int, int]:
+    writes = size = 0
+    async for chunk in chunks:
+        writes, size = writes + 1, size + len(chunk)
+        if write_seconds:
+            await asyncio.sleep(write_seconds)
+    return writes, size
+
+
+class TestSSEPassthroughCPU(unittest.IsolatedAsyncioTestCase):
+    """
+    CPU time per streamed token of the generation relay at CONCURRENT_STREAMS streams, decoding the engine
+    stream as text and parsing every frame against passing the bytes through
+    """
+
+    async def asyncSetUp(self):
+        # The test case runs the loop in debug mode, which adds its own overhead to every callback
+        asyncio.get_running_loop().set_debug(False)
+
+    async def run_streams(self, relay: Callable[[httpx.Response], AsyncGenerator[bytes, None]]) -> tuple[float, int]:
+        responses = [httpx.Response(200, content=engine_body(TOKENS)) for _ in range(CONCURRENT_STREAMS)]
+        started = time.process_time()
+        results = await asyncio.gather(*[client(relay(response)) for response in responses])
+        return time.process_time() - started, sum(size for _, size in results)
+
+    async def test_cpu_per_token(self):
+        num_tokens = CONCURRENT_STREAMS * TOKENS
+        # The engine stream and the scheduling of the streams alone
+        floor = min([(await self.run_streams(lambda response: response.aiter_raw()))[0] for _ in range(ROUNDS)])
+        text_runs, byte_runs = list(), list()
+        for _ in range(ROUNDS):
+            text_runs.append(await self.run_streams(text_relay))
+            byte_runs.append(await self.run_streams(byte_relay))
+        text_cpu, byte_cpu = min(cpu for cpu, _ in text_runs), min(cpu for cpu, _ in byte_runs)
+        loguru.logger.info(
+            f"Benchmark --- {CONCURRENT_STREAMS} streams of {TOKENS} tokens, relay CPU per token: "
+            f"text {(text_cpu - floor) / num_tokens * 1e6:.2f}us, "
+            f"byte passthrough {(byte_cpu - floor) / num_tokens * 1e6:.2f}us "
+            f"(engine stream and scheduling {floor / num_tokens * 1e6:.2f}us)"
+        )
+        self.assertEqual({size for _, size in text_runs + byte_runs}, {text_runs[0][1]})
+        self.assertLess(byte_cpu, text_cpu)
+
+
+class TestSSECoalescing(unittest.IsolatedAsyncioTestCase):
+    """
+    Writes to slow clients of CONCURRENT_STREAMS streams from an engine over HTTP, frame by frame against
+    coalesced, and how long the clients take to receive the whole answers
+    """
+
+    async def asyncSetUp(self):
+        asyncio.get_running_loop().set_debug(False)
+        self.server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/completion"
+        self.client = HttpxKit.init_upstream_client("sse_bench")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def stream(self, max_buffer: int) -> tuple[int, int]:
+        async with self.client.stream("POST", self.url, json={"prompt": "hello", "stream": True}) as response:
+            return await client(byte_relay(response, max_buffer), CLIENT_WRITE_SECONDS)
+
+    async def run_streams(self, max_buffer: int) -> tuple[float, int, int]:
+        started = time.perf_counter()
+        results = await asyncio.gather(*[self.stream(max_buffer) for _ in range(CONCURRENT_STREAMS)])
+        elapsed = time.perf_counter() - started
+        return elapsed, sum(writes for writes, _ in results), sum(size for _, size in results)
+
+    async def test_coalescing_slow_client(self):
+        num_tokens = CONCURRENT_STREAMS * TOKENS
+        frame_elapsed, frame_writes, frame_size = await self.run_streams(0)
+        coalesced_elapsed, coalesced_writes, coalesced_size = await self.run_streams(1 << 16)
+        loguru.logger.info(
+            f"Benchmark --- {num_tokens} tokens to slow clients: frame by frame {frame_writes} writes "
+            f"in {frame_elapsed:.1f}s, coalesced {coalesced_writes} writes in {coalesced_elapsed:.1f}s"
+        )
+        self.assertEqual(frame_size, coalesced_size)
+        self.assertEqual(frame_writes, num_tokens)
+        self.assertLess(coalesced_writes, frame_writes / 2)
+        # Frame by frame, a slow client falls behind the engine by a write per token
+        self.assertLess(coalesced_elapsed, frame_elapsed)
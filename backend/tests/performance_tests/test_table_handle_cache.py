@@ -0,0 +1,71 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import statistics
+import tempfile
+import time
+import unittest
+
+import lancedb
+import loguru
+from src.config.settings.const import DEFAULT_DIM
+from src.repository.vector_database import TableHandleCache
+
+NUM_ROWS = 2000
+NUM_QUERIES = 50
+
+
+class TestTableHandleCacheBenchmark(unittest.TestCase):
+    """
+    Microbenchmark: query latency with a table opened per query (cold) and with a cached handle (warm)
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.db = lancedb.connect(cls.tmp_dir.name)
+        rng = random.Random(0)
+        cls.db.create_table(
+            "ds",
+            data=[
+                {"vector": [rng.random() for _ in range(DEFAULT_DIM)], "context": f"context {i}"}
+                for i in range(NUM_ROWS)
+            ],
+        )
+        cls.queries = [[rng.random() for _ in range(DEFAULT_DIM)] for _ in range(NUM_QUERIES)]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def measure(self, open_table) -> list[float]:
+        latencies: list[float] = list()
+        for query in self.queries:
+            start = time.perf_counter()
+            open_table("ds").search(query).limit(1).select(["context"]).to_list()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    def test_cold_vs_warm(self):
+        cache = TableHandleCache(self.db, refresh_interval=1.0)
+        cache.open_table("ds")
+        cold = self.measure(self.db.open_table)
+        warm = self.measure(cache.open_table)
+        loguru.logger.info(
+            f"Benchmark --- median query latency {statistics.median(cold) * 1000:.2f}ms cold, "
+            f"{statistics.median(warm) * 1000:.2f}ms warm over {NUM_QUERIES} queries on {NUM_ROWS} rows"
+        )
+        self.assertLess(statistics.median(warm), statistics.median(cold))
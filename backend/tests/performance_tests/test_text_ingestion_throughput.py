@@ -0,0 +1,66 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import tempfile
+import time
+import unittest
+
+import loguru
+from src.repository.text_ingestion import TextIngestionPipeline
+from src.repository.vector_database import LanceHelper
+
+NUM_TEXTS = 2048
+BATCH_SIZE = 32
+# Time the embedding engine takes for one batch, concurrent batches are served in parallel
+EMBEDDING_SECONDS = 0.02
+
+
+class TestTextIngestionThroughput(unittest.IsolatedAsyncioTestCase):
+    """
+    Benchmark: chunks per second of the ingestion pipeline against the number of embedding requests in flight
+    """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lance_helper = LanceHelper(uri=self.tmp_dir.name, search_workers=1)
+
+    def tearDown(self):
+        self.lance_helper.shutdown()
+        self.tmp_dir.cleanup()
+
+    async def measure(self, concurrency: int) -> float:
+        async def embed(chunks: list[str]) -> list[list[float]]:
+            await asyncio.sleep(EMBEDDING_SECONDS)
+            return [[1.0, 0.0]] * len(chunks)
+
+        texts = iter([[f"text {i}" for i in range(start, start + 256)] for start in range(0, NUM_TEXTS, 256)])
+        pipeline = TextIngestionPipeline(
+            lance_helper=self.lance_helper, embedding_concurrency=concurrency, batch_size=BATCH_SIZE
+        )
+        start = time.perf_counter()
+        written = await pipeline.run(texts, f"ds_{concurrency}", embed)
+        elapsed = time.perf_counter() - start
+        self.assertEqual(written, NUM_TEXTS)
+        return written / elapsed
+
+    async def test_throughput_scales_with_concurrency(self):
+        serial = await self.measure(1)
+        parallel = await self.measure(4)
+        loguru.logger.info(
+            f"Benchmark --- text ingestion {serial:.0f} chunks/s with 1 embedding request in flight, "
+            f"{parallel:.0f} chunks/s with 4"
+        )
+        self.assertGreater(parallel, serial * 2)
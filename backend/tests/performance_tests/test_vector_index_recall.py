@@ -0,0 +1,91 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import statistics
+import tempfile
+import time
+import unittest
+
+import loguru
+import numpy as np
+from src.repository.vector_database import LanceHelper
+
+NUM_ROWS = 10000
+NUM_CLUSTERS = 100
+DIM = 64
+NUM_QUERIES = 50
+K = 10
+
+
+class TestVectorIndexRecall(unittest.TestCase):
+    """
+    Benchmark: recall@k and latency of the IVF-PQ index against the exact brute force result
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        # Clustered like embeddings, uniformly random vectors have no meaningful neighbours
+        centers = rng.normal(size=(NUM_CLUSTERS, DIM))
+        cls.vectors = (
+            centers[rng.integers(0, NUM_CLUSTERS, NUM_ROWS)] + rng.normal(scale=0.3, size=(NUM_ROWS, DIM))
+        ).astype("float32")
+        cls.queries = (
+            centers[rng.integers(0, NUM_CLUSTERS, NUM_QUERIES)] + rng.normal(scale=0.3, size=(NUM_QUERIES, DIM))
+        ).astype("float32")
+        data = [{"vector": vector.tolist(), "context": str(i)} for i, vector in enumerate(cls.vectors)]
+        cls.scanned = LanceHelper(uri=cls.tmp_dir.name, search_workers=1, index_min_rows=NUM_ROWS + 1)
+        cls.scanned.create_table(table_name="scanned", data=data)
+        cls.indexed = LanceHelper(uri=cls.tmp_dir.name, search_workers=1, index_min_rows=NUM_ROWS)
+        cls.indexed.create_table(table_name="indexed", data=data)
+        start = time.perf_counter()
+        cls.indexed.ensure_index("indexed")
+        loguru.logger.info(f"Benchmark --- index of {NUM_ROWS} rows built in {time.perf_counter() - start:.2f}s")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.scanned.shutdown()
+        cls.indexed.shutdown()
+        cls.tmp_dir.cleanup()
+
+    def measure(self, lance_helper: LanceHelper, table_name: str) -> tuple[list[set[str]], list[float]]:
+        results: list[set[str]] = list()
+        latencies: list[float] = list()
+        for query in self.queries:
+            start = time.perf_counter()
+            hits = lance_helper.search(query.tolist(), K, table_name=table_name)
+            latencies.append(time.perf_counter() - start)
+            results.append({hit["context"] for hit in hits})
+        return results, latencies
+
+    def test_recall_against_brute_force(self):
+        distances = ((self.queries[:, None, :] - self.vectors[None, :, :]) ** 2).sum(axis=-1)
+        exact = [{str(i) for i in np.argsort(row)[:K]} for row in distances]
+
+        self.assertIsNone(self.scanned.index_status("scanned")["index_type"])
+        self.assertEqual(self.indexed.index_status("indexed")["index_type"], "IVF_PQ")
+        scanned, scanned_latencies = self.measure(self.scanned, "scanned")
+        indexed, indexed_latencies = self.measure(self.indexed, "indexed")
+
+        recall_scanned = statistics.mean(len(found & truth) / K for found, truth in zip(scanned, exact))
+        recall_indexed = statistics.mean(len(found & truth) / K for found, truth in zip(indexed, exact))
+        loguru.logger.info(
+            f"Benchmark --- recall@{K} scan {recall_scanned:.3f} index {recall_indexed:.3f}, median latency "
+            f"scan {statistics.median(scanned_latencies) * 1000:.2f}ms "
+            f"index {statistics.median(indexed_latencies) * 1000:.2f}ms"
+        )
+        self.assertGreaterEqual(recall_scanned, 0.99)
+        self.assertGreaterEqual(recall_indexed, 0.9)
@@ -0,0 +1,83 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+from unittest import mock
+
+from src.models.meta import Account, NextID
+from src.models.schemas.account import AccountInCreate, AccountInUpdate
+from src.repository.crud.account import AccountCRUDRepository
+from src.repository.id_allocator import IdAllocator
+from src.repository.meta_database import MetaDBHelper
+from src.securities.authorizations.jwt import jwt_generator
+from src.utilities.cachekit.lru_cache import LRUCache
+from src.utilities.exceptions.database import EntityDoesNotExist
+
+
+class TestAccountCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.meta_db = MetaDBHelper(uri=self.tmp_dir.name)
+        self.meta_db.create_table("account", schema=Account)
+        self.meta_db.create_table("next_id", schema=NextID).add([{"id": 1}])
+        self.cache = LRUCache(name="test_account_cache", max_entries=8, ttl=60)
+        self.account_repo = AccountCRUDRepository(
+            meta_db=self.meta_db, cache=self.cache, id_allocator=IdAllocator(meta_db=self.meta_db)
+        )
+        self.account = await self.account_repo.create_account(
+            AccountInCreate(username="alice", email="alice@example.com", password="secret")
+        )
+
+    def tearDown(self):
+        self.meta_db.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_read_through(self):
+        self.account_repo.read_account_by_username("alice")
+        # Rows written behind the back of the repository are not seen until the entry is dropped
+        self.meta_db.open_table("account").delete("username = 'alice'")
+        other_repo = AccountCRUDRepository(meta_db=self.meta_db, cache=self.cache)
+        self.assertEqual(other_repo.read_account_by_username("alice").id, self.account.id)
+        self.assertEqual(self.cache.hits.value, 1)
+        self.cache.clear()
+        with self.assertRaises(EntityDoesNotExist):
+            other_repo.read_account_by_username("alice")
+
+    async def test_invalidated_by_writes(self):
+        self.account_repo.read_account_by_username("alice")
+        await self.account_repo.update_account_by_id(self.account.id, AccountInUpdate(email="bob@example.com"))
+        self.assertEqual(self.account_repo.read_account_by_username("alice").email, "bob@example.com")
+        self.account_repo.delete_account_by_id(self.account.id)
+        with self.assertRaises(EntityDoesNotExist):
+            self.account_repo.read_account_by_username("alice")
+
+    async def test_read_during_update_is_not_cached(self):
+        """
+        A read between the start of an update and its write does not leave the old row in the cache
+        """
+        update = self.account_repo.tbl.update
+
+        def concurrent_read_then_update(*args, **kwargs):
+            self.account_repo.read_account_by_username("alice")
+            return update(*args, **kwargs)
+
+        with mock.patch.object(self.account_repo.tbl, "update", side_effect=concurrent_read_then_update):
+            await self.account_repo.update_account_by_id(self.account.id, AccountInUpdate(email="bob@example.com"))
+        self.assertEqual(self.account_repo.read_account_by_username("alice").email, "bob@example.com")
+
+    def test_account_id_claim(self):
+        token = jwt_generator.generate_access_token(self.account)
+        self.assertEqual(jwt_generator.retrieve_details_from_token(token).account_id, self.account.id)
@@ -0,0 +1,125 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import unittest
+
+from src.repository.admission_eng import AdmissionController, AdmittedStreamingResponse
+from src.utilities.exceptions.admission import AdmissionRejected
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+    async def test_generations_wait_for_a_free_slot(self):
+        controller = AdmissionController(max_in_flight=2, max_queued=8, max_queued_per_account=8, queue_timeout=5)
+        first, second = await controller.acquire(1), await controller.acquire(2)
+        third = asyncio.create_task(controller.acquire(3))
+        await asyncio.sleep(0.01)
+        self.assertFalse(third.done())
+        self.assertEqual(metrics_kit.gauge("admission_queue_depth").value, 1)
+        first.release()
+        # Releasing twice does not free another slot
+        first.release()
+        (await third).release()
+        second.release()
+        self.assertEqual(metrics_kit.gauge("admission_queue_depth").value, 0)
+        self.assertEqual(metrics_kit.gauge("admission_in_flight").value, 0)
+
+    async def test_accounts_are_served_round_robin(self):
+        controller = AdmissionController(max_in_flight=1, max_queued=8, max_queued_per_account=8, queue_timeout=5)
+        running = await controller.acquire("heavy")
+        order: list[str] = list()
+
+        async def generate(account_id: str, name: str):
+            permit = await controller.acquire(account_id)
+            order.append(name)
+            await asyncio.sleep(0)
+            permit.release()
+
+        tasks = [asyncio.create_task(generate("heavy", f"heavy{i}")) for i in range(3)]
+        await asyncio.sleep(0.01)
+        tasks.append(asyncio.create_task(generate("light", "light")))
+        await asyncio.sleep(0.01)
+        running.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["heavy0", "light", "heavy1", "heavy2"])
+
+    async def test_rejections(self):
+        controller = AdmissionController(max_in_flight=1, max_queued=2, max_queued_per_account=1, queue_timeout=5)
+        running = await controller.acquire(1)
+        waiting = asyncio.create_task(controller.acquire(1))
+        await asyncio.sleep(0.01)
+        with self.assertRaises(AdmissionRejected) as ctx:
+            await controller.acquire(1)
+        self.assertFalse(ctx.exception.overloaded)
+        other = asyncio.create_task(controller.acquire(2))
+        await asyncio.sleep(0.01)
+        with self.assertRaises(AdmissionRejected) as ctx:
+            await controller.acquire(3)
+        self.assertTrue(ctx.exception.overloaded)
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+        running.release()
+        (await waiting).release()
+        (await other).release()
+
+    async def test_queue_timeout_and_cancellation(self):
+        controller = AdmissionController(max_in_flight=1, max_queued=8, max_queued_per_account=8, queue_timeout=0.05)
+        running = await controller.acquire(1)
+        with self.assertRaises(AdmissionRejected) as ctx:
+            await controller.acquire(2)
+        self.assertTrue(ctx.exception.overloaded)
+        cancelled = asyncio.create_task(controller.acquire(3))
+        await asyncio.sleep(0.01)
+        cancelled.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await cancelled
+        # Neither of them is left in the queue
+        self.assertEqual(metrics_kit.gauge("admission_queue_depth").value, 0)
+        running.release()
+        (await controller.acquire(4)).release()
+
+    async def test_permit_is_released_with_the_stream(self):
+        controller = AdmissionController(max_in_flight=1, max_queued=8, max_queued_per_account=8, queue_timeout=5)
+
+        async def stream():
+            for chunk in ["a", "b", "c"]:
+                yield chunk
+
+        admitted = controller.admitted(await controller.acquire(1), stream())
+        self.assertEqual(await admitted.__anext__(), "a")
+        # The client went away in the middle of the stream
+        await admitted.aclose()
+        (await asyncio.wait_for(controller.acquire(2), timeout=1)).release()
+
+    async def test_permit_is_released_when_the_client_leaves_before_the_stream(self):
+        controller = AdmissionController(max_in_flight=1, max_queued=8, max_queued_per_account=8, queue_timeout=5)
+        started = list()
+
+        async def stream():
+            started.append(True)
+            yield "a"
+
+        async def receive() -> dict:
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            # The client is gone, the response never gets to the body
+            await asyncio.sleep(0.1)
+
+        permit = await controller.acquire(1)
+        response = AdmittedStreamingResponse(permit, controller.admitted(permit, stream()))
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+        self.assertEqual(started, [])
+        (await asyncio.wait_for(controller.acquire(2), timeout=1)).release()
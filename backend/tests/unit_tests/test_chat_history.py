@@ -0,0 +1,182 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from src.models.meta import ChatHistory, Session
+from src.models.schemas.chat import Chats, SessionUpdate
+from src.repository.crud.chat import ChatHistoryCRUDRepository, SessionCRUDRepository
+from src.repository.meta_database import MetaDBHelper
+from src.utilities.exceptions.database import EntityDoesNotExist
+
+
+class TestChatHistoryCRUDRepository(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.meta_db = MetaDBHelper(uri=self.tmp_dir.name)
+        self.meta_db.create_table("chat_history", schema=ChatHistory)
+
+    def tearDown(self):
+        self.meta_db.dispose()
+        self.tmp_dir.cleanup()
+
+    def num_fragments(self) -> int:
+        return len(self.meta_db.open_table("chat_history").to_lance().get_fragments())
+
+    def test_one_write_per_save_in_order(self):
+        chat_repo = ChatHistoryCRUDRepository(meta_db=self.meta_db)
+        chat_repo.load_create_chat_history("uuid", [Chats(role="user", message=f"q{i}") for i in range(3)])
+        chat_repo.load_create_chat_history(
+            "uuid", [Chats(role="assistant", message="a"), Chats(role="user", message="q")]
+        )
+        chat_repo.load_create_chat_history("other", [Chats(role="user", message="other")])
+
+        self.assertEqual(self.num_fragments(), 3)
+        chats = ChatHistoryCRUDRepository(meta_db=self.meta_db).read_chat_history_by_session_uuid("uuid")
+        self.assertEqual([chat.seq for chat in chats], [0, 1, 2, 3, 4])
+        self.assertEqual([chat.message for chat in chats], ["q0", "q1", "q2", "a", "q"])
+
+    def test_concurrent_saves_get_distinct_seqs(self):
+        """
+        Saves of one session from several workers, each with its own connection, never share a seq
+        """
+        workers = [MetaDBHelper(uri=self.tmp_dir.name) for _ in range(4)]
+        barrier = threading.Barrier(len(workers))
+
+        def save(worker: int, meta_db: MetaDBHelper) -> None:
+            chat_repo = ChatHistoryCRUDRepository(meta_db=meta_db)
+            barrier.wait()
+            for i in range(3):
+                chat_repo.load_create_chat_history(
+                    "uuid", [Chats(role="user", message=f"q{worker}.{i}"), Chats(role="assistant", message="a")]
+                )
+
+        threads = [threading.Thread(target=save, args=(worker, meta_db)) for worker, meta_db in enumerate(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for meta_db in workers:
+            meta_db.dispose()
+
+        seqs = self.meta_db.open_table("chat_history").to_lance().to_table(columns=["seq"]).column("seq").to_pylist()
+        self.assertEqual(sorted(seqs), list(range(24)))
+
+    def test_save_leaves_the_shared_handle_alone(self):
+        """
+        A save writes on a handle of its own, the cached one other threads read through is not moved
+        """
+        shared = self.meta_db.open_table("chat_history")
+        chat_repo = ChatHistoryCRUDRepository(meta_db=self.meta_db)
+        with mock.patch.object(shared, "checkout_latest") as checkout, mock.patch.object(shared, "add") as add:
+            chat_repo.load_create_chat_history("uuid", [Chats(role="user", message="q")])
+        checkout.assert_not_called()
+        add.assert_not_called()
+
+        self.assertEqual([chat.message for chat in chat_repo.read_chat_history_by_session_uuid("uuid")], ["q"])
+        chats = ChatHistoryCRUDRepository(meta_db=self.meta_db).read_chat_history_by_session_uuid("uuid")
+        self.assertEqual([chat.message for chat in chats], ["q"])
+
+    def test_compaction(self):
+        chat_repo = ChatHistoryCRUDRepository(meta_db=self.meta_db)
+        for i in range(4):
+            chat_repo.load_create_chat_history("uuid", [Chats(role="user", message=f"q{i}")])
+        self.assertFalse(self.meta_db.compact_table("chat_history", min_fragments=5))
+        self.assertTrue(self.meta_db.compact_table("chat_history", min_fragments=4))
+        self.assertEqual(self.num_fragments(), 1)
+        chats = ChatHistoryCRUDRepository(meta_db=self.meta_db).read_chat_history_by_session_uuid("uuid")
+        self.assertEqual([chat.message for chat in chats], ["q0", "q1", "q2", "q3"])
+
+    def test_pages(self):
+        chat_repo = ChatHistoryCRUDRepository(meta_db=self.meta_db)
+        for i in range(5):
+            chat_repo.load_create_chat_history(
+                "uuid", [Chats(role="user", message=f"q{i}"), Chats(role="assistant", message=f"a{i}")]
+            )
+        chat_repo.load_create_chat_history("other", [Chats(role="user", message="other")])
+        expected = [message for i in range(5) for message in (f"q{i}", f"a{i}")]
+
+        messages, cursor, num_pages = list(), None, 0
+        while True:
+            page, cursor = chat_repo.read_chat_history_page("uuid", limit=3, cursor=cursor)
+            messages += [chat["message"] for chat in page]
+            num_pages += 1
+            if cursor is None:
+                break
+        self.assertEqual(messages, expected)
+        self.assertEqual(num_pages, 4)
+        self.assertEqual(set(page[0]), {"seq", "role", "message", "created_at"})
+
+        pages = list(chat_repo.iter_chat_history("uuid", page_size=4))
+        self.assertEqual([len(page) for page in pages], [4, 4, 2])
+        self.assertEqual([chat["message"] for page in pages for chat in page], expected)
+        self.assertEqual(chat_repo.read_chat_history_page("uuid", limit=10), (pages[0] + pages[1] + pages[2], None))
+        with self.assertRaises(ValueError):
+            chat_repo.read_chat_history_page("uuid", cursor="2024' OR 1=1")
+
+    def test_tail(self):
+        chat_repo = ChatHistoryCRUDRepository(meta_db=self.meta_db)
+        for i in range(3):
+            chat_repo.load_create_chat_history(
+                "uuid", [Chats(role="user", message=f"q{i}"), Chats(role="assistant", message=f"a{i}")]
+            )
+        tail = chat_repo.read_chat_history_tail("uuid", limit=3)
+        self.assertEqual([chat["message"] for chat in tail], ["a1", "q2", "a2"])
+        self.assertEqual(len(chat_repo.read_chat_history_tail("uuid", limit=10)), 6)
+        self.assertEqual(chat_repo.read_chat_history_tail("other", limit=3), [])
+
+
+class TestSessionCRUDRepository(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.meta_db = MetaDBHelper(uri=self.tmp_dir.name)
+        self.meta_db.create_table("session", schema=Session)
+        self.session_repo = SessionCRUDRepository(meta_db=self.meta_db)
+
+    def tearDown(self):
+        self.meta_db.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_read_create(self):
+        session = self.session_repo.read_create_sessions_by_uuid(
+            "missing", account_id=1, name="first", session_type="rag"
+        )
+        self.assertNotEqual(session.session_uuid, "missing")
+        self.assertEqual((session.account_id, session.name, session.session_type), (1, "first", "rag"))
+        self.assertEqual(
+            self.session_repo.read_create_sessions_by_uuid(session.session_uuid, account_id=1, name="again"), session
+        )
+        # The session of another account is never handed out
+        other = self.session_repo.read_create_sessions_by_uuid(session.session_uuid, account_id=2, name="other")
+        self.assertNotEqual(other.session_uuid, session.session_uuid)
+        self.assertFalse(self.session_repo.verify_session_by_account_id(session.session_uuid, account_id=2))
+
+    def test_updates_return_the_written_row(self):
+        session = self.session_repo.create_session(account_id=1, name="first")
+        updated = self.session_repo.update_sessions_by_uuid(
+            SessionUpdate(sessionUuid=session.session_uuid, name="renamed", session_type="rag"), account_id=1
+        )
+        self.assertEqual(
+            (updated.name, updated.session_type, updated.created_at), ("renamed", "rag", session.created_at)
+        )
+        updated = self.session_repo.append_ds_name_to_session(session.session_uuid, account_id=1, ds_name="ds")
+        self.assertEqual(updated.dataset_name, "ds")
+        self.assertEqual(self.session_repo.read_sessions_by_uuid(session.session_uuid), updated)
+        self.assertEqual(self.meta_db.open_table("session").count_rows(), 1)
+        with self.assertRaises(EntityDoesNotExist):
+            self.session_repo.append_ds_name_to_session(session.session_uuid, account_id=2, ds_name="ds")
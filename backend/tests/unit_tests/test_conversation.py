@@ -0,0 +1,152 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+import httpx
+from src.models.meta import ChatHistory
+from src.models.schemas.chat import Chats
+from src.repository.crud.chat import ChatHistoryCRUDRepository
+from src.repository.meta_database import MetaDBHelper
+from src.repository.rag import chat as rag_chat
+from src.repository.rag import conversation
+from src.repository.rag.chat import RAGChatModelRepository
+from src.repository.rag.conversation import ConversationWindow
+from src.repository.tokenizer_eng import TokenCounter
+
+
+def messages(num_turns: int, words: int = 4) -> list[dict]:
+    """
+    Alternating questions and answers of `words` words each, a formatted message is two tokens more
+    """
+    return [
+        {"seq": seq, "role": "user" if seq % 2 == 0 else "assistant", "message": " ".join([f"m{seq}"] * words)}
+        for seq in range(2 * num_turns)
+    ]
+
+
+class TokenizerTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.prompts: list[dict] = list()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            body = json.loads(request.content)
+            if request.url.path == "/tokenize":
+                return httpx.Response(200, json={"tokens": [0] * len(body["content"].split())})
+            self.prompts.append(body)
+            return httpx.Response(200, text='data: {"content":"a","stop":true}\n\n')
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        self.patches = [
+            mock.patch.object(conversation, "token_counter", TokenCounter(max_entries=256, client=self.client)),
+            mock.patch.object(rag_chat, "token_counter", TokenCounter(max_entries=256, client=self.client)),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        await self.client.aclose()
+
+
+class TestConversationWindow(TokenizerTestCase):
+    async def test_everything_fits(self):
+        window = ConversationWindow(max_tokens=100)
+        self.assertEqual(await window.select("uuid", messages(3), budget=1000), messages(3))
+        self.assertEqual(await window.select("uuid", list(), budget=1000), list())
+
+    async def test_window_starts_with_a_question(self):
+        # 6 tokens per message, 3 messages fit but the window would start with an answer
+        window = ConversationWindow(max_tokens=18)
+        self.assertEqual([m["seq"] for m in await window.select("uuid", messages(3), budget=100)], [4, 5])
+
+    async def test_start_is_kept_until_the_turns_overflow(self):
+        window = ConversationWindow(max_tokens=48, refill_ratio=0.5)
+        # 4 turns of 12 tokens, all of them fit
+        self.assertEqual((await window.select("uuid", messages(4), budget=100))[0]["seq"], 0)
+        # 5 turns overflow, cut down to at most 24 tokens
+        self.assertEqual((await window.select("uuid", messages(5), budget=100))[0]["seq"], 6)
+        # The next turns fit after the same start until they overflow again
+        self.assertEqual((await window.select("uuid", messages(6), budget=100))[0]["seq"], 6)
+        self.assertEqual((await window.select("uuid", messages(7), budget=100))[0]["seq"], 6)
+        self.assertEqual((await window.select("uuid", messages(8), budget=100))[0]["seq"], 12)
+        # Another session has its own window
+        self.assertEqual((await window.select("other", messages(6), budget=100))[0]["seq"], 4)
+
+    async def test_no_budget(self):
+        window = ConversationWindow(max_tokens=40)
+        self.assertEqual(await window.select("uuid", messages(2), budget=0), list())
+
+
+class TestConversationPrompt(TokenizerTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.meta_db = MetaDBHelper(uri=self.tmp_dir.name)
+        self.meta_db.create_table("chat_history", schema=ChatHistory)
+        self.patches.append(mock.patch.object(rag_chat.httpx_kit, "inference_client", self.client))
+        self.patches[-1].start()
+
+    async def asyncTearDown(self):
+        await super().asyncTearDown()
+        self.meta_db.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_prompt_budget_of_a_slot(self):
+        with mock.patch.multiple(
+            rag_chat.settings, INFERENCE_ENG_CTX_SIZE=8192, INFERENCE_ENG_SLOTS=4, INFERENCE_ENG_ANSWER_TOKENS=512
+        ):
+            self.assertEqual(RAGChatModelRepository.prompt_budget(128), 2048 - 128)
+            # Generating until stop still needs room for the answer
+            self.assertEqual(RAGChatModelRepository.prompt_budget(-1), 2048 - 512)
+
+    async def test_turns_leave_the_contexts_their_share(self):
+        history = [Chats(role=m["role"], message=m["message"]) for m in messages(10)]
+        for session_uuid in ("chat", "rag"):
+            ChatHistoryCRUDRepository(meta_db=self.meta_db).load_create_chat_history(session_uuid, history)
+        repo = RAGChatModelRepository(meta_db=self.meta_db)
+        with mock.patch.multiple(rag_chat.settings, INFERENCE_ENG_CTX_SIZE=228, INFERENCE_ENG_SLOTS=1):
+            prompt_budget = RAGChatModelRepository.prompt_budget(128)
+            chat_turns = await repo.conversation_turns("chat", "question", 128)
+            rag_turns = await repo.conversation_turns("rag", "question", 128, context_share=0.5)
+
+        # 6 tokens per formatted message
+        self.assertGreater(6 * len(chat_turns), prompt_budget // 2)
+        self.assertLessEqual(6 * len(rag_turns), prompt_budget // 2)
+        self.assertGreater(len(rag_turns), 0)
+
+    async def test_prior_turns_are_sent_before_the_question(self):
+        ChatHistoryCRUDRepository(meta_db=self.meta_db).load_create_chat_history(
+            "uuid", [Chats(role="user", message="Who are you?"), Chats(role="assistant", message=" A robot.")]
+        )
+        repo = RAGChatModelRepository(meta_db=self.meta_db)
+        async for _ in repo.inference(session_uuid="uuid", input_msg="Really?"):
+            pass
+        async for _ in repo.inference(session_uuid="new", input_msg="Hello"):
+            pass
+
+        follow_up, first = self.prompts
+        self.assertTrue(follow_up["cache_prompt"])
+        self.assertEqual(
+            follow_up["prompt"],
+            f"### System: {rag_chat.InferenceHelper.instruction}\n"
+            "\n### Human: Who are you?\n### Assistant: A robot.\n### Human: Really?\n### Assistant:",
+        )
+        self.assertEqual(first["prompt"], repo.format_prompt("Hello"))
+        self.assertTrue(follow_up["prompt"].startswith(repo.format_prompt("Who are you?")[: -len("\n### Assistant:")]))
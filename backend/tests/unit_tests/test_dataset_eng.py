@@ -0,0 +1,70 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+from unittest import mock
+
+import datasets
+import pyarrow as pa
+from src.repository import rag_datasets_eng
+from src.repository.rag_datasets_eng import DatasetEng
+from src.repository.vector_database import LanceHelper
+
+NUM_ROWS = 250
+
+
+def fake_load_dataset(name: str, split: str, streaming: bool) -> datasets.IterableDataset:
+    rows = [{"question": f"q{i}", "context": f"c{i}", "embedding": [float(i), 1.0]} for i in range(NUM_ROWS)]
+    return datasets.Dataset.from_list(rows).to_iterable_dataset()
+
+
+class TestDatasetEng(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lance_helper = LanceHelper(uri=self.tmp_dir.name, search_workers=1)
+        self.patches = [
+            mock.patch.object(rag_datasets_eng, "load_dataset", fake_load_dataset),
+            mock.patch.object(rag_datasets_eng, "vector_db", self.lance_helper),
+            mock.patch.object(rag_datasets_eng, "semantic_cache"),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.lance_helper.shutdown()
+        self.tmp_dir.cleanup()
+
+    def test_list_column_becomes_vector(self):
+        batch = DatasetEng.to_vector_batch(pa.table({"context": ["a"], "emb": [[1.0, 2.0]]}))
+        self.assertEqual(batch.column_names, ["context", "vector"])
+        self.assertEqual(batch.schema.field("vector").type, pa.list_(pa.float32(), 2))
+        with self.assertRaises(ValueError):
+            DatasetEng.to_vector_batch(pa.table({"context": ["a"]}))
+
+    def test_dataset_is_loaded_in_batches(self):
+        DatasetEng.validate_dataset("aisuko/test")
+        self.assertEqual(self.lance_helper.tables.open_table("aisuko_test").count_rows(), 0)
+
+        progress: list[int] = list()
+        written = DatasetEng.load_dataset("aisuko/test", progress=progress.append)
+        self.assertEqual(written, NUM_ROWS)
+        # One progress report per LOAD_BATCH_SIZE rows
+        self.assertEqual(progress, [100, 200, 250])
+        self.assertEqual(self.lance_helper.tables.open_table("aisuko_test").count_rows(), NUM_ROWS)
+        hits = self.lance_helper.search([7.0, 1.0], 1, table_name="aisuko_test")
+        self.assertEqual(hits[0]["context"], "c7")
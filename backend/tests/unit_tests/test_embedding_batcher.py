@@ -0,0 +1,93 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import unittest
+
+import httpx
+from src.repository.embedding_eng import EmbeddingBatcher
+
+
+class TestEmbeddingBatcher(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.requests: list[list[str]] = list()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            contents = json.loads(request.content)["content"]
+            self.requests.append(contents)
+            return httpx.Response(200, json={"results": [{"embedding": [float(len(c))]} for c in contents]})
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_concurrent_requests_are_batched(self):
+        """
+        Concurrent callers share one request and get their own vector back
+        """
+        batcher = EmbeddingBatcher(max_batch_size=32, max_wait_ms=20, client=self.client)
+        contents = ["a" * i for i in range(1, 11)]
+        vectors = await asyncio.gather(*[batcher.embed(content) for content in contents])
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(vectors, [[float(i)] for i in range(1, 11)])
+
+    async def test_batch_size_is_bounded(self):
+        """
+        A full batch is sent immediately and the rest follows in new batches
+        """
+        batcher = EmbeddingBatcher(max_batch_size=4, max_wait_ms=20, client=self.client)
+        await asyncio.gather(*[batcher.embed(str(i)) for i in range(10)])
+        self.assertEqual([len(contents) for contents in self.requests], [4, 4, 2])
+
+    async def test_errors_are_fanned_out(self):
+        """
+        Every caller of a failed batch gets the error
+        """
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+        batcher = EmbeddingBatcher(max_batch_size=8, max_wait_ms=1, client=client)
+        results = await asyncio.gather(*[batcher.embed(str(i)) for i in range(3)], return_exceptions=True)
+        await client.aclose()
+        self.assertTrue(all(isinstance(result, httpx.HTTPStatusError) for result in results))
+
+    async def test_cancelled_batch_releases_its_callers(self):
+        """
+        The callers of a batch cancelled mid-request are cancelled too instead of waiting forever
+        """
+
+        class StalledBatcher(EmbeddingBatcher):
+            async def embed_batch(self, contents: list[str]) -> list[list[float]]:
+                await asyncio.Event().wait()
+
+        batcher = StalledBatcher(max_batch_size=2, max_wait_ms=1, client=self.client)
+        callers = [asyncio.create_task(batcher.embed(str(i))) for i in range(2)]
+        await asyncio.sleep(0.01)
+        for task in list(batcher._tasks):
+            task.cancel()
+        results = await asyncio.wait_for(asyncio.gather(*callers, return_exceptions=True), timeout=1)
+        self.assertTrue(all(isinstance(result, asyncio.CancelledError) for result in results))
+
+    def test_parse_embeddings(self):
+        """
+        Both llama.cpp response layouts are supported
+        """
+        self.assertEqual(EmbeddingBatcher.parse_embeddings({"embedding": [1.0]}, 1), [[1.0]])
+        self.assertEqual(
+            EmbeddingBatcher.parse_embeddings([{"index": 1, "embedding": [2.0]}, {"index": 0, "embedding": [1.0]}], 2),
+            [[1.0], [2.0]],
+        )
+        with self.assertRaises(ValueError):
+            EmbeddingBatcher.parse_embeddings({"results": []}, 1)
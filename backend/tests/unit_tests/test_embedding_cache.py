@@ -0,0 +1,102 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import array
+import os
+import tempfile
+import unittest
+
+from src.repository.embedding_cache import EmbeddingCache
+from src.utilities.cachekit.lru_cache import LRUCache
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(name="test_lru_cache", max_entries=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+
+    def test_bytes_bound(self):
+        cache = LRUCache(name="test_lru_cache", max_bytes=10, sizeof=lambda key, value: len(value))
+        cache.put("a", "x" * 6)
+        cache.put("b", "x" * 6)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.bytes, 6)
+        # Entries larger than the whole cache are not stored
+        cache.put("c", "x" * 11)
+        self.assertIsNone(cache.get("c"))
+
+    def test_ttl(self):
+        clock = FakeClock()
+        cache = LRUCache(name="test_lru_cache", ttl=10, clock=clock)
+        cache.put("a", 1)
+        cache.put("b", 2, ttl=30)
+        clock.now = 20
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), 2)
+
+    def test_metrics_per_instance(self):
+        published = metrics_kit.counter("test_lru_metrics_hits").value
+        first = LRUCache(name="test_lru_metrics", sizeof=lambda key, value: 4)
+        second = LRUCache(name="test_lru_metrics", sizeof=lambda key, value: 4)
+        first.put("a", 1)
+        second.put("a", 1)
+        first.get("a")
+        second.get("a")
+        second.get("b")
+        self.assertEqual((first.hits.value, first.misses.value), (1, 0))
+        self.assertEqual((second.hits.value, second.misses.value), (1, 1))
+        # The metrics API shows the caches of the same name together
+        self.assertEqual(metrics_kit.counter("test_lru_metrics_hits").value - published, 2)
+        self.assertEqual(metrics_kit.gauge("test_lru_metrics_bytes").value, 8)
+        second.clear()
+        self.assertEqual((first.size_bytes.value, second.size_bytes.value), (4, 0))
+        self.assertEqual(metrics_kit.gauge("test_lru_metrics_bytes").value, 4)
+
+
+class TestEmbeddingCache(unittest.IsolatedAsyncioTestCase):
+    async def test_normalized_float32_vectors(self):
+        cache = EmbeddingCache(max_bytes=1024 * 1024, ttl=60, disk_path="")
+        await cache.put("Do you know RMIT?", [0.5] * 384)
+        vector = await cache.get("  do you   know rmit? ")
+        self.assertIsInstance(vector, array.array)
+        self.assertEqual(vector.typecode, "f")
+        self.assertEqual(list(vector), [0.5] * 384)
+        self.assertIsNone(await cache.get("do you know RMIT"))
+
+    async def test_disk_tier_is_shared(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "embedding.sqlite")
+            writer = EmbeddingCache(ttl=60, disk_path=path)
+            reader = EmbeddingCache(ttl=60, disk_path=path)
+            await writer.put("hello", [0.25] * 384)
+            self.assertEqual(list(await reader.get("hello")), [0.25] * 384)
+            self.assertEqual(reader.purge_expired(), 0)
+            writer.close()
+            reader.close()
@@ -0,0 +1,179 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import httpx
+from src.repository.rag import chat as rag_chat
+from src.repository.rag.chat import RAGChatModelRepository
+from src.repository.semantic_cache import CompletionRecorder
+from src.utilities.httpkit.endpoint_pool import EndpointPool, parse_endpoints
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def pool(num_endpoints: int = 3, clock: FakeClock | None = None, **kwargs) -> EndpointPool:
+    return EndpointPool(
+        "test_pool",
+        [f"http://engine{i}:8080" for i in range(num_endpoints)],
+        clock=clock or FakeClock(),
+        **kwargs,
+    )
+
+
+class TestEndpointPool(unittest.TestCase):
+    def test_parse_endpoints(self):
+        self.assertEqual(parse_endpoints("", default="llamacpp:8080"), ["http://llamacpp:8080"])
+        self.assertEqual(
+            parse_endpoints(" a:1, https://b:2/ ,", default="llamacpp:8080"), ["http://a:1", "https://b:2"]
+        )
+
+    def test_least_outstanding(self):
+        endpoints = pool()
+        with endpoints.use() as first, endpoints.use() as second, endpoints.use() as third:
+            self.assertEqual(len({first.base_url, second.base_url, third.base_url}), 3)
+            with endpoints.use() as fourth:
+                self.assertEqual(fourth.outstanding, 2)
+        self.assertEqual([endpoint.outstanding for endpoint in endpoints.endpoints], [0, 0, 0])
+
+    def test_sessions_stick_to_their_endpoint(self):
+        endpoints = pool(sticky_slack=1)
+        sticky = endpoints.pick("session")
+        self.assertTrue(all(endpoints.pick("session") is sticky for _ in range(10)))
+        self.assertGreater(len({endpoints.pick(f"session{i}").base_url for i in range(30)}), 1)
+        # Up to `sticky_slack` more requests in flight than the least busy endpoint
+        with endpoints.use("session"):
+            self.assertIs(endpoints.pick("session"), sticky)
+            with endpoints.use("session"):
+                self.assertIsNot(endpoints.pick("session"), sticky)
+
+    def test_ejection_on_failures(self):
+        clock = FakeClock()
+        endpoints = pool(num_endpoints=2, clock=clock, max_failures=2, eject_seconds=10)
+        failing = endpoints.pick("session")
+        request = httpx.Request("POST", failing.url("/completion"))
+        server_error = httpx.HTTPStatusError("", request=request, response=httpx.Response(500))
+        for error in [httpx.ConnectError("refused"), server_error]:
+            with self.assertRaises(httpx.HTTPError), endpoints.use("session"):
+                raise error
+        self.assertIsNot(endpoints.pick("session"), failing)
+        # A 4xx is the fault of the request, not of the endpoint
+        with self.assertRaises(httpx.HTTPStatusError), endpoints.use():
+            raise httpx.HTTPStatusError("", request=request, response=httpx.Response(400))
+
+        clock.now = 10
+        self.assertIs(endpoints.pick("session"), failing)
+        # Back on probation, one more failure ejects it again
+        with self.assertRaises(httpx.HTTPError), endpoints.use("session"):
+            raise httpx.ConnectError("refused")
+        self.assertIsNot(endpoints.pick("session"), failing)
+
+    def test_every_endpoint_ejected(self):
+        endpoints = pool(num_endpoints=2, max_failures=1)
+        for endpoint in endpoints.endpoints:
+            endpoints.eject(endpoint)
+        with endpoints.use() as endpoint:
+            self.assertIn(endpoint, endpoints.endpoints)
+
+
+class StubEngine(BaseHTTPRequestHandler):
+    """
+    A llama.cpp stub, `healthy` is set per server
+    """
+
+    def do_GET(self):
+        self.send_response(200 if self.server.healthy else 503)
+        self.end_headers()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not self.server.healthy:
+            self.send_response(500)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        frame = {"content": f"{self.server.server_port}", "stop": True, "id_slot": body["id_slot"]}
+        self.wfile.write(f"data: {json.dumps(frame)}\n\n".encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestEndpointPoolStubServers(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.servers = [ThreadingHTTPServer(("127.0.0.1", 0), StubEngine) for _ in range(2)]
+        for server in self.servers:
+            server.healthy = True
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.pool = EndpointPool(
+            "stub_pool", [f"http://127.0.0.1:{server.server_port}" for server in self.servers], max_failures=1
+        )
+        self.client = httpx.AsyncClient()
+        self.patches = [
+            mock.patch.object(rag_chat, "inference_pool", self.pool),
+            mock.patch.object(rag_chat.httpx_kit, "inference_client", self.client),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    async def asyncTearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        await self.client.aclose()
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    async def complete(self, session_uuid: str) -> int:
+        """
+        The port of the stub that answered
+        """
+        recorder = CompletionRecorder()
+        try:
+            async for _ in RAGChatModelRepository().stream_completion(session_uuid, {}, recorder):
+                pass
+        except httpx.HTTPStatusError:
+            return 0
+        return int(recorder.content)
+
+    async def test_failover_and_recovery(self):
+        port = await self.complete("session")
+        self.assertEqual({await self.complete("session") for _ in range(5)}, {port})
+        failing = next(server for server in self.servers if server.server_port == port)
+        other = next(server for server in self.servers if server is not failing)
+
+        failing.healthy = False
+        self.assertEqual(await self.complete("session"), 0)
+        self.assertEqual(await self.complete("session"), other.server_port)
+
+        failing.healthy = True
+        await self.pool.probe(self.client)
+        self.assertEqual(await self.complete("session"), port)
+
+        other.healthy = False
+        await self.pool.probe(self.client)
+        self.assertEqual([self.pool.is_available(endpoint) for endpoint in self.pool.endpoints].count(True), 1)
@@ -0,0 +1,85 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import multiprocessing
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from src.models.meta import Account, NextID
+from src.models.schemas.account import AccountInCreate
+from src.repository.crud.account import AccountCRUDRepository
+from src.repository.id_allocator import IdAllocator
+from src.repository.meta_database import MetaDBHelper
+from src.securities.hashing.hashing_pool import hashing_pool
+from src.utilities.cachekit.lru_cache import LRUCache
+
+NUM_PROCESSES = 4
+SIGNUPS_PER_PROCESS = 6
+BLOCK_SIZE = 2
+
+
+async def sign_up_async(uri: str, worker: int) -> list[int]:
+    meta_db = MetaDBHelper(uri=uri)
+    account_repo = AccountCRUDRepository(
+        meta_db=meta_db,
+        cache=LRUCache(name=f"test_account_cache_{worker}"),
+        id_allocator=IdAllocator(meta_db=meta_db, block_size=BLOCK_SIZE),
+    )
+    account_ids: list[int] = list()
+    for i in range(SIGNUPS_PER_PROCESS):
+        account = await account_repo.create_account(
+            AccountInCreate(username=f"user{worker}_{i}", email=f"user{worker}_{i}@example.com", password="secret")
+        )
+        account_ids.append(account.id)
+    return account_ids
+
+
+def sign_up(uri: str, worker: int) -> list[int]:
+    try:
+        return asyncio.run(sign_up_async(uri, worker))
+    finally:
+        # Otherwise the exit of this worker process waits for the hashing processes forever
+        hashing_pool.shutdown()
+
+
+class TestIdAllocator(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.meta_db = MetaDBHelper(uri=self.tmp_dir.name)
+        self.meta_db.create_table("account", schema=Account)
+        self.meta_db.create_table("next_id", schema=NextID).add([{"id": 3}])
+
+    def tearDown(self):
+        self.meta_db.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_blocks(self):
+        allocator = IdAllocator(meta_db=self.meta_db, block_size=BLOCK_SIZE)
+        self.assertEqual([allocator.next_id() for _ in range(3)], list(range(3, 6)))
+        # The second allocator gets the block after the two reserved by the first one
+        self.assertEqual(IdAllocator(meta_db=self.meta_db, block_size=BLOCK_SIZE).next_id(), 3 + 2 * BLOCK_SIZE)
+        self.assertEqual(self.meta_db.open_table("next_id").to_arrow()["id"].to_pylist(), [3 + 3 * BLOCK_SIZE])
+
+    def test_concurrent_signups(self):
+        # Not a multiprocessing.Pool, its daemonic processes can't start the hashing pool
+        with ProcessPoolExecutor(NUM_PROCESSES, mp_context=multiprocessing.get_context("spawn")) as executor:
+            ids = list(executor.map(sign_up, [self.tmp_dir.name] * NUM_PROCESSES, range(NUM_PROCESSES)))
+        ids = [account_id for worker_ids in ids for account_id in worker_ids]
+        self.assertEqual(len(ids), NUM_PROCESSES * SIGNUPS_PER_PROCESS)
+        self.assertEqual(len(set(ids)), len(ids))
+        stored_ids = self.meta_db.open_table("account").to_arrow()["id"].to_pylist()
+        self.assertEqual(sorted(stored_ids), sorted(ids))
@@ -0,0 +1,162 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import functools
+import tempfile
+import threading
+import types
+import unittest
+from unittest import mock
+
+from src.models.meta import IngestionJob
+from src.models.schemas.dataset import IngestionJobResponse
+from src.repository import rag_datasets_eng
+from src.repository.crud.ingestion_job import IngestionJobCRUDRepository
+from src.repository.ingestion_eng import IngestionWorkerPool
+from src.repository.meta_database import MetaDBHelper
+from src.repository.vector_database import LanceHelper
+from src.utilities.metrics.metrics_kit import metrics_kit
+from tests.unit_tests.test_dataset_eng import NUM_ROWS, fake_load_dataset
+
+
+def fake_load_dataset_builder(name: str):
+    splits = {"validation": types.SimpleNamespace(num_examples=NUM_ROWS)}
+    return types.SimpleNamespace(info=types.SimpleNamespace(splits=splits))
+
+
+class TestIngestionWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.meta_db = MetaDBHelper(uri=f"{self.tmp_dir.name}/meta")
+        self.meta_db.create_table("ingestion_job", schema=IngestionJob)
+        self.repo_type = functools.partial(IngestionJobCRUDRepository, meta_db=self.meta_db)
+        self.lance_helper = LanceHelper(uri=f"{self.tmp_dir.name}/rag", search_workers=1)
+        self.patches = [
+            mock.patch.object(rag_datasets_eng, "load_dataset", fake_load_dataset),
+            mock.patch.object(rag_datasets_eng, "load_dataset_builder", fake_load_dataset_builder),
+            mock.patch.object(rag_datasets_eng, "vector_db", self.lance_helper),
+            mock.patch.object(rag_datasets_eng, "semantic_cache"),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.pool = IngestionWorkerPool(
+            max_workers=1, max_attempts=2, progress_interval=0, retry_backoff=0, repo_type=self.repo_type
+        )
+
+    def tearDown(self):
+        self.pool.shutdown()
+        for patch in self.patches:
+            patch.stop()
+        self.lance_helper.shutdown()
+        self.tmp_dir.cleanup()
+
+    def test_job_succeeds(self):
+        job = self.repo_type().create_job(
+            account_id=2, dataset_name="aisuko/test", table_name="aisuko_test"
+        )
+        self.assertEqual(job.status, "queued")
+        self.pool.submit(job.job_id, "aisuko/test").result(timeout=30)
+
+        job = self.repo_type().read_job_by_id(job.job_id)
+        self.assertEqual(
+            (job.status, job.attempts, job.rows_ingested, job.total_rows), ("succeeded", 1, NUM_ROWS, NUM_ROWS)
+        )
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.lance_helper.tables.open_table("aisuko_test").count_rows(), NUM_ROWS)
+
+    def test_dataset_is_recorded_on_success_only(self):
+        recorded = list()
+        job = self.repo_type().create_job(account_id=2, dataset_name="aisuko/test", table_name="aisuko_test")
+        self.pool.submit(job.job_id, "aisuko/test", on_success=lambda: recorded.append(job.job_id)).result(timeout=30)
+        self.assertEqual(recorded, [job.job_id])
+
+        job = self.repo_type().create_job(account_id=2, dataset_name="aisuko/missing", table_name="aisuko_missing")
+        with mock.patch.object(rag_datasets_eng, "load_dataset", side_effect=FileNotFoundError("no such dataset")):
+            self.pool.run(job.job_id, "aisuko/missing", on_success=lambda: recorded.append(job.job_id))
+        self.assertEqual(len(recorded), 1)
+        self.assertEqual(self.repo_type().read_job_by_id(job.job_id).status, "failed")
+
+    def test_queued_jobs_are_cancelled_at_shutdown(self):
+        queued = metrics_kit.gauge("ingestion_jobs_queued")
+        depth = queued.value
+        running = threading.Event()
+        release = threading.Event()
+
+        def blocking_load(*args, **kwargs):
+            running.set()
+            release.wait(timeout=10)
+            return fake_load_dataset(*args, **kwargs)
+
+        jobs = [
+            self.repo_type().create_job(account_id=2, dataset_name="aisuko/test", table_name="aisuko_test")
+            for _ in range(2)
+        ]
+        with mock.patch.object(rag_datasets_eng, "load_dataset", blocking_load):
+            futures = [self.pool.submit(job.job_id, "aisuko/test") for job in jobs]
+            running.wait(timeout=10)
+            self.pool.shutdown()
+            release.set()
+            futures[0].result(timeout=30)
+        self.assertTrue(futures[1].cancelled())
+        statuses = [self.repo_type().read_job_by_id(job.job_id).status for job in jobs]
+        self.assertEqual(statuses, ["succeeded", "cancelled"])
+        self.assertEqual(queued.value, depth)
+
+    def test_index_rebuild_job(self):
+        rows = [{"vector": [float(i % 7), float(i % 5)], "context": str(i)} for i in range(300)]
+        self.lance_helper.create_table(table_name="aisuko_test", data=rows)
+        self.lance_helper.index_min_rows = 256
+        job = self.repo_type().create_job(account_id=1, dataset_name="aisuko/test", table_name="aisuko_test")
+        self.pool.submit_index_rebuild(job.job_id, "aisuko_test").result(timeout=30)
+
+        job = self.repo_type().read_job_by_id(job.job_id)
+        self.assertEqual((job.status, job.rows_ingested, job.total_rows), ("succeeded", 300, 300))
+        self.assertEqual(self.lance_helper.index_status("aisuko_test")["index_type"], "IVF_PQ")
+
+        job = self.repo_type().create_job(account_id=1, dataset_name="aisuko/missing", table_name="aisuko_missing")
+        self.pool.rebuild_index(job.job_id, "aisuko_missing")
+        self.assertEqual(self.repo_type().read_job_by_id(job.job_id).status, "failed")
+
+    def test_job_fails_after_retries(self):
+        job = self.repo_type().create_job(
+            account_id=2, dataset_name="aisuko/test", table_name="aisuko_test"
+        )
+        with mock.patch.object(rag_datasets_eng, "load_dataset", side_effect=ConnectionError("hub is down")):
+            self.pool.run(job.job_id, "aisuko/test")
+
+        job = self.repo_type().read_job_by_id(job.job_id)
+        self.assertEqual((job.status, job.attempts, job.error), ("failed", 2, "hub is down"))
+
+
+class TestIngestionJobResponse(unittest.TestCase):
+    def test_throughput_and_eta(self):
+        started_at = datetime.datetime(2024, 8, 1, 10, 0, 0)
+        job = mock.Mock(
+            job_id="id",
+            dataset_name="aisuko/test",
+            status="running",
+            attempts=1,
+            rows_ingested=400,
+            total_rows=1000,
+            error=None,
+            created_at=started_at,
+            started_at=started_at,
+            updated_at=started_at + datetime.timedelta(seconds=4),
+            finished_at=None,
+        )
+        response = IngestionJobResponse.from_job(job)
+        self.assertEqual(response.rows_per_second, 100.0)
+        self.assertEqual(response.eta_seconds, 6.0)
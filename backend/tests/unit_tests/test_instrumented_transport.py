@@ -0,0 +1,82 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import unittest
+
+import httpx
+from src.utilities.httpkit.instrumented_transport import InstrumentedTransport
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+BODY = b'data: {"content":"a","stop":true}\n\n'
+
+
+async def serve(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """
+    A keep-alive HTTP/1.1 stub answering every request with the same body
+    """
+    try:
+        while True:
+            head = await reader.readuntil(b"\r\n\r\n")
+            lines = head.lower().split(b"\r\n")
+            length = next((int(line.split(b":")[1]) for line in lines if line.startswith(b"content-length")), 0)
+            await reader.readexactly(length)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n%s" % (len(BODY), BODY))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+class TestInstrumentedTransport(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = await asyncio.start_server(serve, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self.server.sockets[0].getsockname()[1]}/completion"
+        self.transport = InstrumentedTransport(
+            "test_upstream", httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=1))
+        )
+        self.client = httpx.AsyncClient(transport=self.transport)
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_pool_metrics(self):
+        waiting = metrics_kit.gauge("test_upstream_requests_waiting")
+        in_use = metrics_kit.gauge("test_upstream_connections_in_use")
+        connects = metrics_kit.histogram("test_upstream_connect_seconds", ()).count
+
+        async with self.client.stream("POST", self.url, json={}) as first:
+            self.assertEqual(in_use.value, 1)
+            second = asyncio.create_task(self.client.post(self.url, json={}))
+            await asyncio.sleep(0.05)
+            # The only connection of the pool is held by the first stream
+            self.assertEqual(waiting.value, 1)
+            await first.aread()
+        self.assertEqual((await second).content, BODY)
+
+        self.assertEqual((waiting.value, in_use.value), (0, 0))
+        # The second request reused the kept-alive connection
+        self.assertEqual(metrics_kit.histogram("test_upstream_connect_seconds", ()).count, connects + 1)
+
+    async def test_abandoned_and_failed_requests_are_released(self):
+        async with self.client.stream("POST", self.url, json={}):
+            pass
+        with self.assertRaises(httpx.ConnectError):
+            await self.client.get("http://127.0.0.1:1/health")
+        self.assertEqual(metrics_kit.gauge("test_upstream_requests_waiting").value, 0)
+        self.assertEqual(metrics_kit.gauge("test_upstream_connections_in_use").value, 0)
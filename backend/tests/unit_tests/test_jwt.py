@@ -13,8 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import datetime
 import unittest
+from unittest import mock
+
 import jwt as pyjwt
+from src.api.dependencies.principal import get_current_principal
+from src.config.manager import settings
+from src.models.schemas.account import Account
+from src.models.schemas.jwt import JWTAccount, Principal
+from src.securities.authorizations.jwt import JWTGenerator
+from src.utilities.cachekit.lru_cache import LRUCache
 
 
 @unittest.skip("Skip this test, it is a evidence of a security vulnerability")
@@ -55,3 +64,58 @@ class TestJWTReplacedSolution(unittest.TestCase):
 
         # # jose and pyjwt should produce the same decoded token
         # assert jose_decoded == pyjwt_decoded
+
+
+class TestJWTGenerator(unittest.TestCase):
+    def setUp(self):
+        self.jwt_generator = JWTGenerator(cache=LRUCache(name="test_jwt_cache", max_entries=8))
+        self.account = Account(
+            id=7,
+            username="alice",
+            email="alice@example.com",
+            is_verified=True,
+            is_active=True,
+            is_logged_in=True,
+            created_at="2024-01-01 00:00:00",
+            updated_at="2024-01-01 00:00:00",
+        )
+
+    def test_token_is_decoded_once(self):
+        token = self.jwt_generator.generate_access_token(self.account)
+        with mock.patch.object(self.jwt_generator, "decode_token", wraps=self.jwt_generator.decode_token) as decode:
+            principals = [self.jwt_generator.retrieve_details_from_token(token) for _ in range(3)]
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual({(p.username, p.account_id) for p in principals}, {("alice", 7)})
+
+    def test_invalid_tokens_are_not_cached(self):
+        expired = pyjwt.encode(
+            {
+                "username": "alice",
+                "email": "alice@example.com",
+                "exp": datetime.datetime.now(datetime.UTC) - datetime.timedelta(minutes=1),
+            },
+            key=settings.JWT_SECRET_KEY,
+            algorithm=settings.JWT_ALGORITHM,
+        )
+        tampered = self.jwt_generator.generate_access_token(self.account)[:-2] + "xx"
+        for token in (expired, tampered):
+            with self.assertRaises(Exception):
+                self.jwt_generator.retrieve_details_from_token(token)
+        self.assertEqual(len(self.jwt_generator.cache), 0)
+
+
+class TestCurrentPrincipal(unittest.IsolatedAsyncioTestCase):
+    async def test_account_id_is_read_from_the_token(self):
+        account_repo = mock.Mock()
+        jwt_payload = JWTAccount(username="alice", email="alice@example.com", account_id=7)
+        principal = await get_current_principal(jwt_payload=jwt_payload, account_repo=account_repo)
+        self.assertEqual(principal, Principal(id=7, username="alice"))
+        account_repo.read_account_by_username.assert_not_called()
+
+    async def test_tokens_without_the_claim_are_looked_up(self):
+        account_repo = mock.Mock()
+        account_repo.read_account_by_username.return_value = mock.Mock(id=7, username="alice")
+        jwt_payload = JWTAccount(username="alice", email="alice@example.com")
+        principal = await get_current_principal(jwt_payload=jwt_payload, account_repo=account_repo)
+        self.assertEqual(principal, Principal(id=7, username="alice"))
+        account_repo.read_account_by_username.assert_called_once_with(username="alice")
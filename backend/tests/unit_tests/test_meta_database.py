@@ -0,0 +1,60 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+from src.models.meta import Session
+from src.repository.crud.chat import SessionCRUDRepository
+from src.repository.meta_database import MetaDBHelper
+
+
+def index_stats(meta_db: MetaDBHelper, table_name: str) -> dict[str, int]:
+    ds = meta_db.open_table(table_name).to_lance()
+    return {
+        index["fields"][0]: ds.stats.index_stats(index["name"])["num_unindexed_rows"] for index in ds.list_indices()
+    }
+
+
+class TestMetaDBScalarIndexes(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.meta_db = MetaDBHelper(uri=self.tmp_dir.name)
+        self.meta_db.create_table("session", schema=Session)
+        self.session_repo = SessionCRUDRepository(meta_db=self.meta_db)
+
+    def tearDown(self):
+        self.meta_db.dispose()
+        self.tmp_dir.cleanup()
+
+    def test_empty_table_is_not_indexed(self):
+        self.meta_db.ensure_scalar_indexes()
+        self.assertEqual(index_stats(self.meta_db, "session"), {})
+
+    def test_indexes_are_created_and_updated(self):
+        first = self.session_repo.create_session(account_id=1, name="first")
+        self.meta_db.ensure_scalar_indexes()
+        self.assertEqual(
+            index_stats(self.meta_db, "session"), {"session_uuid": 0, "account_id": 0, "session_type": 0}
+        )
+
+        second = self.session_repo.create_session(account_id=2, name="second")
+        # The appended row is found before and after it is indexed
+        self.assertEqual(self.session_repo.read_sessions_by_uuid(second.session_uuid).name, "second")
+        self.assertEqual(index_stats(self.meta_db, "session")["session_uuid"], 1)
+        self.meta_db.ensure_scalar_indexes()
+        self.assertEqual(index_stats(self.meta_db, "session")["session_uuid"], 0)
+        self.assertEqual(self.session_repo.read_sessions_by_uuid(first.session_uuid).name, "first")
+        self.assertEqual(self.session_repo.read_sessions_by_uuid(second.session_uuid).name, "second")
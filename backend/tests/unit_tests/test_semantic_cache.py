@@ -0,0 +1,92 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import json
+import tempfile
+import unittest
+from unittest import mock
+
+from src.config.settings.const import DEFAULT_DIM
+from src.repository import semantic_cache
+from src.repository.semantic_cache import CompletionRecorder, SemanticCache
+from src.repository.vector_database import LanceHelper
+
+
+def unit_vector(index: int, noise: float = 0.0) -> list[float]:
+    vector = [noise] * DEFAULT_DIM
+    vector[index] = 1.0
+    return vector
+
+
+class TestSemanticCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lance_helper = LanceHelper(uri=self.tmp_dir.name, search_workers=1)
+        self.cache = SemanticCache(lance_helper=self.lance_helper, max_distance=0.05, enabled=True)
+        self.params = self.cache.params_key(temperature=0.2, top_k=40, top_p=0.9, n_predict=128)
+        await self.cache.store("aisuko_squad01-v2", "do you know RMIT?", unit_vector(0), self.params, " Yes, RMIT.")
+
+    async def asyncTearDown(self):
+        self.lance_helper.shutdown()
+        self.tmp_dir.cleanup()
+
+    async def test_near_duplicate_question_hits(self):
+        answer = await self.cache.lookup("aisuko_squad01-v2", unit_vector(0, noise=0.001), self.params)
+        self.assertEqual(answer, " Yes, RMIT.")
+
+    async def test_misses(self):
+        other_params = self.cache.params_key(temperature=0.8, top_k=40, top_p=0.9, n_predict=128)
+        self.assertIsNone(await self.cache.lookup("aisuko_squad01-v2", unit_vector(1), self.params))
+        self.assertIsNone(await self.cache.lookup("aisuko_squad01-v2", unit_vector(0), other_params))
+        self.assertIsNone(await self.cache.lookup("another_dataset", unit_vector(0), self.params))
+
+    async def test_invalidate(self):
+        self.cache.invalidate("aisuko_squad01-v2")
+        self.assertIsNone(await self.cache.lookup("aisuko_squad01-v2", unit_vector(0), self.params))
+
+    async def test_expired_answers_are_not_served(self):
+        self.cache.ttl = 0
+        with mock.patch.object(semantic_cache, "datetime", wraps=semantic_cache.datetime) as clock:
+            clock.now.return_value = datetime.datetime.now() + datetime.timedelta(seconds=2)
+            self.assertIsNone(await self.cache.lookup("aisuko_squad01-v2", unit_vector(0), self.params))
+            self.cache.evict()
+        self.assertEqual(self.cache._open_table().count_rows(), 0)
+
+    async def test_oldest_answers_are_evicted_beyond_max_entries(self):
+        self.cache.max_entries = 2
+        self.cache.eviction_interval = 0
+        with mock.patch.object(semantic_cache, "datetime", wraps=semantic_cache.datetime) as clock:
+            for i in range(1, 4):
+                clock.now.return_value = datetime.datetime.now() + datetime.timedelta(seconds=i)
+                await self.cache.store("aisuko_squad01-v2", f"q{i}", unit_vector(i), self.params, f"a{i}")
+        self.assertEqual(self.cache._open_table().count_rows(), 2)
+        self.assertIsNone(await self.cache.lookup("aisuko_squad01-v2", unit_vector(0), self.params))
+        self.assertIsNone(await self.cache.lookup("aisuko_squad01-v2", unit_vector(1), self.params))
+        self.assertEqual(await self.cache.lookup("aisuko_squad01-v2", unit_vector(3), self.params), "a3")
+
+    async def test_replay_round_trip(self):
+        """
+        The replayed stream has the llama.cpp chunk format and rebuilds the same answer
+        """
+        recorder = CompletionRecorder()
+        async for chunk in SemanticCache.replay(" Yes, RMIT is a university.\n"):
+            self.assertTrue(chunk.startswith("data: {") and chunk.endswith("}\n\n"))
+            # Split the chunks like `aiter_text` may do
+            for part in (chunk[:7], chunk[7:]):
+                recorder.feed(part)
+        self.assertTrue(recorder.stopped)
+        self.assertEqual(recorder.content, " Yes, RMIT is a university.\n")
+        self.assertFalse(json.loads(chunk[len("data: ") :])["content"])
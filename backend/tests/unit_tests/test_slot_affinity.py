@@ -0,0 +1,112 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import json
+import unittest
+from unittest import mock
+
+import httpx
+from src.repository.rag import chat as rag_chat
+from src.repository.rag.chat import ANY_SLOT, RAGChatModelRepository, SlotAffinity
+from src.repository.semantic_cache import CompletionRecorder
+from src.utilities.metrics.metrics_kit import metrics_kit
+
+
+class TestSlotAffinity(unittest.TestCase):
+    def test_sessions_keep_their_slot(self):
+        slots = SlotAffinity(num_slots=2, pin_sessions=True)
+        a, b = slots.acquire("a"), slots.acquire("b")
+        self.assertEqual({a, b}, {0, 1})
+        slots.release("a", a)
+        slots.release("b", b)
+        self.assertEqual(slots.acquire("a"), a)
+        self.assertEqual(slots.acquire("b"), b)
+
+    def test_least_recently_used_session_gives_its_slot_up(self):
+        slots = SlotAffinity(num_slots=2, pin_sessions=True)
+        for session_uuid in ["a", "b", "a"]:
+            slots.release(session_uuid, slots.acquire(session_uuid))
+        b_slot = slots.acquire("b")
+        slots.release("b", b_slot)
+        slots.release("a", slots.acquire("a"))
+        # b is the least recently used now
+        self.assertEqual(slots.acquire("c"), b_slot)
+
+    def test_busy_slot_falls_back_to_any_slot(self):
+        slots = SlotAffinity(num_slots=1, pin_sessions=True)
+        slot = slots.acquire("a")
+        self.assertEqual(slot, 0)
+        # The same session asks again before its first answer is done, and the only slot is busy for another
+        self.assertEqual(slots.acquire("a"), ANY_SLOT)
+        self.assertEqual(slots.acquire("b"), ANY_SLOT)
+        slots.release("a", slot)
+        self.assertEqual(slots.acquire("b"), 0)
+
+    def test_session_follows_the_slot_the_engine_picked(self):
+        slots = SlotAffinity(num_slots=2, pin_sessions=True)
+        slots.release("a", slots.acquire("a"))
+        slot = slots.acquire("b")
+        slots.release("b", slot)
+        slots.release("c", ANY_SLOT, {"id_slot": slot, "stop": True})
+        # c overwrote the prompt of b
+        self.assertEqual(slots.acquire("c"), slot)
+        self.assertNotEqual(slots.acquire("b"), slot)
+
+    def test_sessions_of_several_workers_are_not_pinned(self):
+        slots = SlotAffinity(num_slots=2, pin_sessions=False)
+        evaluated = metrics_kit.counter("prompt_cache_tokens_evaluated").value
+        self.assertEqual(slots.acquire("a"), ANY_SLOT)
+        slots.release("a", ANY_SLOT, {"id_slot": 1, "tokens_evaluated": 10, "timings": {"prompt_n": 10}})
+        self.assertEqual(slots.acquire("a"), ANY_SLOT)
+        self.assertEqual(metrics_kit.counter("prompt_cache_tokens_evaluated").value - evaluated, 10)
+
+    def test_hit_ratio(self):
+        slots = SlotAffinity(num_slots=1, pin_sessions=True)
+        evaluated = metrics_kit.counter("prompt_cache_tokens_evaluated").value
+        reused = metrics_kit.counter("prompt_cache_tokens_reused").value
+        slots.release("a", slots.acquire("a"), {"tokens_evaluated": 100, "timings": {"prompt_n": 100}})
+        slots.release("a", slots.acquire("a"), {"tokens_evaluated": 120, "timings": {"prompt_n": 20}})
+        # Frames without the statistics are left out
+        slots.release("a", slots.acquire("a"), {"tokens_cached": 10})
+        self.assertEqual(metrics_kit.counter("prompt_cache_tokens_evaluated").value - evaluated, 220)
+        self.assertEqual(metrics_kit.counter("prompt_cache_tokens_reused").value - reused, 100)
+
+
+class TestStreamCompletion(unittest.IsolatedAsyncioTestCase):
+    async def test_slot_rejected_by_the_engine(self):
+        id_slots: list[int] = list()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            id_slot = json.loads(request.content)["id_slot"]
+            id_slots.append(id_slot)
+            if id_slot != ANY_SLOT:
+                return httpx.Response(400, json={"error": "Invalid id_slot"})
+            return httpx.Response(200, text='data: {"content":"a","stop":true,"id_slot":0}\n\n')
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        slots = SlotAffinity(num_slots=2, pin_sessions=True)
+        with mock.patch.object(rag_chat.httpx_kit, "inference_client", client), mock.patch.object(
+            rag_chat, "slot_affinities", collections.defaultdict(lambda: slots)
+        ):
+            recorder = CompletionRecorder()
+            chunks = [chunk async for chunk in RAGChatModelRepository().stream_completion("a", {}, recorder)]
+        await client.aclose()
+
+        self.assertEqual(id_slots, [0, ANY_SLOT])
+        self.assertEqual(recorder.content, "a")
+        self.assertEqual(len(chunks), 1)
+        # Nothing is left busy
+        self.assertEqual(slots.acquire("a"), 0)
@@ -0,0 +1,115 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import unittest
+
+from src.repository.semantic_cache import CompletionRecorder
+from src.utilities.httpkit.sse_relay import iter_frames, relay_sse
+
+
+def frame(content: str, stop: bool = False) -> bytes:
+    return b'data: {"content":"%s","stop":%s}\n\n' % (content.encode(), b"true" if stop else b"false")
+
+
+async def chunked(*chunks: bytes, delay: float = 0):
+    for chunk in chunks:
+        if delay:
+            await asyncio.sleep(delay)
+        yield chunk
+
+
+async def collect(frames) -> list[bytes]:
+    return [chunk async for chunk in frames]
+
+
+class TestSSERelay(unittest.IsolatedAsyncioTestCase):
+    async def test_frames_are_regrouped_at_the_separator(self):
+        body = frame("a") + frame("é") + frame("c", stop=True)
+        # Split inside a frame, inside the separator and inside a multi-byte character
+        cuts = [5, len(frame("a")) - 1, len(frame("a")) + 21]
+        chunks = [body[i:j] for i, j in zip([0] + cuts, cuts + [len(body)])]
+        relayed = await collect(iter_frames(chunked(*chunks)))
+        self.assertEqual(b"".join(relayed), body)
+        self.assertTrue(all(chunk.endswith(b"\n\n") for chunk in relayed))
+        self.assertEqual(relayed[0], frame("a"))
+
+    async def test_incomplete_tail_is_flushed(self):
+        relayed = await collect(relay_sse(chunked(frame("a"), b"data: [DONE]")))
+        self.assertEqual(relayed, [frame("a"), b"data: [DONE]"])
+
+    async def test_frames_are_coalesced_for_a_slow_client(self):
+        body = [frame(str(i)) for i in range(50)]
+        relayed = list()
+        async for chunk in relay_sse(chunked(*body, delay=0.001), max_buffer=1 << 16):
+            relayed.append(chunk)
+            await asyncio.sleep(0.01)
+        self.assertEqual(b"".join(relayed), b"".join(body))
+        self.assertLess(len(relayed), len(body) // 2)
+        self.assertTrue(all(chunk.endswith(b"\n\n") for chunk in relayed))
+
+    async def test_read_ahead_is_bounded(self):
+        body = [frame(str(i)) for i in range(100)]
+        relayed = list()
+        async for chunk in relay_sse(chunked(*body), max_buffer=len(body[0]) * 4):
+            relayed.append(chunk)
+            await asyncio.sleep(0)
+        self.assertEqual(b"".join(relayed), b"".join(body))
+        # The pump stops once the limit is reached, so no chunk holds more than the limit and one more read
+        self.assertLessEqual(max(len(chunk) for chunk in relayed), len(body[0]) * 5)
+
+    async def test_upstream_error_is_raised(self):
+        async def broken():
+            yield frame("a")
+            raise ConnectionResetError("upstream")
+
+        relayed = list()
+        with self.assertRaises(ConnectionResetError):
+            async for chunk in relay_sse(broken(), max_buffer=1024):
+                relayed.append(chunk)
+        self.assertEqual(relayed, [frame("a")])
+
+    async def test_upstream_is_released_when_the_client_leaves(self):
+        closed = asyncio.Event()
+
+        async def endless():
+            try:
+                while True:
+                    yield frame("a")
+                    await asyncio.sleep(0)
+            finally:
+                closed.set()
+
+        relay = relay_sse(endless(), max_buffer=1024)
+        await relay.__anext__()
+        await relay.aclose()
+        await asyncio.wait_for(closed.wait(), timeout=1)
+
+
+class TestCompletionRecorder(unittest.TestCase):
+    def test_bytes_split_anywhere(self):
+        body = frame("a") + frame("é") + frame("c", stop=True)
+        recorder = CompletionRecorder()
+        for i in range(0, len(body), 7):
+            recorder.feed(body[i : i + 7])
+        self.assertEqual(recorder.content, "aéc")
+        self.assertTrue(recorder.stopped)
+
+    def test_only_the_last_frame_without_content(self):
+        recorder = CompletionRecorder(keep_content=False)
+        recorder.feed(frame("a") + frame("b") + b'data: {"content":"","stop": true,"id_slot":1}\n\n')
+        self.assertEqual(recorder.content, "")
+        self.assertTrue(recorder.stopped)
+        self.assertEqual(recorder.final["id_slot"], 1)
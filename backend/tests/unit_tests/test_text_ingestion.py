@@ -0,0 +1,70 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import tempfile
+import unittest
+
+from src.repository.text_ingestion import TextIngestionPipeline
+from src.repository.vector_database import LanceHelper
+from src.utilities.formatters.chunk_formatter import ChunkFormatter
+
+
+async def fake_embed(chunks: list[str]) -> list[list[float]]:
+    return [[float(len(chunk.split())), 1.0] for chunk in chunks]
+
+
+class TestChunkFormatter(unittest.TestCase):
+    def test_windows_overlap(self):
+        text = " ".join(str(i) for i in range(10))
+        self.assertEqual(ChunkFormatter.split_text(text, 4, 1), ["0 1 2 3", "3 4 5 6", "6 7 8 9"])
+
+    def test_short_and_empty_texts(self):
+        self.assertEqual(ChunkFormatter.split_text("a b", 4, 1), ["a b"])
+        self.assertEqual(ChunkFormatter.split_text("  ", 4, 1), [])
+
+
+class TestTextIngestionPipeline(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lance_helper = LanceHelper(uri=self.tmp_dir.name, search_workers=1)
+
+    def tearDown(self):
+        self.lance_helper.shutdown()
+        self.tmp_dir.cleanup()
+
+    async def test_texts_are_chunked_embedded_and_written(self):
+        # 30 texts of 10 words, 3 chunks of 4 words each
+        texts = iter([[" ".join(f"w{i}" for i in range(10))] * 10 for _ in range(3)])
+        pipeline = TextIngestionPipeline(
+            lance_helper=self.lance_helper, embedding_concurrency=3, batch_size=8, chunk_size=4, chunk_overlap=1
+        )
+        progress: list[int] = list()
+        written = await pipeline.run(texts, "ds", fake_embed, progress.append)
+
+        self.assertEqual(written, 90)
+        self.assertEqual(progress[-1], 90)
+        self.assertEqual(self.lance_helper.tables.open_table("ds").count_rows(), 90)
+        # The 3 chunks of a text are equally near, either of them is the nearest hit
+        hit = self.lance_helper.search([4.0, 1.0], 1, table_name="ds")[0]
+        self.assertEqual(hit["distance"], 0.0)
+        self.assertIn(hit["context"], {"w0 w1 w2 w3", "w3 w4 w5 w6", "w6 w7 w8 w9"})
+
+    async def test_embedding_error_is_raised(self):
+        async def failing_embed(chunks: list[str]) -> list[list[float]]:
+            raise ConnectionError("embedding engine is down")
+
+        pipeline = TextIngestionPipeline(lance_helper=self.lance_helper, embedding_concurrency=2, batch_size=2)
+        with self.assertRaises(ConnectionError):
+            await pipeline.run(iter([["a b c"] * 10] * 5), "ds", failing_embed)
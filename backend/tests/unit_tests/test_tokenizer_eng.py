@@ -0,0 +1,83 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import unittest
+from unittest import mock
+
+import httpx
+from src.repository.rag import chat as rag_chat
+from src.repository.rag.chat import RAGChatModelRepository
+from src.repository.tokenizer_eng import TokenCounter
+
+
+class TestTokenCounter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.requests: list[str] = list()
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            content = json.loads(request.content)["content"]
+            self.requests.append(content)
+            return httpx.Response(200, json={"tokens": list(range(len(content.split())))})
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_counts_are_cached(self):
+        counter = TokenCounter(max_entries=8, client=self.client)
+        self.assertEqual(await counter.count("one two three"), 3)
+        self.assertEqual(await counter.count("one two three"), 3)
+        self.assertEqual(self.requests, ["one two three"])
+
+    async def test_estimate_when_engine_fails(self):
+        client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+        counter = TokenCounter(max_entries=8, client=client)
+        self.assertGreaterEqual(await counter.count("a" * 30), 10)
+        self.assertEqual(len(counter.cache), 0)
+        await client.aclose()
+
+
+class TestPackContext(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        client = httpx.AsyncClient(
+            transport=httpx.MockTransport(
+                lambda request: httpx.Response(
+                    200, json={"tokens": [0] * len(json.loads(request.content)["content"].split(" "))}
+                )
+            )
+        )
+        self.client = client
+        self.patch = mock.patch.object(rag_chat, "token_counter", TokenCounter(max_entries=64, client=client))
+        self.patch.start()
+
+    async def asyncTearDown(self):
+        self.patch.stop()
+        await self.client.aclose()
+
+    async def test_nearest_hits_are_packed_within_budget(self):
+        hits = [
+            {"context": "a b c d", "distance": 0.1},
+            {"context": "e f g h i j k l", "distance": 0.2},
+            {"context": "m n", "distance": 0.3},
+        ]
+        # 4 tokens + 1 separator + 2 tokens, the second hit does not fit anymore
+        context = await RAGChatModelRepository().pack_context(hits, budget=8)
+        self.assertEqual(context, "a b c d\nm n")
+
+    async def test_nothing_fits(self):
+        context = await RAGChatModelRepository().pack_context([{"context": "a b c", "distance": 0.1}], budget=2)
+        self.assertEqual(context, "")
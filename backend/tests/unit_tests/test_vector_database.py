@@ -0,0 +1,146 @@
+# coding=utf-8
+
+# Copyright [2024] [SkywardAI]
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#        http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import tempfile
+import threading
+import unittest
+
+import lancedb
+from src.repository.vector_database import LanceHelper, TableHandleCache
+
+
+def rows(start: int, stop: int) -> list[dict]:
+    return [{"vector": [float(i), 1.0], "context": f"context {i}"} for i in range(start, stop)]
+
+
+class TestTableHandleCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = lancedb.connect(self.tmp_dir.name)
+        self.db.create_table("ds", data=rows(0, 2))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_handle_is_reused(self):
+        cache = TableHandleCache(self.db, refresh_interval=60)
+        self.assertIs(cache.open_table("ds"), cache.open_table("ds"))
+
+    def test_refresh_on_new_version(self):
+        """
+        A version committed through another handle is picked up after the refresh interval
+        """
+        cache = TableHandleCache(self.db, refresh_interval=0)
+        self.assertEqual(cache.open_table("ds").count_rows(), 2)
+        lancedb.connect(self.tmp_dir.name).open_table("ds").add(rows(2, 5))
+        self.assertEqual(cache.open_table("ds").count_rows(), 5)
+
+    def test_other_tables_are_served_while_one_is_opened(self):
+        """
+        A slow open of a table does not hold the handles of the other tables back
+        """
+        opening, release = threading.Event(), threading.Event()
+
+        class SlowDB:
+            def __init__(self, db):
+                self.db = db
+
+            def open_table(self, table_name: str):
+                if table_name == "slow":
+                    opening.set()
+                    release.wait(timeout=5)
+                return self.db.open_table(table_name)
+
+        self.db.create_table("slow", data=rows(0, 1))
+        cache = TableHandleCache(SlowDB(self.db), refresh_interval=60)
+        cache.open_table("ds")
+        thread = threading.Thread(target=cache.open_table, args=("slow",))
+        thread.start()
+        opening.wait(timeout=5)
+        done = threading.Event()
+        threading.Thread(target=lambda: (cache.open_table("ds"), done.set())).start()
+        self.assertTrue(done.wait(timeout=1))
+        release.set()
+        thread.join()
+        self.assertIs(cache.open_table("slow"), cache.open_table("slow"))
+
+    def test_overwrite_invalidates(self):
+        lance_helper = LanceHelper(uri=self.tmp_dir.name, search_workers=1)
+        self.assertEqual(lance_helper.search([0.0, 1.0], 1, table_name="ds")[0]["context"], "context 0")
+        lance_helper.create_table(table_name="ds", data=rows(7, 8))
+        self.assertEqual(lance_helper.search([0.0, 1.0], 1, table_name="ds")[0]["context"], "context 7")
+        lance_helper.shutdown()
+
+
+class TestLanceHelperSearch(unittest.TestCase):
+    def test_top_k_hits_are_sorted_and_deduplicated(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lance_helper = LanceHelper(uri=tmp_dir, search_workers=1)
+            lance_helper.create_table(table_name="ds", data=rows(0, 3) + [{"vector": [0.5, 1.0], "context": "context 0"}])
+            hits = lance_helper.search([0.0, 1.0], 4, table_name="ds")
+            lance_helper.shutdown()
+        self.assertEqual([hit["context"] for hit in hits], ["context 0", "context 1", "context 2"])
+        self.assertEqual(hits, sorted(hits, key=lambda hit: hit["distance"]))
+
+    def test_duplicates_do_not_shrink_the_top_k(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            lance_helper = LanceHelper(uri=tmp_dir, search_workers=1)
+            duplicates = [{"vector": [0.0, 1.0 + i / 100], "context": "context 0"} for i in range(2)]
+            lance_helper.create_table(table_name="ds", data=duplicates + rows(1, 5))
+            hits = lance_helper.search([0.0, 1.0], 3, table_name="ds")
+            lance_helper.shutdown()
+        self.assertEqual([hit["context"] for hit in hits], ["context 0", "context 1", "context 2"])
+
+
+def random_rows(start: int, stop: int, dim: int = 8) -> list[dict]:
+    rng = random.Random(start)
+    return [{"vector": [rng.random() for _ in range(dim)], "context": f"context {i}"} for i in range(start, stop)]
+
+
+class TestLanceHelperIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.lance_helper = LanceHelper(uri=self.tmp_dir.name, search_workers=1, index_min_rows=300)
+        self.lance_helper.create_table(table_name="ds", data=random_rows(0, 1))
+
+    def tearDown(self):
+        self.lance_helper.shutdown()
+        self.tmp_dir.cleanup()
+
+    def test_small_table_is_not_indexed(self):
+        self.lance_helper.insert_list(table_name="ds", data_list=random_rows(1, 100))
+        status = self.lance_helper.index_status("ds")
+        self.assertEqual(status["num_rows"], 100)
+        self.assertIsNone(status["index_type"])
+
+    def test_index_is_created_and_updated_on_optimize(self):
+        self.lance_helper.insert_list(table_name="ds", data_list=random_rows(1, 300))
+        self.assertIsNone(self.lance_helper.index_status("ds")["index_type"])
+        self.lance_helper.optimize_table("ds")
+        status = self.lance_helper.index_status("ds")
+        self.assertEqual(status["index_type"], "IVF_PQ")
+        self.assertEqual(status["num_indexed_rows"], 300)
+
+        self.lance_helper.insert_list(table_name="ds", data_list=random_rows(300, 350))
+        status = self.lance_helper.index_status("ds")
+        self.assertEqual((status["num_indexed_rows"], status["num_unindexed_rows"]), (300, 50))
+        self.lance_helper.optimize_table("ds")
+        status = self.lance_helper.index_status("ds")
+        self.assertEqual((status["num_indexed_rows"], status["num_unindexed_rows"]), (350, 0))
+
+    def test_index_params(self):
+        self.assertEqual(LanceHelper.index_params(10000, 384), {"num_partitions": 100, "num_sub_vectors": 24})
+        self.assertEqual(LanceHelper.index_params(10000, 100)["num_sub_vectors"], 25)